@@ -1,19 +1,36 @@
 import json
 import requests
-from flask import Flask, request, jsonify, render_template, redirect, session, url_for, make_response
+from flask import Flask, request, jsonify, render_template, redirect, session, url_for, make_response, g, has_request_context
 from flask_cors import CORS
 from flask_session import Session
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.utils import parsedate_to_datetime
 import secrets
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import sqlite3
+import hashlib
+import socket
+import struct
+import sys
+import zlib
+import gzip
+import atexit
+import bisect
+import unicodedata
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, wait
 import time
 import os
 import re
 from html import escape, unescape
-from threading import Lock
+from threading import Lock, Event, Thread, Condition, BoundedSemaphore, local
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from urllib.parse import urlparse, quote
 
 app = Flask(__name__, static_url_path='/arcrooms/static')
 
@@ -56,7 +73,7 @@ app.secret_key = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(32))
 
 # Session configuration - server-side storage to prevent cookie size issues
 app.config['SESSION_TYPE'] = 'filesystem'  # Store sessions in filesystem
-app.config['SESSION_FILE_DIR'] = '/tmp/flask_sessions'  # Session storage directory
+app.config['SESSION_FILE_DIR'] = os.getenv('SESSION_FILE_DIR', '/tmp/flask_sessions')  # Shared by all workers; cookie holds only the session id
 app.config['SESSION_PERMANENT'] = False  # Sessions expire on browser close
 app.config['SESSION_USE_SIGNER'] = True  # Sign session cookies
 app.config['SESSION_KEY_PREFIX'] = 'arcrooms:'  # Prefix for session keys
@@ -72,9 +89,1146 @@ Session(app)
 if not all([TENANT, CLIENT_ID, CLIENT_SECRET]):
     raise ValueError("Missing required environment variables: AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET")
 
-TOKEN_URL = f"https://login.microsoftonline.com/{TENANT}/oauth2/v2.0/token"
-AUTH_URL = f"https://login.microsoftonline.com/{TENANT}/oauth2/v2.0/authorize"
-GRAPH_ENDPOINT = "https://graph.microsoft.com/v1.0"
+# Endpoints can be pointed at mock_graph_server.py for offline benchmarks
+LOGIN_ENDPOINT = os.getenv('LOGIN_ENDPOINT', 'https://login.microsoftonline.com')
+TOKEN_URL = f"{LOGIN_ENDPOINT}/{TENANT}/oauth2/v2.0/token"
+AUTH_URL = f"{LOGIN_ENDPOINT}/{TENANT}/oauth2/v2.0/authorize"
+GRAPH_ENDPOINT = os.getenv('GRAPH_ENDPOINT', "https://graph.microsoft.com/v1.0")
+
+# ---- Metrics (Prometheus text exposition format) ----
+# Metrics are kept per process; with several gunicorn workers each worker reports its own values.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token required to scrape /arcrooms/metrics (unset: endpoint off)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+metrics_registry = []
+metrics_lock = Lock()
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    """Render a Prometheus label set such as {endpoint="/me",status="200"}"""
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    rendered = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        rendered.append(f'{name}="{value}"')
+    return "{" + ",".join(rendered) + "}"
+
+
+class Counter:
+    """Monotonically increasing counter with optional labels"""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        metrics_registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with metrics_lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    """Value that can go up and down (queue depth, cache size)"""
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with metrics_lock:
+            self.values[key] = value
+
+
+class Histogram(Counter):
+    """Cumulative histogram with fixed bucket boundaries"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with metrics_lock:
+            series = self.values.get(key)
+            if series is None:
+                # [bucket counts..., sum, count]
+                series = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = []
+        for key, series in sorted(self.values.items()):
+            for idx, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {series[idx]}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def render_metrics():
+    """Render all registered metrics in the Prometheus text format"""
+    lines = []
+    with metrics_lock:
+        for metric in metrics_registry:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+GRAPH_REQUEST_SECONDS = Histogram(
+    "arcrooms_graph_request_duration_seconds",
+    "Latency of Microsoft Graph calls by endpoint template, method and status code",
+    ("endpoint", "method", "status"))
+TOKEN_FETCHES = Counter(
+    "arcrooms_token_fetches_total",
+    "OAuth token requests by grant type and outcome",
+    ("grant_type", "outcome"))
+TITLE_CACHE_EVENTS = Counter(
+    "arcrooms_title_cache_events_total",
+    "Meeting title cache lookups (hit, miss)",
+    ("event",))
+TITLE_CACHE_SIZE = Gauge(
+    "arcrooms_title_cache_entries",
+    "Number of entries in the meeting title cache (sampled every CACHE_SIZE_SAMPLE_SECONDS)")
+ROOM_FETCH_QUEUE_DEPTH = Gauge(
+    "arcrooms_room_fetch_queue_depth",
+    "Room calendar fetches submitted to the executor but not yet started")
+ROOM_FETCH_SECONDS = Histogram(
+    "arcrooms_room_fetch_duration_seconds",
+    "Time to fetch and process one room calendar in get_meetings",
+    ("room",))
+HTTP_REQUEST_SECONDS = Histogram(
+    "arcrooms_http_request_duration_seconds",
+    "Latency of Flask requests by route, method and status code",
+    ("route", "method", "status"))
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request latency per Flask route (templated, e.g. /arcrooms/api/room)"""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                     route=route, method=request.method, status=response.status_code)
+    return response
+
+
+# ---- Per-request phase timings (Server-Timing) ----
+class PhaseTimer:
+    """Accumulates named phase durations for one request; safe to share with worker threads"""
+
+    def __init__(self):
+        self.phases = {}
+        self.lock = Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def as_dict(self):
+        with self.lock:
+            return dict(self.phases)
+
+    def merge(self, other):
+        """Add the phases recorded on another timer (e.g. of a pool fetch this request waited for)"""
+        for name, seconds in other.as_dict().items():
+            self.add(name, seconds)
+
+
+def current_phase_timer():
+    """Return the PhaseTimer of the current request, or None outside a request"""
+    if not has_request_context():
+        return None
+    if 'phase_timer' not in g:
+        g.phase_timer = PhaseTimer()
+    return g.phase_timer
+
+
+def timed_phase(timer, name):
+    """Context manager timing a phase on timer; no-op when timer is None (background work)"""
+    return timer.phase(name) if timer else nullcontext()
+
+
+@app.after_request
+def add_server_timing(response):
+    """Emit recorded phases as a Server-Timing header (phases run in worker threads are summed)"""
+    timer = g.get('phase_timer')
+    entries = []
+    if timer:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timer.as_dict().items()]
+    started = g.get('request_started')
+    if started is not None:
+        entries.append(f"total;dur={(time.perf_counter() - started) * 1000:.1f}")
+    if entries:
+        response.headers['Server-Timing'] = ", ".join(entries)
+    return response
+
+
+# ---- Microsoft Graph request helpers ----
+# Path segments that identify a specific mailbox, event or object (emails, GUIDs, long Graph ids)
+GRAPH_ID_SEGMENT = re.compile(r'^(.*(@|%40).*|[0-9a-fA-F-]{32,36}|[A-Za-z0-9_=+\-]{40,})$')
+
+
+def graph_endpoint_template(url):
+    """Collapse a Graph URL to a low-cardinality template, e.g. /users/{id}/calendar/calendarView"""
+    path = url.split('?', 1)[0]
+    if path.startswith(GRAPH_ENDPOINT):
+        path = path[len(GRAPH_ENDPOINT):]
+    segments = ["{id}" if GRAPH_ID_SEGMENT.match(segment) else segment for segment in path.split('/')]
+    return '/'.join(segments) or '/'
+
+
+def graph_request(method, url, coalesce=None, **kwargs):
+    """Send a request to Microsoft Graph and record its latency per endpoint and status code.
+
+    Concurrent identical reads (GET by default, or coalesce=True for read-only POSTs such as
+    getSchedule) share one in-flight request and its response.
+    """
+    endpoint = graph_endpoint_template(url)
+
+    def send():
+        if not graph_circuit.allow():
+            GRAPH_CIRCUIT_REJECTED.inc(endpoint=endpoint)
+            raise GraphUnavailableError(f"Graph circuit open, skipping {method} {endpoint}")
+        # Reads are retried once after a throttling answer; the limiter waits out its Retry-After
+        attempts = 2 if method == "GET" else 1
+        for attempt in range(attempts):
+            if not graph_limiter.acquire(GRAPH_LIMITER_WAIT_SECONDS):
+                graph_circuit.cancel()
+                raise GraphUnavailableError(f"No Graph slot free within {GRAPH_LIMITER_WAIT_SECONDS:.0f}s for {method} {endpoint}")
+            status = "error"
+            retry_after = None
+            sent_at = time.monotonic()
+            started = time.perf_counter()
+            try:
+                if GRAPH_REPLAY_FILE:
+                    response = graph_replayer.replay(method, url, kwargs)
+                else:
+                    response = requests.request(method, url, **kwargs)
+                    if GRAPH_RECORD_FILE:
+                        graph_recorder.record(method, url, kwargs, response, time.perf_counter() - started)
+                status = response.status_code
+                if status in THROTTLE_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            finally:
+                graph_limiter.release(status, sent_at, time.perf_counter() - started, retry_after)
+                # Throttling and server errors count against Graph health; 4xx answers do not
+                graph_circuit.record(status != "error" and status < 500 and status != 429)
+                GRAPH_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                              endpoint=endpoint, method=method, status=status)
+            # The retry is a new call for the breaker: a throttled half-open probe has just reopened it
+            if (status in THROTTLE_STATUSES and attempt + 1 < attempts
+                    and (retry_after or 0) <= GRAPH_RETRY_AFTER_MAX_SECONDS and graph_circuit.allow()):
+                GRAPH_RETRIES.inc(endpoint=endpoint)
+                continue
+            return response
+
+    if coalesce is None:
+        coalesce = method == "GET"
+    if not (coalesce and GRAPH_COALESCE):
+        return send()
+    return graph_single_flight.do(single_flight_key(method, url, kwargs), send, endpoint)
+
+
+# ---- Request coalescing (single-flight) ----
+# When kiosks refresh together, identical Graph reads share one in-flight request instead of
+# each gunicorn thread firing its own copy.
+GRAPH_COALESCE = os.getenv('GRAPH_COALESCE', '1') == '1'
+
+GRAPH_COALESCED = Counter(
+    "arcrooms_graph_coalesced_total",
+    "Graph reads answered by joining an identical in-flight request",
+    ("endpoint",))
+
+
+def single_flight_key(method, url, kwargs):
+    """Key on method, URL, params, body and the caller's token (user tokens must never share results)"""
+    headers = kwargs.get("headers") or {}
+    auth = hashlib.sha256(headers.get("Authorization", "").encode("utf-8")).hexdigest()
+    return json.dumps([method, url, kwargs.get("params"), kwargs.get("json"), headers.get("Prefer"), auth],
+                      sort_keys=True, default=str)
+
+
+class SingleFlight:
+    """Lets concurrent identical calls share one execution and its result (or exception)"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.calls = {}
+
+    def do(self, key, fn, label=""):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {"done": Event(), "result": None, "error": None}
+        if not leader:
+            GRAPH_COALESCED.inc(endpoint=label)
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
+
+
+graph_single_flight = SingleFlight()
+
+
+# ---- Circuit breaker ----
+# Once the recent Graph error rate crosses a threshold, calls fail fast for a cool-down period
+# (cached data is served instead) and a few half-open probes decide when to close again.
+CIRCUIT_WINDOW = int(os.getenv('GRAPH_CIRCUIT_WINDOW', '20'))  # Recent calls considered
+CIRCUIT_MIN_CALLS = int(os.getenv('GRAPH_CIRCUIT_MIN_CALLS', '10'))
+CIRCUIT_FAILURE_RATIO = float(os.getenv('GRAPH_CIRCUIT_FAILURE_RATIO', '0.5'))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('GRAPH_CIRCUIT_OPEN_SECONDS', '30'))
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv('GRAPH_CIRCUIT_HALF_OPEN_PROBES', '2'))
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+GRAPH_CIRCUIT_STATE = Gauge(
+    "arcrooms_graph_circuit_state",
+    "Graph circuit breaker state (0 = closed, 1 = half-open, 2 = open)")
+GRAPH_CIRCUIT_REJECTED = Counter(
+    "arcrooms_graph_circuit_rejected_total",
+    "Graph calls skipped because the circuit breaker was open",
+    ("endpoint",))
+
+
+class GraphUnavailableError(requests.exceptions.ConnectionError):
+    """Raised instead of calling Graph while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed -> open on a high failure ratio, open -> half-open after a cool-down, half-open -> closed on success"""
+
+    def __init__(self, window, min_calls, failure_ratio, open_seconds, half_open_probes):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.lock = Lock()
+        self.outcomes = deque(maxlen=window)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.last_success = None  # epoch seconds of the last healthy Graph answer
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"[CIRCUIT] Graph circuit {self.state} -> {state}", flush=True)
+        self.state = state
+        GRAPH_CIRCUIT_STATE.set(CIRCUIT_STATES[state])
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open":
+                if time.time() - self.opened_at < self.open_seconds:
+                    return False
+                self._set_state("half_open")
+                self.probes_in_flight = 0
+            if self.state == "half_open":
+                if self.probes_in_flight >= self.half_open_probes:
+                    return False
+                self.probes_in_flight += 1
+            return True
+
+    def cancel(self):
+        """Give back a call allowed by allow() that was never sent (no outcome to record)"""
+        with self.lock:
+            if self.state == "half_open":
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def record(self, success):
+        with self.lock:
+            if success:
+                self.last_success = time.time()
+            if self.state == "half_open":
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                if success:
+                    self.outcomes.clear()
+                    self._set_state("closed")
+                else:
+                    self.opened_at = time.time()
+                    self._set_state("open")
+                return
+            if self.state == "open":
+                return
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_ratio:
+                self.opened_at = time.time()
+                self._set_state("open")
+
+    def snapshot(self):
+        with self.lock:
+            return {"state": self.state, "recentCalls": len(self.outcomes),
+                    "recentFailures": self.outcomes.count(False)}
+
+
+graph_circuit = CircuitBreaker(CIRCUIT_WINDOW, CIRCUIT_MIN_CALLS, CIRCUIT_FAILURE_RATIO,
+                               CIRCUIT_OPEN_SECONDS, CIRCUIT_HALF_OPEN_PROBES)
+
+
+# ---- Adaptive Graph concurrency (AIMD) ----
+# Every Graph call of this worker takes a slot. The number of slots grows by about one per round of
+# healthy answers, halves on 429/503/504 and shrinks slightly when answers get slow; a Retry-After
+# pauses new calls until it has passed. The fetch pools only cap threads, this decides the load.
+GRAPH_CONCURRENCY_INITIAL = float(os.getenv('GRAPH_CONCURRENCY_INITIAL', '8'))
+GRAPH_CONCURRENCY_MIN = float(os.getenv('GRAPH_CONCURRENCY_MIN', '1'))
+GRAPH_CONCURRENCY_MAX = float(os.getenv('GRAPH_CONCURRENCY_MAX', '32'))
+GRAPH_LATENCY_TARGET_SECONDS = float(os.getenv('GRAPH_LATENCY_TARGET_SECONDS', '2'))  # Slower answers count as congestion
+GRAPH_LIMITER_WAIT_SECONDS = float(os.getenv('GRAPH_LIMITER_WAIT_SECONDS', '30'))  # Max wait for a free slot
+GRAPH_RETRY_AFTER_MAX_SECONDS = 10  # Reads are not retried when Graph asks to wait longer
+GRAPH_PAUSE_MAX_SECONDS = 30
+THROTTLE_STATUSES = (429, 503, 504)
+
+GRAPH_CONCURRENCY_LIMIT = Gauge(
+    "arcrooms_graph_concurrency_limit",
+    "Adaptive limit on concurrent Graph calls")
+GRAPH_IN_FLIGHT = Gauge(
+    "arcrooms_graph_in_flight",
+    "Graph calls currently in flight")
+GRAPH_THROTTLED = Counter(
+    "arcrooms_graph_throttled_total",
+    "Graph answers that made the limiter back off (status: 429, 503, 504 or slow)",
+    ("status",))
+GRAPH_RETRIES = Counter(
+    "arcrooms_graph_retries_total",
+    "Graph reads retried after a throttling answer",
+    ("endpoint",))
+
+
+def parse_retry_after(value):
+    """Retry-After header (seconds or an HTTP date) -> seconds, None when absent or unreadable"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent calls with a Retry-After pause"""
+
+    PLATEAU_SECONDS = 60  # After throttling, grow ten times slower near the limit that was throttled
+
+    def __init__(self, initial, minimum, maximum, latency_target):
+        self.condition = Condition()
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.throttled_at_limit = None  # Limit at the last throttling answer; probed slowly for a while
+        GRAPH_CONCURRENCY_LIMIT.set(self.limit)
+
+    def acquire(self, timeout):
+        """Wait for a free slot; False when none came free within timeout"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                paused = self.paused_until - now
+                if paused <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    GRAPH_IN_FLIGHT.set(self.in_flight)
+                    return True
+                if now >= deadline:
+                    return False
+                self.condition.wait(min(deadline - now, paused) if paused > 0 else deadline - now)
+
+    def release(self, status, sent_at, seconds, retry_after=None):
+        """Free a slot and adapt the limit to the answer of a call sent at sent_at (monotonic)"""
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status in THROTTLE_STATUSES:
+                GRAPH_THROTTLED.inc(status=status)
+                self._decrease(0.5, sent_at, now)
+                pause = min(retry_after if retry_after is not None else 1.0, GRAPH_PAUSE_MAX_SECONDS)
+                self.paused_until = max(self.paused_until, now + pause)
+            elif status != "error" and seconds > self.latency_target:
+                GRAPH_THROTTLED.inc(status="slow")
+                self._decrease(0.9, sent_at, now)
+            elif status != "error" and status < 500:
+                step = 1 / self.limit
+                if (self.throttled_at_limit and self.limit >= 0.9 * self.throttled_at_limit
+                        and now - self.last_decrease < self.PLATEAU_SECONDS):
+                    step /= 10
+                self.limit = min(self.maximum, self.limit + step)
+            GRAPH_IN_FLIGHT.set(self.in_flight)
+            GRAPH_CONCURRENCY_LIMIT.set(round(self.limit, 2))
+            self.condition.notify_all()
+
+    def _decrease(self, factor, sent_at, now):
+        # Calls sent before the last decrease were part of the same overload; count it once
+        if sent_at < self.last_decrease:
+            return
+        if factor == 0.5:
+            self.throttled_at_limit = self.limit
+        self.limit = max(self.minimum, self.limit * factor)
+        self.last_decrease = now
+
+    def snapshot(self):
+        with self.condition:
+            return {"limit": round(self.limit, 2), "inFlight": self.in_flight,
+                    "pausedSeconds": round(max(0.0, self.paused_until - time.monotonic()), 1)}
+
+
+graph_limiter = AdaptiveLimiter(GRAPH_CONCURRENCY_INITIAL, GRAPH_CONCURRENCY_MIN, GRAPH_CONCURRENCY_MAX,
+                                GRAPH_LATENCY_TARGET_SECONDS)
+
+
+# ---- Graph traffic record / replay ----
+# Record production load shapes (room count, hidden-subject rate, page sizes) and profile them offline:
+#   GRAPH_RECORD_FILE=graph.jsonl  -> append sanitized request/response pairs with timing
+#   GRAPH_REPLAY_FILE=graph.jsonl  -> answer Graph calls from the fixture instead of the network
+GRAPH_RECORD_FILE = os.getenv('GRAPH_RECORD_FILE')
+GRAPH_RECORD_REDACT = os.getenv('GRAPH_RECORD_REDACT', '0') == '1'  # Also pseudonymize subjects and person names
+GRAPH_REPLAY_FILE = os.getenv('GRAPH_REPLAY_FILE')
+GRAPH_REPLAY_SPEED = float(os.getenv('GRAPH_REPLAY_SPEED', '1'))  # 1 = recorded timing, 10 = 10x faster, 0 = no delay
+EMAIL_PATTERN = re.compile(r'[A-Za-z0-9._%+-]+(?:@|%40)[A-Za-z0-9.-]+\.[A-Za-z]{2,}')
+PSEUDONYM_DOMAIN = "@example.invalid"
+REDACTED_KEYS = ("subject", "name", "givenName", "surname")
+
+
+def _pseudonym(value, prefix):
+    """Stable pseudonym so equal inputs stay equal across the whole fixture"""
+    return f"{prefix}{hashlib.sha1(value.encode('utf-8')).hexdigest()[:10]}"
+
+
+def _pseudonymize_email(match):
+    email = match.group(0)
+    if email.endswith(PSEUDONYM_DOMAIN):
+        return email
+    return _pseudonym(email.lower().replace('%40', '@'), "u") + PSEUDONYM_DOMAIN
+
+
+def sanitize_graph_value(value, key=None):
+    """Strip personal data from Graph traffic while keeping sizes and equality relations (idempotent)"""
+    if isinstance(value, dict):
+        sanitized = {k: sanitize_graph_value(v, k) for k, v in value.items()}
+        if key == "body" and isinstance(sanitized.get("content"), str):
+            # Keep the payload size, drop the text
+            sanitized["content"] = "x" * len(sanitized["content"])
+        return sanitized
+    if isinstance(value, list):
+        return [sanitize_graph_value(v, key) for v in value]
+    if isinstance(value, str):
+        if GRAPH_RECORD_REDACT and key in REDACTED_KEYS and value.strip() and not re.match(r'^X-[0-9a-f]{10}$', value):
+            return _pseudonym(value.strip(), "X-")
+        return EMAIL_PATTERN.sub(_pseudonymize_email, value)
+    return value
+
+
+def graph_request_keys(method, url, params=None, body=None):
+    """Exact (method, path, params, body) and loose (method, path) replay keys"""
+    path = re.sub(r'^https?://[^/]+/v1\.0', '', url)
+    loose = f"{method} {path}"
+    detail = json.dumps({"params": params, "json": body}, sort_keys=True, default=str)
+    return f"{loose} {detail}", loose
+
+
+class GraphRecorder:
+    """Appends sanitized Graph request/response pairs with timing to a JSONL fixture"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.started = time.time()
+
+    def record(self, method, url, kwargs, response, elapsed):
+        try:
+            try:
+                payload = {"json": sanitize_graph_value(response.json())}
+            except ValueError:
+                payload = {"text": sanitize_graph_value(response.text)}
+            entry = {
+                "t": round(time.time() - self.started, 3),
+                "method": method,
+                "url": sanitize_graph_value(url),
+                "params": sanitize_graph_value(kwargs.get("params")),
+                "body": sanitize_graph_value(kwargs.get("json")),
+                "status": response.status_code,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() in ("retry-after", "content-type")},
+                "elapsed_ms": round(elapsed * 1000, 1),
+                **payload
+            }
+            line = json.dumps(entry, ensure_ascii=False)
+            with self.lock:
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            print(f"Warning: could not record Graph call: {e}", flush=True)
+
+
+class GraphReplayer:
+    """Serves recorded Graph responses, cycling through repeated calls with the same key"""
+
+    def __init__(self, path):
+        self.lock = Lock()
+        self.exact = {}
+        self.loose = {}
+        self.positions = {}
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    exact, loose = graph_request_keys(entry["method"], entry["url"], entry.get("params"), entry.get("body"))
+                    self.exact.setdefault(exact, []).append(entry)
+                    self.loose.setdefault(loose, []).append(entry)
+        print(f"[REPLAY] Loaded {sum(len(v) for v in self.loose.values())} Graph responses from {path}", flush=True)
+
+    def _next(self, table, key):
+        entries = table.get(key)
+        if not entries:
+            return None
+        with self.lock:
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+        return entries[position % len(entries)]
+
+    def replay(self, method, url, kwargs):
+        exact, loose = graph_request_keys(method, sanitize_graph_value(url),
+                                          sanitize_graph_value(kwargs.get("params")),
+                                          sanitize_graph_value(kwargs.get("json")))
+        # Date windows (calendarView, getSchedule) differ per day, so fall back to method + path
+        entry = self._next(self.exact, exact) or self._next(self.loose, loose)
+
+        response = requests.Response()
+        response.url = url
+        response.encoding = "utf-8"
+        if entry is None:
+            print(f"[REPLAY] No recorded response for {loose}", flush=True)
+            response.status_code = 404
+            response._content = json.dumps({"error": {"code": "ReplayMiss", "message": loose}}).encode("utf-8")
+            return response
+        if GRAPH_REPLAY_SPEED > 0:
+            time.sleep(entry.get("elapsed_ms", 0) / 1000 / GRAPH_REPLAY_SPEED)
+        response.status_code = entry["status"]
+        response.headers.update(entry.get("headers") or {})
+        if entry.get("json") is not None:
+            response._content = json.dumps(entry["json"]).encode("utf-8")
+        else:
+            response._content = (entry.get("text") or "").encode("utf-8")
+        return response
+
+
+graph_recorder = GraphRecorder(GRAPH_RECORD_FILE) if GRAPH_RECORD_FILE else None
+graph_replayer = GraphReplayer(GRAPH_REPLAY_FILE) if GRAPH_REPLAY_FILE else None
+
+
+def graph_get(url, **kwargs):
+    return graph_request("GET", url, **kwargs)
+
+
+def graph_post(url, **kwargs):
+    return graph_request("POST", url, **kwargs)
+
+
+def graph_patch(url, **kwargs):
+    return graph_request("PATCH", url, **kwargs)
+
+
+def graph_delete(url, **kwargs):
+    return graph_request("DELETE", url, **kwargs)
+
+
+# ---- Shared state backend ----
+# Caches and snapshots live behind a small key/value interface so all gunicorn workers (and hosts)
+# can share one warm copy. STATE_BACKEND selects the implementation:
+#   memory (default, per process) | sqlite:///path/state.db (one host) | redis://host:6379/0 (fleet)
+# Values must be JSON-serializable; ttl is in seconds.
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+
+STATE_BACKEND_ERRORS = Counter(
+    "arcrooms_state_backend_errors_total",
+    "Shared state operations that failed and were treated as a cache miss",
+    ("operation",))
+
+
+class MemoryStateBackend:
+    """Per-process dict with expiry (values are stored as-is, not copied)"""
+    shared = False
+
+    def __init__(self):
+        self.lock = Lock()
+        self.data = {}  # key -> (value, expires_at or None)
+
+    def _live(self, key, now):
+        item = self.data.get(key)
+        if item and item[1] is not None and item[1] <= now:
+            del self.data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self.lock:
+            item = self._live(key, time.time())
+            return item[0] if item else None
+
+    def get_many(self, keys):
+        now = time.time()
+        with self.lock:
+            return {key: item[0] for key in keys for item in [self._live(key, now)] if item}
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.data[key] = (value, time.time() + ttl if ttl else None)
+
+    def set_if_absent(self, key, value, ttl=None):
+        """Store only when the key does not exist; True when stored (used for leases)"""
+        with self.lock:
+            if self._live(key, time.time()):
+                return False
+            self.data[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def keys(self, prefix):
+        now = time.time()
+        with self.lock:
+            return [key for key in list(self.data) if key.startswith(prefix) and self._live(key, now)]
+
+
+class SQLiteStateBackend:
+    """Key/value table in one SQLite file (WAL), shared by all workers on a host.
+
+    Errors (a locked, corrupt or unwritable file) count as cache misses, as with Redis.
+    """
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self.local = local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+            conn.execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),))
+
+    def _connect(self):
+        """One connection per thread (used as a transaction context manager)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def _run(self, operation, fn, default=None):
+        """fn(conn) in one transaction; returns default when SQLite fails"""
+        try:
+            with self._connect() as conn:
+                return fn(conn)
+        except sqlite3.Error as e:
+            conn = getattr(self.local, "conn", None)
+            self.local.conn = None  # Reconnect on the next operation
+            if conn:
+                conn.close()
+            STATE_BACKEND_ERRORS.inc(operation=operation)
+            print(f"[STATE] SQLite {operation} failed: {e}", flush=True)
+            return default
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        rows = self._run("get", lambda conn: conn.execute(
+            f"SELECT key, value FROM state WHERE key IN ({','.join('?' * len(keys))}) "
+            "AND (expires_at IS NULL OR expires_at > ?)", (*keys, time.time())).fetchall(), default=[])
+        return {key: json.loads(value) for key, value in rows}
+
+    def set(self, key, value, ttl=None):
+        self._run("set", lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl else None)))
+
+    def set_if_absent(self, key, value, ttl=None):
+        now = time.time()
+
+        def insert(conn):
+            conn.execute("DELETE FROM state WHERE key = ? AND expires_at <= ?", (key, now))
+            return conn.execute("INSERT OR IGNORE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                                (key, json.dumps(value), now + ttl if ttl else None)).rowcount == 1
+
+        # Without the database every worker acts on its own, so grant the lease (as with Redis)
+        return self._run("set", insert, default=True)
+
+    def delete(self, key):
+        self._run("del", lambda conn: conn.execute("DELETE FROM state WHERE key = ?", (key,)))
+
+    def keys(self, prefix):
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = self._run("scan", lambda conn: conn.execute(
+            "SELECT key FROM state WHERE key LIKE ? ESCAPE '\\' "
+            "AND (expires_at IS NULL OR expires_at > ?)", (pattern, time.time())).fetchall(), default=[])
+        return [row[0] for row in rows]
+
+
+class RedisStateBackend:
+    """Minimal Redis (RESP2) client; works against Redis, Valkey or redis_standin.py.
+
+    Connection errors and error replies count as cache misses so the app keeps working (from Graph) without Redis.
+    """
+    shared = True
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").strip("/") or 0)
+        self.prefix = "arcrooms:"
+        self.local = local()
+        self.down_until = 0.0  # After a connection failure, skip Redis for a few seconds
+
+    def _connection(self):
+        """This thread's connection; kept only once AUTH and SELECT have succeeded"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=5)
+            conn = (sock, sock.makefile("rb"))
+            try:
+                if self.password:
+                    self._roundtrip(conn, "AUTH", self.password)
+                if self.db:
+                    self._roundtrip(conn, "SELECT", self.db)
+            except RuntimeError as e:
+                sock.close()
+                raise ConnectionError(f"Redis setup failed: {e}")
+            self.local.conn = conn
+        return conn
+
+    def _roundtrip(self, conn, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        conn[0].sendall(b"".join(parts))
+        return self._read_reply(conn[1])
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self._read_reply(reader) for _ in range(count)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    def command(self, *args, default=None):
+        """Run one command, reconnecting once; returns default when Redis is unreachable or answers an error"""
+        if time.time() < self.down_until:
+            STATE_BACKEND_ERRORS.inc(operation=str(args[0]).lower())
+            return default
+        for attempt in range(2):
+            try:
+                return self._roundtrip(self._connection(), *args)
+            except (OSError, ConnectionError) as e:
+                self._reset()
+                if attempt:
+                    self.down_until = time.time() + 5
+                    STATE_BACKEND_ERRORS.inc(operation=str(args[0]).lower())
+                    print(f"[STATE] Redis {args[0]} failed: {e}", flush=True)
+            except RuntimeError as e:
+                # Error reply (e.g. WRONGTYPE); start the next command on a fresh connection
+                self._reset()
+                STATE_BACKEND_ERRORS.inc(operation=str(args[0]).lower())
+                print(f"[STATE] Redis {args[0]} failed: {e}", flush=True)
+                return default
+        return default
+
+    def _reset(self):
+        conn = getattr(self.local, "conn", None)
+        self.local.conn = None
+        if conn:
+            try:
+                conn[0].close()
+            except OSError:
+                pass
+
+    def get(self, key):
+        value = self.command("GET", self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        values = self.command("MGET", *[self.prefix + key for key in keys], default=[None] * len(keys))
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set(self, key, value, ttl=None):
+        args = ["SET", self.prefix + key, json.dumps(value)]
+        if ttl:
+            args += ["PX", max(1, int(ttl * 1000))]
+        self.command(*args)
+
+    def set_if_absent(self, key, value, ttl=None):
+        args = ["SET", self.prefix + key, json.dumps(value), "NX"]
+        if ttl:
+            args += ["PX", max(1, int(ttl * 1000))]
+        # Without Redis every worker acts on its own, so grant the lease
+        return self.command(*args, default="OK") == "OK"
+
+    def delete(self, key):
+        self.command("DEL", self.prefix + key)
+
+    def keys(self, prefix):
+        found, cursor = [], "0"
+        while True:
+            reply = self.command("SCAN", cursor, "MATCH", self.prefix + prefix + "*", "COUNT", 500, default=["0", []])
+            cursor = reply[0].decode() if isinstance(reply[0], bytes) else str(reply[0])
+            found.extend(key.decode()[len(self.prefix):] for key in reply[1])
+            if cursor == "0":
+                return found
+
+
+def create_state_backend(spec):
+    """Backend for a STATE_BACKEND value"""
+    if spec.startswith("redis://"):
+        return RedisStateBackend(spec)
+    if spec.startswith("sqlite:"):
+        # sqlite:///var/lib/arcrooms/state.db (absolute) or sqlite:state.db (relative)
+        return SQLiteStateBackend(spec[len("sqlite://"):] if spec.startswith("sqlite://") else spec[len("sqlite:"):])
+    if spec == "memory":
+        return MemoryStateBackend()
+    raise ValueError(f"Unknown STATE_BACKEND: {spec}")
+
+
+state = create_state_backend(STATE_BACKEND)
+
+
+# ---- Stale-while-revalidate caches ----
+# Graph-backed reads return the last good value immediately (with its fetch time); once it is older
+# than max_age a single background refresh is started. Errors never replace good data.
+SWR_MEETINGS_MAX_AGE = int(os.getenv('SWR_MEETINGS_MAX_AGE_SECONDS', '60'))
+SWR_ROOMS_MAX_AGE = int(os.getenv('SWR_ROOMS_MAX_AGE_SECONDS', str(15 * 60)))
+SWR_DELEGATES_MAX_AGE = int(os.getenv('SWR_DELEGATES_MAX_AGE_SECONDS', str(15 * 60)))
+# Authorization checks never trust delegates older than this (re-read from Graph, refused when that fails)
+DELEGATE_AUTH_MAX_AGE = int(os.getenv('DELEGATE_AUTH_MAX_AGE_SECONDS', '60'))
+
+SWR_SERVED = Counter(
+    "arcrooms_swr_served_total",
+    "Stale-while-revalidate lookups by cache and result (fresh, stale, miss)",
+    ("cache", "result"))
+SWR_REFRESH_FAILURES = Counter(
+    "arcrooms_swr_refresh_failures_total",
+    "Background revalidations that failed (last good data kept)",
+    ("cache",))
+
+# Shared pool for background revalidation and other fire-and-forget work
+background_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="arcrooms-bg")
+
+
+class StaleWhileRevalidateCache:
+    """Keyed cache that serves the last good value and revalidates it in the background.
+
+    Entries live in the shared state backend, so every worker serves the same copy and only one of
+    them revalidates an entry at a time. Each entry is a small meta record ({"fetched_at", "rev"})
+    plus the value; workers keep the decoded value of the last rev they read.
+    """
+
+    REFRESH_LEASE_SECONDS = 60
+
+    def __init__(self, name, max_age, encode=None, decode=None):
+        self.name = name
+        self.max_age = max_age
+        # Conversions to and from JSON-friendly values, applied only for shared backends
+        self.encode = encode if state.shared else None
+        self.decode = decode if state.shared else None
+        self.lock = Lock()
+        self.decoded = {}  # key -> (rev, value) last read from the backend
+        self.refreshing = set()
+
+    def _state_key(self, key):
+        return f"swr:{self.name}:{key}"
+
+    def _load(self, key):
+        """Current {"value", "fetched_at"} entry or None"""
+        meta = state.get(self._state_key(key))
+        if meta is None:
+            return None
+        with self.lock:
+            memo = self.decoded.get(key)
+        if memo and memo[0] == meta["rev"]:
+            return {"value": memo[1], "fetched_at": meta["fetched_at"]}
+        value = state.get(self._state_key(key) + ":value")
+        if value is None:
+            return None
+        if self.decode:
+            value = self.decode(value)
+        with self.lock:
+            self.decoded[key] = (meta["rev"], value)
+        return {"value": value, "fetched_at": meta["fetched_at"]}
+
+    def _store(self, key, value, fetched_at):
+        rev = secrets.token_hex(8)
+        state.set(self._state_key(key) + ":value", self.encode(value) if self.encode else value)
+        state.set(self._state_key(key), {"fetched_at": fetched_at, "rev": rev})
+        with self.lock:
+            self.decoded[key] = (rev, value)
+
+    def get(self, key, loader, background_loader=None):
+        """Return (value, fetched_at, stale); loads synchronously only when nothing is cached"""
+        entry = self._load(key)
+        if entry is None:
+            SWR_SERVED.inc(cache=self.name, result="miss")
+            value = loader()
+            fetched_at = time.time()
+            self._store(key, value, fetched_at)
+            return value, fetched_at, False
+        stale = time.time() - entry["fetched_at"] >= self.max_age
+        if stale:
+            self._revalidate(key, background_loader or loader)
+        SWR_SERVED.inc(cache=self.name, result="stale" if stale else "fresh")
+        return entry["value"], entry["fetched_at"], stale
+
+    def refresh(self, key, loader):
+        """Load synchronously and store the result (raises on failure, keeping the old value)"""
+        value = loader()
+        self._store(key, value, time.time())
+        return value
+
+    def _revalidate(self, key, loader):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+        # Fleet-wide: skip when another worker is already refreshing this entry
+        lease_key = self._state_key(key) + ":refreshing"
+        if not state.set_if_absent(lease_key, os.getpid(), ttl=self.REFRESH_LEASE_SECONDS):
+            with self.lock:
+                self.refreshing.discard(key)
+            return
+
+        def run():
+            try:
+                self.refresh(key, loader)
+            except Exception as e:
+                SWR_REFRESH_FAILURES.inc(cache=self.name)
+                print(f"[SWR] Revalidation of {self.name}:{key} failed, keeping last good data: {e}", flush=True)
+            finally:
+                state.delete(lease_key)
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        background_executor.submit(run)
+
+    def revalidate_if_stale(self, key, loader):
+        """Start a background refresh when the value is missing or older than max_age (never blocks)"""
+        meta = state.get(self._state_key(key))
+        if meta is None or time.time() - meta["fetched_at"] >= self.max_age:
+            self._revalidate(key, loader)
+
+    def update(self, key, fn):
+        """Apply fn to a cached value, keeping its fetch time (no-op when nothing is cached)"""
+        entry = self._load(key)
+        if entry is not None:
+            self._store(key, fn(entry["value"]), entry["fetched_at"])
+
+    def size(self):
+        return len([k for k in state.keys(f"swr:{self.name}:") if k.count(":") == 2])
+
+    def age(self, key):
+        """Seconds since the entry was fetched, or None when nothing is cached"""
+        meta = state.get(self._state_key(key))
+        return None if meta is None else time.time() - meta["fetched_at"]
+
+
+meetings_cache = StaleWhileRevalidateCache("meetings", SWR_MEETINGS_MAX_AGE,
+                                           encode=lambda result: encode_meetings_result(result),
+                                           decode=lambda result: decode_meetings_result(result))
+rooms_cache = StaleWhileRevalidateCache("rooms", SWR_ROOMS_MAX_AGE)
+delegates_cache = StaleWhileRevalidateCache("delegates", SWR_DELEGATES_MAX_AGE)
+
+
+def fetch_room_directory():
+    """All rooms from /places/microsoft.graph.room keyed by id (raises on Graph errors)"""
+    headers = {
+        "Authorization": f"Bearer {get_token()}",
+        "Content-Type": "application/json"
+    }
+    rooms_r = graph_get(f"{GRAPH_ENDPOINT}/places/microsoft.graph.room", headers=headers, timeout=10)
+    rooms_r.raise_for_status()
+    return {room["id"]: room for room in rooms_r.json().get("value", [])}
+
+
+def get_room_directory():
+    """Room directory from the stale-while-revalidate cache"""
+    rooms, _, _ = rooms_cache.get("places", fetch_room_directory)
+    return rooms
+
 
 # Booking rules per room (auto-approve for certain conditions)
 ROOM_BOOKING_RULES = {
@@ -86,56 +1240,42 @@ ROOM_BOOKING_RULES = {
 # Working hours storage file
 WORKING_HOURS_FILE = "room_working_hours.json"
 
-# Meeting title cache: {cache_key: {"title": str, "timestamp": datetime}}
-# Cache key format: f"{organizer_email}_{event_start}_{event_end}_{room_name}"
-meeting_title_cache = {}
-meeting_title_cache_lock = Lock()
+# Meeting title cache in the shared state backend: "title:<cache_key>" -> {"title": str, "cached_at": epoch}
+# Cache key format: f"{organizer_email}_{event_start}_{event_end}_{room_name}"; entries expire via their TTL
 CACHE_MAX_AGE_SECONDS = 15 * 60  # 15 minutes
+CACHE_SIZE_SAMPLE_SECONDS = 300  # Counting the entries is a key scan (Redis SCAN, SQLite LIKE)
+cache_size_sample = {"at": 0.0, "titles": None, "meetings": None, "rooms": None, "delegates": None}
 
 def get_cached_meeting_title(organizer_email, event_start, event_end, room_name):
     """Retrieve meeting title from cache if available and not expired."""
     cache_key = f"{organizer_email}_{event_start}_{event_end}_{room_name}"
     
-    with meeting_title_cache_lock:
-        if cache_key in meeting_title_cache:
-            cached = meeting_title_cache[cache_key]
-            age = (datetime.now() - cached["timestamp"]).total_seconds()
-            
-            if age < CACHE_MAX_AGE_SECONDS:
-                print(f"[CACHE HIT] Using cached title for {organizer_email} (age: {age:.1f}s)", flush=True)
-                return cached["title"]
-            else:
-                # Expired, remove from cache
-                print(f"[CACHE EXPIRED] Removing expired entry for {organizer_email} (age: {age:.1f}s)", flush=True)
-                del meeting_title_cache[cache_key]
+    cached = state.get(f"title:{cache_key}")
+    if cached:
+        age = time.time() - cached["cached_at"]
+        print(f"[CACHE HIT] Using cached title for {organizer_email} (age: {age:.1f}s)", flush=True)
+        TITLE_CACHE_EVENTS.inc(event="hit")
+        return cached["title"]
     
+    TITLE_CACHE_EVENTS.inc(event="miss")
     return None
 
 def cache_meeting_title(organizer_email, event_start, event_end, room_name, title):
     """Store meeting title in cache."""
     cache_key = f"{organizer_email}_{event_start}_{event_end}_{room_name}"
     
-    with meeting_title_cache_lock:
-        meeting_title_cache[cache_key] = {
-            "title": title,
-            "timestamp": datetime.now()
-        }
-        print(f"[CACHE STORE] Cached title for {organizer_email}", flush=True)
+    state.set(f"title:{cache_key}", {"title": title, "cached_at": time.time()}, ttl=CACHE_MAX_AGE_SECONDS)
+    print(f"[CACHE STORE] Cached title for {organizer_email}", flush=True)
 
 def cleanup_expired_cache():
-    """Remove expired entries from cache. Called periodically."""
-    with meeting_title_cache_lock:
-        now = datetime.now()
-        expired_keys = [
-            key for key, value in meeting_title_cache.items()
-            if (now - value["timestamp"]).total_seconds() >= CACHE_MAX_AGE_SECONDS
-        ]
-        
-        for key in expired_keys:
-            del meeting_title_cache[key]
-        
-        if expired_keys:
-            print(f"[CACHE CLEANUP] Removed {len(expired_keys)} expired entries", flush=True)
+    """Sample the title and SWR cache sizes (for the metric and /health) at most every
+    CACHE_SIZE_SAMPLE_SECONDS; expired entries are dropped by the backend. Returns the title cache size."""
+    now = time.time()
+    if now - cache_size_sample["at"] >= CACHE_SIZE_SAMPLE_SECONDS:
+        cache_size_sample.update(at=now, titles=len(state.keys("title:")), meetings=meetings_cache.size(),
+                                 rooms=rooms_cache.size(), delegates=delegates_cache.size())
+        TITLE_CACHE_SIZE.set(cache_size_sample["titles"])
+    return cache_size_sample["titles"]
 
 # ---- Input Validation Functions ----
 
@@ -254,17 +1394,26 @@ def validate_working_hours(working_hours):
     return working_hours
 
 def load_working_hours():
-    """Load working hours from local file"""
+    """Load working hours from the shared state backend, seeded from the local file"""
+    if state.shared:
+        all_hours = state.get("working_hours")
+        if all_hours is not None:
+            return all_hours
     try:
         with open(WORKING_HOURS_FILE, 'r') as f:
-            return json.load(f)
+            all_hours = json.load(f)
     except FileNotFoundError:
-        return {}
+        all_hours = {}
+    if state.shared:
+        state.set_if_absent("working_hours", all_hours)
+    return all_hours
 
 def save_working_hours_to_file(room_email, working_hours):
-    """Save working hours to local file"""
+    """Save working hours to the shared state backend and the local file (kept as backup)"""
     all_hours = load_working_hours()
     all_hours[room_email] = working_hours
+    if state.shared:
+        state.set("working_hours", all_hours)
     with open(WORKING_HOURS_FILE, 'w') as f:
         json.dump(all_hours, f, indent=2)
 
@@ -273,110 +1422,250 @@ def save_working_hours_to_file(room_email, working_hours):
 
 
 # ---- Get MS Graph token using client credentials ----
+# App token cache: one client-credentials token is reused until shortly before it expires, shared by
+# all workers through the state backend ("token:app"); this also keeps the Authorization header
+# stable so identical Graph reads can be coalesced
+app_token_lock = Lock()
+APP_TOKEN_REFRESH_MARGIN_SECONDS = 5 * 60
+
+
 def get_token():
-    data = {
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "scope": "https://graph.microsoft.com/.default",
-        "grant_type": "client_credentials"
-    }
-    r = requests.post(TOKEN_URL, data=data)
-    if r.status_code != 200:
-        print(f"Token error: {r.status_code}")
-        print(f"Response: {r.text}")
-    r.raise_for_status()
-    return r.json()["access_token"]
+    if GRAPH_REPLAY_FILE:
+        # Replayed responses do not need a real token
+        return "replay-token"
+    with app_token_lock:
+        cached = state.get("token:app")
+        if cached and time.time() < cached["expires_at"] - APP_TOKEN_REFRESH_MARGIN_SECONDS:
+            return cached["token"]
+        data = {
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "scope": "https://graph.microsoft.com/.default",
+            "grant_type": "client_credentials"
+        }
+        r = requests.post(TOKEN_URL, data=data, timeout=10)
+        if r.status_code != 200:
+            print(f"Token error: {r.status_code}")
+            print(f"Response: {r.text}")
+        TOKEN_FETCHES.inc(grant_type="client_credentials", outcome="success" if r.status_code == 200 else "failure")
+        r.raise_for_status()
+        tokens = r.json()
+        expires_in = tokens.get("expires_in", 3599)
+        state.set("token:app", {"token": tokens["access_token"], "expires_at": time.time() + expires_in},
+                  ttl=max(1, expires_in - APP_TOKEN_REFRESH_MARGIN_SECONDS))
+        return tokens["access_token"]
 
 
-def get_user_token():
-    """Get valid user access token, refreshing if expired"""
-    access_token = session.get('access_token')
-    refresh_token = session.get('refresh_token')
-    expires_at_str = session.get('token_expires_at')
-    
-    if not access_token:
-        return None
-    
-    # Check if token is expired or will expire soon (within 5 minutes)
-    if expires_at_str and refresh_token:
-        try:
-            expires_at = datetime.fromisoformat(expires_at_str)
-            if datetime.now() >= expires_at - timedelta(minutes=5):
-                # Token expired or expiring soon, try to refresh
-                try:
-                    token_data = {
-                        "client_id": CLIENT_ID,
-                        "client_secret": CLIENT_SECRET,
-                        "refresh_token": refresh_token,
-                        "grant_type": "refresh_token",
-                        "scope": "openid profile email User.Read Calendars.ReadWrite offline_access"
-                    }
-                    
-                    token_response = requests.post(TOKEN_URL, data=token_data, timeout=10)
-                    if token_response.status_code == 200:
-                        tokens = token_response.json()
-                        new_access_token = tokens.get("access_token")
-                        new_refresh_token = tokens.get("refresh_token", refresh_token)
-                        expires_in = tokens.get("expires_in", 3600)
-                        
-                        # Update session with new tokens
-                        new_expires_at = datetime.now() + timedelta(seconds=expires_in)
-                        session['access_token'] = new_access_token
-                        session['refresh_token'] = new_refresh_token
-                        session['token_expires_at'] = new_expires_at.isoformat()
-                        
-                        return new_access_token
-                    else:
-                        print(f"Token refresh failed: {token_response.status_code}")
-                        print(f"Response: {token_response.text}")
-                        # Token refresh failed, return None so user needs to re-login
-                        return None
-                except Exception as e:
-                    print(f"Error refreshing token: {str(e)}")
-                    return None
-        except Exception as e:
-            print(f"Error checking token expiration: {str(e)}")
-    
-    # Return token even if we can't refresh (will work until it expires)
-    return access_token
+# ---- Delegated user tokens ----
+# Access and refresh tokens live in a small SQLite database shared by all gunicorn workers; the
+# session only holds an opaque token id. A background thread refreshes tokens of active users
+# before they expire, so booking requests never wait for the token endpoint.
+USER_TOKEN_DB = os.getenv('USER_TOKEN_DB', 'user_tokens.db')
+USER_TOKEN_REFRESH_AHEAD_SECONDS = int(os.getenv('USER_TOKEN_REFRESH_AHEAD_SECONDS', '600'))
+USER_TOKEN_CHECK_SECONDS = 60
+USER_TOKEN_IDLE_SECONDS = int(app.config['PERMANENT_SESSION_LIFETIME'].total_seconds())  # Same as the session
+USER_SCOPES = "openid profile email User.Read Calendars.ReadWrite offline_access"
 
 
-def get_room_delegates(room_email, token):
-    """Get delegates for a room mailbox"""
+class UserTokenStore:
+    """SQLite table of delegated tokens keyed by a random token id"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS user_tokens (
+                token_id TEXT PRIMARY KEY,
+                user_email TEXT,
+                access_token TEXT NOT NULL,
+                refresh_token TEXT,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                refresh_lease REAL NOT NULL DEFAULT 0
+            )""")
+        os.chmod(path, 0o600)
+
+    def _connect(self):
+        """One connection per thread (used as a transaction context manager)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        return conn
+
+    def save(self, token_id, user_email, access_token, refresh_token, expires_at):
+        with self._connect() as conn:
+            conn.execute("""INSERT INTO user_tokens (token_id, user_email, access_token, refresh_token, expires_at, last_used)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(token_id) DO UPDATE SET access_token = excluded.access_token,
+                                refresh_token = COALESCE(excluded.refresh_token, refresh_token),
+                                expires_at = excluded.expires_at, refresh_lease = 0""",
+                         (token_id, user_email, access_token, refresh_token, expires_at, time.time()))
+
+    def get(self, token_id):
+        """Token row as a dict (None when unknown); marks the user as active"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM user_tokens WHERE token_id = ?", (token_id,)).fetchone()
+            if row and now - row["last_used"] > USER_TOKEN_CHECK_SECONDS:
+                conn.execute("UPDATE user_tokens SET last_used = ? WHERE token_id = ?", (now, token_id))
+        return dict(row) if row else None
+
+    def delete(self, token_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM user_tokens WHERE token_id = ?", (token_id,))
+
+    def claim_refresh(self, token_id, seconds=60):
+        """Take a short lease so only one worker refreshes a token"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE user_tokens SET refresh_lease = ? WHERE token_id = ? AND refresh_lease < ?",
+                                  (now + seconds, token_id, now))
+        return cursor.rowcount == 1
+
+    def due_for_refresh(self):
+        """Tokens of active users that expire within USER_TOKEN_REFRESH_AHEAD_SECONDS"""
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute("""SELECT * FROM user_tokens WHERE refresh_token IS NOT NULL
+                                   AND expires_at < ? AND last_used > ?""",
+                                (now + USER_TOKEN_REFRESH_AHEAD_SECONDS, now - USER_TOKEN_IDLE_SECONDS)).fetchall()
+        return [dict(row) for row in rows]
+
+    def purge_idle(self):
+        """Remove tokens whose session has expired"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM user_tokens WHERE last_used < ?", (time.time() - USER_TOKEN_IDLE_SECONDS,))
+
+
+user_tokens = UserTokenStore(USER_TOKEN_DB)
+
+
+def refresh_user_token(row):
+    """Redeem a stored refresh token; returns the new access token or None"""
+    token_data = {
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "refresh_token": row["refresh_token"],
+        "grant_type": "refresh_token",
+        "scope": USER_SCOPES
+    }
     try:
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        # Get mailbox delegates
-        url = f"{GRAPH_ENDPOINT}/users/{room_email}/mailboxSettings/delegateMeetingMessageDeliveryOptions"
-        delegates_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/calendarPermissions"
-        
-        r = requests.get(delegates_url, headers=headers)
-        if r.status_code == 200:
-            permissions = r.json().get("value", [])
-            # Filter for delegates with write access
-            delegates = []
-            for perm in permissions:
-                if perm.get("role") in ["write", "owner", "delegate"]:
-                    email_addr = perm.get("emailAddress", {})
-                    if email_addr.get("address"):
-                        delegates.append({
-                            "email": email_addr.get("address"),
-                            "name": email_addr.get("name", email_addr.get("address")),
-                            "role": perm.get("role")
-                        })
-            return delegates
-        return []
+        token_response = requests.post(TOKEN_URL, data=token_data, timeout=10)
+    except Exception as e:
+        print(f"Error refreshing token: {str(e)}", flush=True)
+        return None
+    TOKEN_FETCHES.inc(grant_type="refresh_token",
+                      outcome="success" if token_response.status_code == 200 else "failure")
+    if token_response.status_code != 200:
+        print(f"Token refresh failed for {row['user_email']}: {token_response.status_code}", flush=True)
+        print(f"Response: {token_response.text}", flush=True)
+        return None
+    tokens = token_response.json()
+    user_tokens.save(row["token_id"], row["user_email"], tokens.get("access_token"),
+                     tokens.get("refresh_token"), time.time() + tokens.get("expires_in", 3600))
+    return tokens.get("access_token")
+
+
+def run_user_token_refresher():
+    """Background loop: refresh expiring tokens of active users, drop tokens of expired sessions"""
+    while True:
+        try:
+            for row in user_tokens.due_for_refresh():
+                if user_tokens.claim_refresh(row["token_id"]):
+                    refresh_user_token(row)
+            user_tokens.purge_idle()
+        except Exception as e:
+            print(f"User token refresher failed: {e}", flush=True)
+        time.sleep(USER_TOKEN_CHECK_SECONDS)
+
+
+user_token_refresher_lock = Lock()
+user_token_refresher_started = Event()
+
+
+def start_user_token_refresher():
+    """Start the refresher thread once per process; called from gunicorn's post_worker_init"""
+    with user_token_refresher_lock:
+        if user_token_refresher_started.is_set():
+            return
+        user_token_refresher_started.set()
+    Thread(target=run_user_token_refresher, name="arcrooms-user-tokens", daemon=True).start()
+
+
+def get_user_token():
+    """Get valid user access token from the token store (refreshed ahead of expiry in the background)"""
+    token_id = session.get('token_id')
+    if not token_id:
+        return None
+    row = user_tokens.get(token_id)
+    if not row:
+        return None
+    if time.time() < row["expires_at"] - 60:
+        return row["access_token"]
+    # Missed by the background refresher (e.g. right after a restart): refresh inline once
+    if row["refresh_token"] and user_tokens.claim_refresh(token_id):
+        return refresh_user_token(row)
+    # Return token even if we can't refresh (will work until it expires)
+    return row["access_token"] if time.time() < row["expires_at"] else None
+
+
+def get_room_delegates(room_email, token):
+    """Get delegates for a room mailbox (served from the stale-while-revalidate cache)"""
+    try:
+        delegates, _, _ = delegates_cache.get(room_email, lambda: fetch_room_delegates(room_email, token))
+        return delegates
     except Exception as e:
         print(f"Error getting delegates for {room_email}: {e}")
         return []
 
 
+def fetch_room_delegates(room_email, token):
+    """Fetch delegates from calendarPermissions; raises on throttling/server errors so cached data is kept"""
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+    
+    delegates_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/calendarPermissions"
+    
+    r = graph_get(delegates_url, headers=headers, timeout=10)
+    if r.status_code == 429 or r.status_code >= 500:
+        r.raise_for_status()
+    if r.status_code == 200:
+        permissions = r.json().get("value", [])
+        # Filter for delegates with write access
+        delegates = []
+        for perm in permissions:
+            if perm.get("role") in ["write", "owner", "delegate"]:
+                email_addr = perm.get("emailAddress", {})
+                if email_addr.get("address"):
+                    delegates.append({
+                        "email": email_addr.get("address"),
+                        "name": email_addr.get("name", email_addr.get("address")),
+                        "role": perm.get("role")
+                    })
+        return delegates
+    return []
+
+
 def is_user_delegate(user_email, room_email, token):
-    """Check if user is a delegate for the room"""
-    delegates = get_room_delegates(room_email, token)
+    """Check if user is a delegate for the room.
+
+    Unlike the room list, this never answers from delegates older than DELEGATE_AUTH_MAX_AGE: they are
+    re-read first, and when Graph fails access is refused, so a revoked delegate does not keep access.
+    """
+    age = delegates_cache.age(room_email)
+    try:
+        if age is None or age > DELEGATE_AUTH_MAX_AGE:
+            delegates = delegates_cache.refresh(room_email, lambda: fetch_room_delegates(room_email, token))
+        else:
+            delegates, _, _ = delegates_cache.get(room_email, lambda: fetch_room_delegates(room_email, token))
+    except Exception as e:
+        print(f"Error checking delegates for {room_email}, refusing access: {e}", flush=True)
+        return False
     user_email_lower = user_email.lower()
     return any(d["email"].lower() == user_email_lower for d in delegates)
 
@@ -390,7 +1679,7 @@ def check_working_hours(room_email, date_str, start_time, end_time, token):
         }
         
         url = f"{GRAPH_ENDPOINT}/users/{room_email}/mailboxSettings/workingHours"
-        r = requests.get(url, headers=headers, timeout=10)
+        r = graph_get(url, headers=headers, timeout=10)
         
         if r.status_code != 200:
             # No working hours set, allow booking
@@ -466,7 +1755,7 @@ def admin_panel():
 def login():
     redirect_param = request.args.get('redirect', '')
     state = f"{secrets.token_hex(16)}|{redirect_param}"
-    auth_url = f"{AUTH_URL}?client_id={CLIENT_ID}&response_type=code&redirect_uri={REDIRECT_URI}&response_mode=query&scope=openid profile email User.Read Calendars.ReadWrite offline_access&state={state}"
+    auth_url = f"{AUTH_URL}?client_id={CLIENT_ID}&response_type=code&redirect_uri={REDIRECT_URI}&response_mode=query&scope={USER_SCOPES}&state={state}"
     return redirect(auth_url)
 
 
@@ -480,7 +1769,7 @@ def auth_callback():
         return "Error: No authorization code received", 400
     
     # Check if user is already logged in (code may have been redeemed already)
-    if session.get('user') and session.get('access_token'):
+    if session.get('user') and session.get('token_id'):
         print("User already logged in, skipping token exchange")
         return redirect('/arcrooms/')
     
@@ -498,7 +1787,9 @@ def auth_callback():
         "grant_type": "authorization_code"
     }
     
-    token_response = requests.post(TOKEN_URL, data=token_data)
+    token_response = requests.post(TOKEN_URL, data=token_data, timeout=10)
+    TOKEN_FETCHES.inc(grant_type="authorization_code",
+                      outcome="success" if token_response.status_code == 200 else "failure")
     if token_response.status_code != 200:
         error_detail = token_response.json() if token_response.headers.get('content-type', '').startswith('application/json') else token_response.text
         print(f"Token exchange failed: {token_response.status_code}")
@@ -518,7 +1809,7 @@ def auth_callback():
     
     # Get user info
     headers = {"Authorization": f"Bearer {access_token}"}
-    user_response = requests.get(f"{GRAPH_ENDPOINT}/me", headers=headers)
+    user_response = graph_get(f"{GRAPH_ENDPOINT}/me", headers=headers)
     
     if user_response.status_code == 200:
         user_data = user_response.json()
@@ -528,10 +1819,10 @@ def auth_callback():
             'email': user_data.get('mail') or user_data.get('userPrincipalName'),
             'id': user_data.get('id')
         }
-        session['access_token'] = access_token
-        if refresh_token:
-            session['refresh_token'] = refresh_token
-        session['token_expires_at'] = expires_at.isoformat()
+        # Tokens stay server-side; the session only references them
+        token_id = secrets.token_urlsafe(32)
+        user_tokens.save(token_id, session['user']['email'], access_token, refresh_token, expires_at.timestamp())
+        session['token_id'] = token_id
         session['login_redirect'] = redirect_to
     
     return redirect('/arcrooms/')
@@ -540,6 +1831,8 @@ def auth_callback():
 # ---- Logout endpoint ----
 @app.get("/arcrooms/logout")
 def logout():
+    if session.get('token_id'):
+        user_tokens.delete(session['token_id'])
     session.clear()
     return redirect('/arcrooms/')
 
@@ -552,222 +1845,1851 @@ def clear_redirect():
     return jsonify({"success": True})
 
 
-# ---- API endpoint: get all meetings for dashboard ----
-@app.get("/arcrooms/api/meetings")
-def get_meetings():
+# ---- Compact meeting records ----
+# The room store and caches hold MeetingRecord objects instead of 12-key dicts: repeated strings are
+# interned, times are integer minutes and HTML bodies live compressed and deduplicated out of line.
+# Dicts are only built at the JSON boundary (to_dict).
+LOCAL_EPOCH = datetime(1970, 1, 1)
+
+
+def to_local_minutes(value):
+    """Naive local "YYYY-MM-DDTHH:MM[:SS]" (or datetime) -> minutes since 1970-01-01 local; None stays None"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value[:16])
+    return int((value - LOCAL_EPOCH).total_seconds() // 60)
+
+
+@lru_cache(maxsize=65536)
+def from_local_minutes(minutes):
+    """Inverse of to_local_minutes, formatted like Graph's local times without fractions (memoized:
+    a meetings window holds only a few thousand distinct minutes)"""
+    if minutes is None:
+        return ""
+    return (LOCAL_EPOCH + timedelta(minutes=minutes)).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def intern_text(value):
+    return sys.intern(value) if value else ""
+
+
+class MeetingBodies:
+    """Event bodies, zlib-compressed and deduplicated by content hash"""
+
+    SWEEP_GRACE_SECONDS = 300
+
+    def __init__(self):
+        self.lock = Lock()
+        self.blobs = {}  # digest -> [compressed bytes, last stored epoch seconds]
+
+    def put(self, body):
+        if not body:
+            return None
+        data = body.encode("utf-8")
+        digest = hashlib.blake2b(data, digest_size=12).hexdigest()
+        with self.lock:
+            blob = self.blobs.get(digest)
+            if blob:
+                blob[1] = time.time()
+            else:
+                self.blobs[digest] = [zlib.compress(data), time.time()]
+        return sys.intern(digest)
+
+    def get(self, digest):
+        if not digest:
+            return ""
+        with self.lock:
+            blob = self.blobs.get(digest)
+        return zlib.decompress(blob[0]).decode("utf-8") if blob else ""
+
+    def sweep(self, live_digests):
+        """Drop bodies no record refers to (with a grace period for records still being built)"""
+        cutoff = time.time() - self.SWEEP_GRACE_SECONDS
+        with self.lock:
+            for digest in [d for d, blob in self.blobs.items() if d not in live_digests and blob[1] < cutoff]:
+                del self.blobs[digest]
+
+    def size_bytes(self):
+        with self.lock:
+            return sum(len(blob[0]) for blob in self.blobs.values())
+
+
+meeting_bodies = MeetingBodies()
+
+
+class MeetingRecord:
+    """One room meeting as kept in memory (see to_dict for the API shape)"""
+    __slots__ = ("id", "room", "room_email", "subject", "start", "end", "status", "room_response",
+                 "organizer_email", "organizer_name", "body_ref", "is_organizer", "pending")
+
+    def __init__(self, id, room, room_email, subject, start, end, status, room_response,
+                 organizer_email, organizer_name, body_ref=None, is_organizer=False, pending=False):
+        self.id = id
+        self.room = intern_text(room)
+        self.room_email = intern_text(room_email)
+        self.subject = subject
+        self.start = start  # local epoch minutes
+        self.end = end
+        self.status = intern_text(status)
+        self.room_response = intern_text(room_response)
+        self.organizer_email = intern_text(organizer_email)
+        self.organizer_name = intern_text(organizer_name)
+        self.body_ref = body_ref
+        self.is_organizer = bool(is_organizer)
+        self.pending = bool(pending)  # Written through by a booking action, not yet seen in Graph
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, MeetingRecord) and self._values() == other._values()
+
+    __hash__ = None
+
+    def to_dict(self, include_body=True):
+        meeting = {
+            "id": self.id,
+            "room": self.room,
+            "roomEmail": self.room_email,
+            "subject": self.subject,
+            "start": from_local_minutes(self.start),
+            "end": from_local_minutes(self.end),
+            "status": self.status,
+            "roomResponse": self.room_response,
+            "organizerEmail": self.organizer_email,
+            "organizerName": self.organizer_name,
+            "isOrganizer": self.is_organizer
+        }
+        if self.pending:
+            meeting["pending"] = True
+        if include_body:
+            meeting["body"] = meeting_bodies.get(self.body_ref)
+        return meeting
+
+    def to_row(self):
+        """JSON-friendly list for shared state backends (body inline)"""
+        return [self.id, self.room, self.room_email, self.subject, self.start, self.end, self.status,
+                self.room_response, self.organizer_email, self.organizer_name,
+                meeting_bodies.get(self.body_ref), self.is_organizer, self.pending]
+
+    @classmethod
+    def from_row(cls, row):
+        (meeting_id, room, room_email, subject, start, end, status, room_response,
+         organizer_email, organizer_name, body, is_organizer) = row[:12]
+        return cls(meeting_id, room, room_email, subject, start, end, status, room_response,
+                   organizer_email, organizer_name, meeting_bodies.put(body), is_organizer,
+                   pending=len(row) > 12 and row[12])
+
+    def with_status(self, status, pending):
+        return MeetingRecord(self.id, self.room, self.room_email, self.subject, self.start, self.end, status,
+                             self.room_response, self.organizer_email, self.organizer_name, self.body_ref,
+                             self.is_organizer, pending)
+
+
+def encode_meetings_result(result):
+    """meetings_cache value -> JSON-friendly form (only used with shared state backends)"""
+    return dict(result, meetings=[m.to_row() for m in result["meetings"]])
+
+
+def decode_meetings_result(result):
+    return dict(result, meetings=[MeetingRecord.from_row(row) for row in result["meetings"]])
+
+
+# ---- Server-side room calendar store ----
+class RoomCalendarStore:
+    """Last good meetings per room, with a version that increases on every change.
+
+    Listeners are called as listener(room_email, old_meetings, new_meetings) after a room changed.
+    Every room is also written to the shared state backend ("room:<email>"); with a shared backend,
+    follow_snapshot() applies rooms synced by other workers so their listeners fire here too.
+
+    Booking actions write through as pending changes ("pending:<email>" in the state backend): they
+    are laid over every sync of the room until Graph shows the same, or PENDING_SECONDS pass.
+
+    by_organizer indexes the meetings by organizer address; a room change only moves that room's
+    meetings, so organizer_meetings() costs O(k) in the organizer's own meetings.
     """
-    Get all meetings with PARALLEL loading for better performance
+
+    SNAPSHOT_POLL_SECONDS = 2
+    PENDING_SECONDS = 600
+    PENDING_LOCK_SECONDS = 5
+
+    def __init__(self):
+        self.lock = Lock()
+        self.rooms = {}  # room_email -> {"room": display name, "meetings": [...], "fetched_at": epoch seconds}
+        self.version = 0
+        self.by_organizer = {}  # organizer email (lowercase) -> {(room_email, meeting id): record}
+        self.listeners = []
+        self.snapshot_rev = None
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def put_room(self, room_email, room_name, meetings, fetched_at=None, publish=True, confirm=True):
+        """Replace a room's meetings after a successful sync; returns True when they changed.
+
+        confirm=True means meetings are Graph's own view, so pending changes it already reflects are
+        dropped; the remaining pending changes are applied on top either way.
+        """
+        meetings = self._apply_pending(room_email, meetings, confirm)
+        entry = {"room": room_name, "meetings": meetings, "fetched_at": fetched_at or time.time()}
+        with self.lock:
+            old = self.rooms.get(room_email)
+            old_meetings = old["meetings"] if old else []
+            changed = old is None or old_meetings != meetings
+            if changed:
+                self.version += 1
+            # Store version and time of the room's last change (per worker; used for feed caching)
+            entry["version"] = self.version if changed else old["version"]
+            entry["changed_at"] = time.time() if changed else old["changed_at"]
+            self.rooms[room_email] = entry
+            if changed:
+                self._index_organizers(room_email, old_meetings, meetings)
+        if publish and state.shared:
+            state.set(f"room:{room_email.lower()}", {"room": room_name, "fetched_at": entry["fetched_at"], "email": room_email,
+                                                     "meetings": [m.to_row() for m in meetings]})
+            if changed:
+                state.set("rooms:rev", secrets.token_hex(8))
+        if changed:
+            for listener in self.listeners:
+                try:
+                    listener(room_email, old_meetings, meetings)
+                except Exception as e:
+                    print(f"Error in room store listener {getattr(listener, '__name__', listener)}: {e}", flush=True)
+        return changed
+
+    def write_through(self, room_email, kind, event_id, record=None, status=None):
+        """Show a booking action right away: kind is "create" (record), "status" (status) or "delete"."""
+        change = {"kind": kind, "id": event_id, "status": status,
+                  "row": record.to_row() if record else None, "expires_at": time.time() + self.PENDING_SECONDS}
+        key = f"pending:{room_email.lower()}"
+        with self._pending_lease(room_email):
+            changes = [c for c in state.get(key) or [] if c["id"] != event_id and c["expires_at"] > time.time()]
+            state.set(key, changes + [change], ttl=self.PENDING_SECONDS)
+        entry = self.get_room(room_email)
+        if entry:
+            self.put_room(room_email, entry["room"], entry["meetings"], entry["fetched_at"], confirm=False)
+
+    @contextmanager
+    def _pending_lease(self, room_email):
+        """Backend lease around a read-modify-write of a room's pending changes, which all workers share"""
+        key = f"lease:pending:{room_email.lower()}"
+        holder = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        deadline = time.monotonic() + self.PENDING_LOCK_SECONDS
+        while not state.set_if_absent(key, holder, ttl=self.PENDING_LOCK_SECONDS):
+            if time.monotonic() > deadline:
+                # The holder is gone without releasing; its lease expires in the backend anyway
+                print(f"[WRITE-THROUGH] No lease on pending changes of {room_email}, updating anyway", flush=True)
+                break
+            time.sleep(0.02)
+        try:
+            with self.lock:
+                yield
+        finally:
+            if state.get(key) == holder:
+                state.delete(key)
+
+    def _apply_pending(self, room_email, meetings, confirm):
+        """Lay the room's pending changes over meetings, first dropping those Graph confirms"""
+        key = f"pending:{room_email.lower()}"
+        changes = state.get(key)
+        if not changes:
+            return meetings
+        by_id = {m.id: m for m in meetings}
+        now = time.time()
+        remaining = []
+        for change in changes:
+            current = by_id.get(change["id"])
+            if change["kind"] == "create":
+                created = MeetingRecord.from_row(change["row"])
+                # The room's copy has its own id; match it on time and organizer
+                confirmed = any(m.id != created.id and m.start == created.start and m.end == created.end
+                                and m.organizer_email.lower() == created.organizer_email.lower() for m in meetings)
+            elif change["kind"] == "status":
+                confirmed = current is None or (current.status == change["status"] and not current.pending)
+            else:
+                confirmed = current is None
+            if change["expires_at"] > now and not (confirm and confirmed):
+                remaining.append(change)
+        if len(remaining) != len(changes):
+            dropped = [change for change in changes if change not in remaining]
+            with self._pending_lease(room_email):
+                # Re-read: another worker may have added a change since
+                kept = [change for change in state.get(key) or [] if change not in dropped]
+                if kept:
+                    state.set(key, kept, ttl=max(1, int(max(c["expires_at"] for c in kept) - now)))
+                else:
+                    state.delete(key)
+        for change in remaining:
+            if change["kind"] == "create" and change["id"] not in by_id:
+                meetings = meetings + [MeetingRecord.from_row(change["row"])]
+            elif change["kind"] == "status" and change["id"] in by_id:
+                meetings = [m.with_status(change["status"], True) if m.id == change["id"] else m for m in meetings]
+            elif change["kind"] == "delete":
+                meetings = [m for m in meetings if m.id != change["id"]]
+        return meetings
+
+    def _index_organizers(self, room_email, old_meetings, meetings):
+        """Replace a room's old meetings by its new ones in by_organizer; caller holds the lock"""
+        for meeting in old_meetings:
+            organizer = meeting.organizer_email.lower()
+            indexed = self.by_organizer.get(organizer)
+            if indexed is not None:
+                indexed.pop((room_email, meeting.id), None)
+                if not indexed:
+                    del self.by_organizer[organizer]
+        for meeting in meetings:
+            if meeting.organizer_email:
+                self.by_organizer.setdefault(meeting.organizer_email.lower(), {})[(room_email, meeting.id)] = meeting
+
+    def organizer_meetings(self, organizer_email):
+        """Meetings organized by organizer_email in all rooms, by start time"""
+        with self.lock:
+            meetings = list(self.by_organizer.get(organizer_email.lower(), {}).values())
+        return sorted(meetings, key=lambda m: (m.start or 0, m.room))
+
+    def get_room(self, room_email):
+        """Newest copy of a room, local or from the shared snapshot"""
+        with self.lock:
+            entry = self.rooms.get(room_email)
+            entry = dict(entry) if entry else None
+        if state.shared:
+            shared = state.get(f"room:{room_email.lower()}")
+            if shared and (entry is None or shared["fetched_at"] > entry["fetched_at"]):
+                return {"room": shared["room"], "fetched_at": shared["fetched_at"],
+                        "meetings": [MeetingRecord.from_row(row) for row in shared["meetings"]]}
+        return entry
+
+    def all_meetings(self):
+        with self.lock:
+            return [meeting for entry in self.rooms.values() for meeting in entry["meetings"]]
+
+    def body_refs(self):
+        with self.lock:
+            return {meeting.body_ref for entry in self.rooms.values() for meeting in entry["meetings"]}
+
+    def load_snapshot(self):
+        """Apply rooms from the shared snapshot that are newer than the local copy"""
+        if not state.shared:
+            return 0
+        shared = state.get_many(state.keys("room:"))
+        for entry in shared.values():
+            with self.lock:
+                local_entry = self.rooms.get(entry["email"])
+            if local_entry is None or entry["fetched_at"] > local_entry["fetched_at"]:
+                self.put_room(entry["email"], entry["room"], [MeetingRecord.from_row(row) for row in entry["meetings"]],
+                              entry["fetched_at"], publish=False, confirm=False)
+        return len(shared)
+
+    def follow_snapshot(self):
+        """Background loop (shared backends): pick up rooms other workers synced"""
+        while True:
+            try:
+                rev = state.get("rooms:rev")
+                if rev != self.snapshot_rev:
+                    self.snapshot_rev = rev
+                    self.load_snapshot()
+            except Exception as e:
+                print(f"Error following room snapshot: {e}", flush=True)
+            time.sleep(self.SNAPSHOT_POLL_SECONDS)
+
+
+room_store = RoomCalendarStore()
+
+
+# ---- Room calendar fetching ----
+MEETINGS_WINDOW_DAYS = 10
+MEETINGS_DEADLINE_SECONDS = float(os.getenv('MEETINGS_DEADLINE_SECONDS', '5'))  # Max wait for all rooms in /api/meetings
+ROOM_BUDGET_SECONDS = float(os.getenv('ROOM_BUDGET_SECONDS', '3'))  # Per room; later organizer lookups move to the background
+ROOM_FETCH_WORKERS = int(os.getenv('ROOM_FETCH_WORKERS', '16'))
+
+# Persistent pool so fetches that overrun a request deadline keep running and warm the store
+room_fetch_executor = ThreadPoolExecutor(max_workers=ROOM_FETCH_WORKERS, thread_name_prefix="arcrooms-room")
+room_fetches_in_flight = {}  # room_email -> Future, so a slow room is never fetched twice at once
+room_fetches_lock = Lock()
+
+STALE_ROOMS = Counter(
+    "arcrooms_stale_rooms_total",
+    "Rooms served from their last stored data in /api/meetings (reason: timeout or error)",
+    ("room", "reason"))
+
+
+def meetings_window():
+    """UTC window of the dashboard: today 00:00 until MEETINGS_WINDOW_DAYS later"""
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=MEETINGS_WINDOW_DAYS)
+
+
+def fetch_room_events(room, headers, window_start, window_end):
+    """Raw calendarView events of a room (None when Graph could not be read)"""
+    room_email = room.get("emailAddress")
+    calendar_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/calendarView"
+    params = {
+        "startDateTime": window_start.isoformat(),
+        "endDateTime": window_end.isoformat(),
+        "$select": "id,subject,start,end,showAs,body,organizer,location,isOrganizer,isCancelled,responseStatus,attendees,webLink",
+        "$top": 100
+    }
+    
+    calendar_headers = headers.copy()
+    # Request Europe/Amsterdam times - Graph returns local time without Z
+    calendar_headers["Prefer"] = 'outlook.timezone="Europe/Amsterdam"'
+    
+    calendar_r = graph_get(calendar_url, headers=calendar_headers, params=params, timeout=10)
+    
+    if calendar_r.status_code != 200:
+        print(f"Calendar for {room_email} returned {calendar_r.status_code}", flush=True)
+        return None
+    return calendar_r.json().get("value", [])
+
+
+def build_room_meetings(room, events, headers, timer=None, lookup_deadline=None):
     """
-    try:
-        token = get_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        # Get all rooms
-        rooms_url = f"{GRAPH_ENDPOINT}/places/microsoft.graph.room"
-        rooms_r = requests.get(rooms_url, headers=headers, timeout=10)
-        rooms_r.raise_for_status()
-        
-        all_rooms = {}
-        for room in rooms_r.json().get("value", []):
-            all_rooms[room["id"]] = room
+    Turn calendarView events into dashboard meetings, resolving hidden subjects via the organizer.
+    Returns (meetings, deferred): lookups not started before lookup_deadline get the fallback subject.
+    """
+    room_email = room.get("emailAddress")
+    room_meetings = []
+    deferred = 0
+    
+    for event in events:
+        # Skip cancelled events
+        if event.get("isCancelled", False):
+            continue
         
-        # Get schedules for next 10 days
-        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        end = start + timedelta(days=10)
+        subject = event.get("subject", "")
+        organizer = event.get("organizer", {}).get("emailAddress", {})
+        organizer_name = organizer.get("name", "")
+        organizer_email = organizer.get("address", "")
+        body_content = event.get("body", {}).get("content", "")
+        event_id = event.get("id")
+        is_organizer = event.get("isOrganizer", False)
         
-        def fetch_room_calendar(room_id, room):
-            """Fetch calendar for a single room"""
-            room_email = room.get("emailAddress")
-            if not room_email:
-                return []
+        # If subject is hidden, try to get it from organizer's calendar
+        subject_is_hidden = (not subject or subject.strip() == "" or subject.strip() == organizer_name.strip())
+        if subject_is_hidden and not is_organizer and organizer_email:
+            event_start = event.get("start", {}).get("dateTime")
+            event_end = event.get("end", {}).get("dateTime")
+            room_display = room.get("displayName", "")
             
-            try:
-                calendar_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/calendarView"
-                params = {
-                    "startDateTime": start.isoformat(),
-                    "endDateTime": end.isoformat(),
-                    "$select": "id,subject,start,end,showAs,body,organizer,location,isOrganizer,isCancelled,responseStatus,attendees,webLink",
-                    "$top": 100
-                }
-                
-                calendar_headers = headers.copy()
-                # Request Europe/Amsterdam times - Graph returns local time without Z
-                calendar_headers["Prefer"] = 'outlook.timezone="Europe/Amsterdam"'
-                
-                calendar_r = requests.get(calendar_url, headers=calendar_headers, params=params, timeout=10)
-                
-                if calendar_r.status_code != 200:
-                    return []
-                
-                events = calendar_r.json().get("value", [])
-                room_meetings = []
-                
-                for event in events:
-                    # Skip cancelled events
-                    if event.get("isCancelled", False):
-                        continue
+            # Check cache first
+            cached_subject = get_cached_meeting_title(organizer_email, event_start, event_end, room_display)
+            if cached_subject:
+                subject = cached_subject
+            elif lookup_deadline is not None and time.perf_counter() > lookup_deadline:
+                # Room budget spent: show the fallback now and finish the lookup in the background
+                deferred += 1
+            else:
+                # Cache miss - fetch from API
+                try:
+                    org_calendar_url = f"{GRAPH_ENDPOINT}/users/{organizer_email}/calendar/calendarView"
                     
-                    subject = event.get("subject", "")
-                    organizer = event.get("organizer", {}).get("emailAddress", {})
-                    organizer_name = organizer.get("name", "")
-                    organizer_email = organizer.get("address", "")
-                    body_content = event.get("body", {}).get("content", "")
-                    event_id = event.get("id")
-                    is_organizer = event.get("isOrganizer", False)
+                    try:
+                        event_dt_str = event_start.split('T')[0] if 'T' in event_start else event_start[:10]
+                        day_start = f"{event_dt_str}T00:00:00.0000000"
+                        day_end = f"{event_dt_str}T23:59:59.9999999"
+                    except:
+                        day_start = event_start
+                        day_end = event_end
+                    
+                    org_params = {
+                        "startDateTime": day_start,
+                        "endDateTime": day_end,
+                        "$select": "id,subject,start,end,location,sensitivity",
+                        "$top": 100
+                    }
+                    org_headers = headers.copy()
+                    org_headers["Prefer"] = 'outlook.timezone="Europe/Amsterdam"'
+                    with timed_phase(timer, "organizers"):
+                        org_response = graph_get(org_calendar_url, headers=org_headers, params=org_params, timeout=5)
                     
-                    # If subject is hidden, try to get it from organizer's calendar
-                    subject_is_hidden = (not subject or subject.strip() == "" or subject.strip() == organizer_name.strip())
-                    if subject_is_hidden and not is_organizer and organizer_email:
-                        event_start = event.get("start", {}).get("dateTime")
-                        event_end = event.get("end", {}).get("dateTime")
-                        room_display = room.get("displayName", "")
+                    if org_response.status_code == 200:
+                        org_events = org_response.json().get("value", [])
                         
-                        # Check cache first
-                        cached_subject = get_cached_meeting_title(organizer_email, event_start, event_end, room_display)
-                        if cached_subject:
-                            subject = cached_subject
-                        else:
-                            # Cache miss - fetch from API
-                            try:
-                                org_calendar_url = f"{GRAPH_ENDPOINT}/users/{organizer_email}/calendar/calendarView"
-                                
-                                try:
-                                    event_dt_str = event_start.split('T')[0] if 'T' in event_start else event_start[:10]
-                                    day_start = f"{event_dt_str}T00:00:00.0000000"
-                                    day_end = f"{event_dt_str}T23:59:59.9999999"
-                                except:
-                                    day_start = event_start
-                                    day_end = event_end
+                        for org_event in org_events:
+                            org_start = org_event.get("start", {}).get("dateTime")
+                            org_end = org_event.get("end", {}).get("dateTime")
+                            org_location = org_event.get("location", {})
+                            org_location_name = org_location.get("displayName", "") if isinstance(org_location, dict) else str(org_location)
+                            
+                            time_match = (org_start == event_start and org_end == event_end)
+                            location_match = room_display and room_display.lower() in org_location_name.lower()
+                            
+                            if time_match or location_match:
+                                org_subject = org_event.get("subject", "")
+                                org_sensitivity = org_event.get("sensitivity", "normal")
                                 
-                                org_params = {
-                                    "startDateTime": day_start,
-                                    "endDateTime": day_end,
-                                    "$select": "id,subject,start,end,location,sensitivity",
-                                    "$top": 100
-                                }
-                                org_headers = headers.copy()
-                                org_headers["Prefer"] = 'outlook.timezone="Europe/Amsterdam"'
-                                org_response = requests.get(org_calendar_url, headers=org_headers, params=org_params, timeout=5)
-                                
-                                if org_response.status_code == 200:
-                                    org_events = org_response.json().get("value", [])
+                                if org_subject and org_subject.strip():
+                                    if org_sensitivity == "private":
+                                        subject = f"Bezet ({organizer_name})" if organizer_name else "Bezet"
+                                    else:
+                                        subject = f"{org_subject} ({organizer_name})" if (organizer_name and organizer_email != room_email) else org_subject
                                     
-                                    for org_event in org_events:
-                                        org_start = org_event.get("start", {}).get("dateTime")
-                                        org_end = org_event.get("end", {}).get("dateTime")
-                                        org_location = org_event.get("location", {})
-                                        org_location_name = org_location.get("displayName", "") if isinstance(org_location, dict) else str(org_location)
-                                        
-                                        time_match = (org_start == event_start and org_end == event_end)
-                                        location_match = room_display and room_display.lower() in org_location_name.lower()
-                                        
-                                        if time_match or location_match:
-                                            org_subject = org_event.get("subject", "")
-                                            org_sensitivity = org_event.get("sensitivity", "normal")
-                                            
-                                            if org_subject and org_subject.strip():
-                                                if org_sensitivity == "private":
-                                                    subject = f"Bezet ({organizer_name})" if organizer_name else "Bezet"
-                                                else:
-                                                    subject = f"{org_subject} ({organizer_name})" if (organizer_name and organizer_email != room_email) else org_subject
-                                                
-                                                # Cache the retrieved title
-                                                cache_meeting_title(organizer_email, event_start, event_end, room_display, subject)
-                                                break
-                            except Exception as e:
-                                print(f"Could not retrieve subject from organizer {organizer_email}: {str(e)}", flush=True)
-                    
-                    # Final fallback
-                    if not subject or subject.strip() == "" or subject.strip() == organizer_name.strip():
-                        subject = f"Bezet ({organizer_name})" if organizer_name else "Privé (onderwerp verborgen)"
-                    
-                    # Get room resource response status
-                    # First check responseStatus (when viewing from room's own calendar)
-                    room_response = "none"
-                    response_status = event.get("responseStatus", {})
-                    if response_status:
-                        room_response = response_status.get("response", "none")
-                    
-                    # If not found in responseStatus, check attendees list
-                    if room_response == "none":
-                        attendees = event.get("attendees", [])
-                        for attendee in attendees:
-                            attendee_email = attendee.get("emailAddress", {}).get("address", "").lower()
-                            if attendee_email == room_email.lower():
-                                room_response = attendee.get("status", {}).get("response", "none")
-                                break
-                    
-                    # Clean up datetime format (remove fractional seconds)
-                    start_dt = event.get("start", {}).get("dateTime", "")
-                    end_dt = event.get("end", {}).get("dateTime", "")
-                    if start_dt:
-                        start_dt = start_dt.split('.')[0]  # Remove fractional seconds
-                    if end_dt:
-                        end_dt = end_dt.split('.')[0]
-                    
-                    room_meetings.append({
-                        "id": event_id,
-                        "room": room.get("displayName"),
-                        "roomEmail": room_email,
-                        "subject": subject,
-                        "start": start_dt,
-                        "end": end_dt,
-                        "status": event.get("showAs", "busy"),
-                        "roomResponse": room_response,
-                        "organizerEmail": organizer_email,
-                        "organizerName": organizer.get("name", ""),
-                        "body": body_content,
-                        "isOrganizer": is_organizer
-                    })
-                
-                return room_meetings
-            except Exception as e:
-                print(f"Error processing room {room_email}: {str(e)}", flush=True)
-                return []
+                                    # Cache the retrieved title
+                                    cache_meeting_title(organizer_email, event_start, event_end, room_display, subject)
+                                    break
+                except Exception as e:
+                    print(f"Could not retrieve subject from organizer {organizer_email}: {str(e)}", flush=True)
+        
+        # Final fallback
+        if not subject or subject.strip() == "" or subject.strip() == organizer_name.strip():
+            subject = f"Bezet ({organizer_name})" if organizer_name else "Privé (onderwerp verborgen)"
         
-        # Fetch all room calendars in PARALLEL
-        all_meetings = []
+        # Get room resource response status
+        # First check responseStatus (when viewing from room's own calendar)
+        room_response = "none"
+        response_status = event.get("responseStatus", {})
+        if response_status:
+            room_response = response_status.get("response", "none")
         
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            # Submit all tasks
-            future_to_room = {
-                executor.submit(fetch_room_calendar, room_id, room): (room_id, room)
-                for room_id, room in all_rooms.items()
+        # If not found in responseStatus, check attendees list
+        if room_response == "none":
+            attendees = event.get("attendees", [])
+            for attendee in attendees:
+                attendee_email = attendee.get("emailAddress", {}).get("address", "").lower()
+                if attendee_email == room_email.lower():
+                    room_response = attendee.get("status", {}).get("response", "none")
+                    break
+        
+        room_meetings.append(MeetingRecord(
+            id=event_id,
+            room=room.get("displayName"),
+            room_email=room_email,
+            subject=subject,
+            start=to_local_minutes(event.get("start", {}).get("dateTime", "")),
+            end=to_local_minutes(event.get("end", {}).get("dateTime", "")),
+            status=event.get("showAs", "busy"),
+            room_response=room_response,
+            organizer_email=organizer_email,
+            organizer_name=organizer.get("name", ""),
+            body_ref=meeting_bodies.put(body_content),
+            is_organizer=is_organizer
+        ))
+    
+    return room_meetings, deferred
+
+
+def fetch_room_calendar(room, headers, window_start, window_end, timer=None):
+    """Fetch one room, store the result and return its meetings (None when Graph could not be read)"""
+    room_email = room.get("emailAddress")
+    ROOM_FETCH_QUEUE_DEPTH.dec()
+    started = time.perf_counter()
+    try:
+        events = fetch_room_events(room, headers, window_start, window_end)
+        if events is None:
+            return None
+        meetings, deferred = build_room_meetings(room, events, headers, timer,
+                                                 lookup_deadline=started + ROOM_BUDGET_SECONDS)
+        meetings = store_room_meetings(room, meetings, window_start, window_end)
+        if deferred:
+            print(f"[BUDGET] {room_email}: {deferred} organizer lookups continue in the background", flush=True)
+            background_executor.submit(finish_room_lookups, room, events, headers, window_start, window_end)
+        return meetings
+    except Exception as e:
+        print(f"Error processing room {room_email}: {str(e)}", flush=True)
+        return None
+    finally:
+        ROOM_FETCH_SECONDS.observe(time.perf_counter() - started, room=room.get("displayName", ""))
+
+
+def store_room_meetings(room, meetings, window_start, window_end):
+    """Store the meetings fetched for a window and return the room's full list.
+
+    A window that ends before the dashboard window (a refresh tier) only replaces what it covers:
+    stored meetings starting after it are kept.
+    """
+    room_email = room.get("emailAddress")
+    if window_end < meetings_window()[1]:
+        stored = room_store.get_room(room_email)
+        if stored:
+            keep_from = utc_to_local_minutes(window_end)
+            meetings = meetings + [m for m in stored["meetings"] if (m.start or 0) >= keep_from and not m.pending]
+    room_store.put_room(room_email, room.get("displayName"), meetings)
+    refresh_scheduler.fetched(room_email, window_start, window_end)
+    return meetings
+
+
+def finish_room_lookups(room, events, headers, window_start, window_end):
+    """Complete organizer lookups that ran past the room budget, then update the store"""
+    try:
+        meetings, _ = build_room_meetings(room, events, headers)
+        store_room_meetings(room, meetings, window_start, window_end)
+    except Exception as e:
+        print(f"Error finishing lookups for {room.get('emailAddress')}: {e}", flush=True)
+
+
+def submit_room_fetch(room, headers, window_start, window_end):
+    """Start fetching a room on the shared pool, or join the fetch already running for it.
+
+    The fetch records its phases on its own timer (future.phase_timer): it may outlive the request
+    that started it, so callers merge it only when they waited for the result.
+    """
+    room_email = room.get("emailAddress")
+    with room_fetches_lock:
+        future = room_fetches_in_flight.get(room_email)
+        if future is not None:
+            return future
+        ROOM_FETCH_QUEUE_DEPTH.inc()
+        fetch_timer = PhaseTimer()
+        future = room_fetch_executor.submit(fetch_room_calendar, room, headers, window_start, window_end, fetch_timer)
+        future.phase_timer = fetch_timer
+        room_fetches_in_flight[room_email] = future
+
+    def forget(done_future):
+        with room_fetches_lock:
+            if room_fetches_in_flight.get(room_email) is done_future:
+                del room_fetches_in_flight[room_email]
+
+    future.add_done_callback(forget)
+    return future
+
+
+# ---- Collect meetings for all rooms ----
+def dedupe_meetings(meetings):
+    """Deduplicate meetings by ID (same event can appear multiple times)"""
+    seen_ids = set()
+    unique_meetings = []
+    for meeting in meetings:
+        meeting_id = meeting.id
+        if meeting_id and meeting_id not in seen_ids:
+            seen_ids.add(meeting_id)
+            unique_meetings.append(meeting)
+        elif not meeting_id:
+            # If no ID, keep it (shouldn't happen but be safe)
+            unique_meetings.append(meeting)
+    return unique_meetings
+
+
+def collect_meetings(timer=None, deadline_seconds=None):
+    """
+    Fetch the next 10 days of meetings for every room with PARALLEL loading.
+    Waits at most deadline_seconds (MEETINGS_DEADLINE_SECONDS); rooms that are late or fail are
+    filled from their last stored data and listed in stale_rooms with its age, while late fetches
+    keep running in the background to warm the store for the next poll.
+    Returns {"meetings": [...], "rooms_count": int, "stale_rooms": [...]}.
+    Raises when no room calendar could be read, so cached data is kept instead of an empty list.
+    """
+    with timed_phase(timer, "token"):
+        token = get_token()
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+    
+    # Get all rooms
+    with timed_phase(timer, "rooms"):
+        all_rooms = get_room_directory()
+    
+    # Get schedules for next 10 days
+    window_start, window_end = meetings_window()
+    
+    # Fetch all room calendars in PARALLEL; rooms another worker refreshes come from the shared snapshot
+    calendars_started = time.perf_counter()
+    future_to_room = {}
+    all_meetings = []
+    for room in all_rooms.values():
+        if not room.get("emailAddress"):
+            continue
+        if not room_shards.owns(room["emailAddress"]):
+            stored = room_store.get_room(room["emailAddress"])
+            if stored and time.time() - stored["fetched_at"] < polling_max_age():
+                all_meetings.extend(stored["meetings"])
+                continue
+        future_to_room[submit_room_fetch(room, headers, window_start, window_end)] = room
+    
+    deadline = MEETINGS_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    done, not_done = wait(future_to_room, timeout=deadline)
+    if timer:
+        timer.add("calendars", time.perf_counter() - calendars_started)
+    
+    stale_rooms = []
+    failed_rooms = 0
+    for future, room in future_to_room.items():
+        meetings = future.result() if future in done else None
+        if meetings is not None:
+            if timer:
+                timer.merge(future.phase_timer)
+            all_meetings.extend(meetings)
+            continue
+        reason = "timeout" if future in not_done else "error"
+        failed_rooms += 1 if reason == "error" else 0
+        STALE_ROOMS.inc(room=room.get("displayName", ""), reason=reason)
+        stored = room_store.get_room(room["emailAddress"])
+        if stored:
+            all_meetings.extend(stored["meetings"])
+        stale_rooms.append({
+            "room": room.get("displayName"),
+            "roomEmail": room["emailAddress"],
+            "reason": reason,
+            "ageSeconds": round(time.time() - stored["fetched_at"]) if stored else None
+        })
+    if future_to_room and failed_rooms == len(future_to_room):
+        raise GraphUnavailableError("No room calendar could be read from Graph")
+    
+    # Cleanup expired cache entries and bodies of meetings that are gone
+    cleanup_expired_cache()
+    meeting_bodies.sweep(room_store.body_refs())
+    
+    with timed_phase(timer, "dedup"):
+        unique_meetings = dedupe_meetings(all_meetings)
+    
+    return {"meetings": unique_meetings, "rooms_count": len(all_rooms), "stale_rooms": stale_rooms}
+
+
+# ---- Tiered refresh scheduler ----
+# Today and tomorrow change minute by minute, days further out rarely. Instead of re-reading every room's
+# ten days whenever the meetings cache expires, a background scheduler refreshes each room in tiers with
+# their own pace. A due tier is read together with the nearer ones (one calendarView call from today to
+# the end of that tier). Rooms whose near days stay quiet are checked less often, down to the week pace;
+# rooms that just changed or have a meeting coming up keep the fast pace and go first.
+REFRESH_SCHEDULER = os.getenv('REFRESH_SCHEDULER', '1') == '1'
+REFRESH_TIERS = (
+    # (name, days from today it reaches, seconds between refreshes)
+    ("near", 2, float(os.getenv('REFRESH_NEAR_SECONDS', '30'))),
+    ("week", 7, float(os.getenv('REFRESH_WEEK_SECONDS', '300'))),
+    ("far", MEETINGS_WINDOW_DAYS, float(os.getenv('REFRESH_FAR_SECONDS', '1800'))),
+)
+REFRESH_ACTIVE_SECONDS = int(os.getenv('REFRESH_ACTIVE_SECONDS', '900'))  # A changed room is refreshed ahead of others this long
+REFRESH_UPCOMING_MINUTES = 60  # A room with a meeting running or starting within this time does not back off
+
+TIER_REFRESHES = Counter(
+    "arcrooms_tier_refreshes_total",
+    "Scheduled room refreshes by the furthest tier read and result (changed, unchanged, error)",
+    ("tier", "result"))
+TIER_OLDEST_SECONDS = Gauge(
+    "arcrooms_tier_oldest_seconds",
+    "Seconds since the least recently refreshed room was read, per tier",
+    ("tier",))
+
+
+def utc_to_local_minutes(value):
+    """Naive UTC datetime -> local minutes, like to_local_minutes on Graph's local times"""
+    value = value.replace(tzinfo=timezone.utc)
+    local = value.astimezone(LOCAL_TIMEZONE) if LOCAL_TIMEZONE else value.astimezone()
+    return to_local_minutes(local.replace(tzinfo=None))
+
+
+class RefreshScheduler:
+    """Refreshes room calendars per tier in a background thread (one per worker)"""
+
+    TICK_SECONDS = 1
+    LEASE_RETRY_SECONDS = 5  # Wait before trying a room again whose refresh another worker holds
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.lock = Lock()
+        self.refreshed = {}  # room_email -> epoch seconds of the last read, per tier
+        self.near_pace = {}  # room_email -> seconds between near-tier reads while the room is quiet
+        self.changed_at = {}  # room_email -> last change seen in the room store
+        self.running = set()
+        self.lease_wait = {}  # room_email -> epoch seconds before which another worker's lease is not retried
+        self.started = False
+        self.wakeup = Event()  # Set when a refresh finishes, so the next due room starts right away
+        # Leave room on the fetch pool for dashboard requests that find a room missing
+        self.slots = max(1, ROOM_FETCH_WORKERS // 2)
+
+    def start(self):
+        """Start scheduling (once, unless REFRESH_SCHEDULER=0); called at boot or from gunicorn"""
+        with self.lock:
+            if self.started or not REFRESH_SCHEDULER:
+                return False
+            self.started = True
+        # The tiers keep the room store fresh and the store updates the cached meetings, so a full
+        # re-read of every room is only a safety net
+        meetings_cache.max_age = max(meetings_cache.max_age, polling_max_age())
+        room_shards.start()
+        Thread(target=self.run, name="arcrooms-refresh", daemon=True).start()
+        return True
+
+    def interval(self, room_email, tier):
+        if tier == 0:
+            return self.near_pace.get(room_email, self.tiers[0][2])
+        return self.tiers[tier][2]
+
+    def fetched(self, room_email, window_start, window_end, at=None):
+        """Any successful read of a room (scheduled or not) counts for the tiers it covered"""
+        now = at or time.time()
+        with self.lock:
+            times = self.refreshed.setdefault(room_email, [0.0] * len(self.tiers))
+            for tier, (_, days, _) in enumerate(self.tiers):
+                if window_start + timedelta(days=days) <= window_end:
+                    times[tier] = now
+
+    def room_changed(self, room_email, old_meetings, new_meetings):
+        """Room store listener: a changed room is back at the fast pace"""
+        with self.lock:
+            if room_email not in self.refreshed:
+                return  # First load, not a change
+            self.changed_at[room_email] = time.time()
+            self.near_pace.pop(room_email, None)
+
+    def due_rooms(self, rooms):
+        """[(room, furthest due tier)], recently changed rooms first, then the most overdue"""
+        now = time.time()
+        due = []
+        with self.lock:
+            for room in rooms:
+                room_email = room["emailAddress"]
+                if room_email in self.running or self.lease_wait.get(room_email, 0) > now:
+                    continue
+                times = self.refreshed.get(room_email, [0.0] * len(self.tiers))
+                tiers = [tier for tier in range(len(self.tiers)) if now - times[tier] >= self.interval(room_email, tier)]
+                if not tiers:
+                    continue
+                tier = tiers[-1]
+                active = now - self.changed_at.get(room_email, 0) < REFRESH_ACTIVE_SECONDS
+                lateness = (now - times[tier]) / self.interval(room_email, tier)
+                due.append((not active, -lateness, room, tier))
+            for tier, (name, _, _) in enumerate(self.tiers):
+                ages = [now - self.refreshed[room["emailAddress"]][tier] for room in rooms
+                        if self.refreshed.get(room["emailAddress"], [0.0] * len(self.tiers))[tier]]
+                if ages:
+                    TIER_OLDEST_SECONDS.set(round(max(ages)), tier=name)
+        due.sort(key=lambda item: item[:2])
+        return [(room, tier) for _, _, room, tier in due]
+
+    def dispatch(self):
+        rooms = [room for room in get_room_directory().values()
+                 if room.get("emailAddress") and room_shards.owns(room["emailAddress"])]
+        SHARD_ROOMS_OWNED.set(len(rooms))
+        due = self.due_rooms(rooms)[:self.slots - len(self.running)]
+        if not due:
+            return
+        headers = {
+            "Authorization": f"Bearer {get_token()}",
+            "Content-Type": "application/json"
+        }
+        window_start, window_end = meetings_window()
+        for room, tier in due:
+            room_email = room["emailAddress"]
+            name, days, _ = self.tiers[tier]
+            tier_end = min(window_start + timedelta(days=days), window_end)
+            # Fleet-wide: with a shared backend another worker may be reading this room. The lease lasts
+            # the tier's base interval (not the room's backed-off pace), so a change is not blocked long
+            if not state.set_if_absent(f"refresh:{room_email.lower()}:{name}", os.getpid(),
+                                       ttl=max(1, self.tiers[tier][2] - 1)):
+                # Only count the room as read once the holder's result is stored
+                read_at = state.get(f"refreshed:{room_email.lower()}:{name}")
+                if read_at:
+                    self.fetched(room_email, window_start, tier_end, at=read_at)
+                else:
+                    with self.lock:
+                        self.lease_wait[room_email] = time.time() + self.LEASE_RETRY_SECONDS
+                continue
+            with self.lock:
+                self.running.add(room_email)
+            started = time.time()
+            future = submit_room_fetch(room, headers, window_start, tier_end)
+            future.add_done_callback(lambda done, room_email=room_email, tier=tier, started=started,
+                                     tier_end=tier_end: self.finished(room_email, tier, started, window_start,
+                                                                      tier_end, done.result()))
+
+    def finished(self, room_email, tier, started, window_start, tier_end, meetings):
+        """Count the refresh and adjust the room's near pace: quiet rooms back off, up to the week pace"""
+        if meetings is None:
+            result = "error"
+            # Retry at the tier's own pace rather than every tick
+            self.fetched(room_email, window_start, tier_end)
+        else:
+            # Tells workers that lost the lease when this room was read (store_room_meetings stored it)
+            state.set(f"refreshed:{room_email.lower()}:{self.tiers[tier][0]}", started, ttl=self.tiers[tier][2])
+        with self.lock:
+            self.running.discard(room_email)
+            if meetings is not None:
+                result = "changed" if self.changed_at.get(room_email, 0) >= started else "unchanged"
+                if result == "unchanged" and not self.meeting_upcoming(meetings):
+                    self.near_pace[room_email] = min(self.interval(room_email, 0) * 2, self.tiers[1][2])
+        TIER_REFRESHES.inc(tier=self.tiers[tier][0], result=result)
+        self.wakeup.set()
+
+    @staticmethod
+    def meeting_upcoming(meetings):
+        now = to_local_minutes(local_now())
+        return any(m.start is not None and m.start <= now + REFRESH_UPCOMING_MINUTES and (m.end or 0) >= now
+                   for m in meetings)
+
+    def run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                self.dispatch()
+            except Exception as e:
+                print(f"[REFRESH] Scheduling failed: {e}", flush=True)
+            self.wakeup.wait(self.TICK_SECONDS)
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            return {
+                "enabled": self.started,
+                "tiers": {name: {"days": days, "intervalSeconds": interval} for name, days, interval in self.tiers},
+                "rooms": len(self.refreshed),
+                "activeRooms": sum(1 for t in self.changed_at.values() if now - t < REFRESH_ACTIVE_SECONDS),
+                "quietRooms": len(self.near_pace),
+                "running": len(self.running)
             }
-            
-            # Collect results as they complete
-            for future in as_completed(future_to_room):
-                room_id, room = future_to_room[future]
-                try:
-                    meetings = future.result()
-                    all_meetings.extend(meetings)
-                except Exception as e:
-                    print(f"Error fetching calendar for room {room.get('emailAddress')}: {str(e)}", flush=True)
-        
-        # Cleanup expired cache entries
-        cleanup_expired_cache()
-        
-        # Deduplicate meetings by ID (same event can appear multiple times)
-        seen_ids = set()
-        unique_meetings = []
-        for meeting in all_meetings:
-            meeting_id = meeting.get("id")
-            if meeting_id and meeting_id not in seen_ids:
-                seen_ids.add(meeting_id)
-                unique_meetings.append(meeting)
-            elif not meeting_id:
-                # If no ID, keep it (shouldn't happen but be safe)
-                unique_meetings.append(meeting)
-        
-        return jsonify({"meetings": unique_meetings, "count": len(unique_meetings)})
+
+
+def polling_max_age():
+    """Max age of the cached meetings when no change notifications cover the rooms"""
+    return REFRESH_TIERS[-1][2] if refresh_scheduler.started else SWR_MEETINGS_MAX_AGE
+
+
+refresh_scheduler = RefreshScheduler(REFRESH_TIERS)
+room_store.add_listener(refresh_scheduler.room_changed)
+
+
+# ---- Room sharding across workers ----
+# With a shared state backend every worker (on any host) holds a membership lease in it, and room
+# calendars are divided over the live members by consistent hashing on the room address: each worker's
+# scheduler only refreshes its own rooms, and everyone reads the rest from the shared room snapshot.
+# When a worker stops or dies its lease lapses within SHARD_LEASE_SECONDS and its rooms move to the
+# others; a new worker takes over about 1/n of the rooms. The per-tier refresh leases keep a room from
+# being read twice while members see the change at slightly different moments.
+SHARD_LEASE_SECONDS = float(os.getenv('SHARD_LEASE_SECONDS', '15'))
+SHARD_VNODES = 64  # Points per member on the ring, so rooms spread evenly
+SHARD_MEMBER_ID = os.getenv('SHARD_MEMBER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+
+SHARD_MEMBERS = Gauge(
+    "arcrooms_shard_members",
+    "Live workers sharing the room refreshes")
+SHARD_ROOMS_OWNED = Gauge(
+    "arcrooms_shard_rooms_owned",
+    "Rooms this worker refreshes")
+
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class RoomShards:
+    """Membership lease and consistent-hash ring over the live workers"""
+
+    def __init__(self, member_id, lease_seconds, vnodes):
+        self.member_id = member_id
+        self.lease_seconds = lease_seconds
+        self.vnodes = vnodes
+        self.lock = Lock()
+        self.members = ()
+        self.points = []  # sorted ring hashes
+        self.owners = []  # member per point
+        self.started = False
+
+    def start(self):
+        """Join the ring (once; only with a shared backend, otherwise this worker owns every room)"""
+        with self.lock:
+            if self.started or not state.shared:
+                return False
+            self.started = True
+        self.heartbeat()
+        atexit.register(self.leave)
+        Thread(target=self.run, name="arcrooms-shards", daemon=True).start()
+        return True
+
+    def heartbeat(self):
+        """Renew our lease and rebuild the ring when the live members changed"""
+        state.set(f"shard:member:{self.member_id}", {"since": time.time(), "pid": os.getpid()},
+                  ttl=self.lease_seconds)
+        members = tuple(sorted(key[len("shard:member:"):] for key in state.keys("shard:member:")))
+        if members == self.members:
+            return
+        ring = sorted((ring_hash(f"{member}#{i}"), member) for member in members for i in range(self.vnodes))
+        with self.lock:
+            self.members = members
+            self.points = [point for point, _ in ring]
+            self.owners = [member for _, member in ring]
+        SHARD_MEMBERS.set(len(members))
+        print(f"[SHARD] {len(members)} live workers: {', '.join(members)}", flush=True)
+
+    def run(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"[SHARD] Heartbeat failed: {e}", flush=True)
+
+    def leave(self):
+        """Hand our rooms over right away on a clean shutdown"""
+        state.delete(f"shard:member:{self.member_id}")
+
+    def owner(self, room_email):
+        with self.lock:
+            if not self.points:
+                return self.member_id
+            index = bisect.bisect(self.points, ring_hash(room_email.lower())) % len(self.points)
+            return self.owners[index]
+
+    def owns(self, room_email):
+        """True when this worker should refresh the room (always when not sharding, or when we
+        are missing from the ring because our own lease could not be written)"""
+        with self.lock:
+            alone = not self.started or self.member_id not in self.members
+        return alone or self.owner(room_email) == self.member_id
+
+    def snapshot(self, rooms=None):
+        with self.lock:
+            members = list(self.members)
+        payload = {"enabled": self.started, "member": self.member_id, "members": members}
+        if rooms is not None:
+            payload["roomsOwned"] = sum(1 for room_email in rooms if self.owns(room_email))
+        return payload
+
+
+room_shards = RoomShards(SHARD_MEMBER_ID, SHARD_LEASE_SECONDS, SHARD_VNODES)
+
+
+# ---- Response encoding ----
+# The meetings payload only changes with the cached result, so its encoded (and compressed) bytes are
+# kept per cached value and variant; a poll then costs a lookup instead of an encode.
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json is used instead
+    orjson = None
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+try:
+    import msgpack
+except ImportError:  # Optional: ?format=msgpack is then refused
+    msgpack = None
+
+COMPRESS_MIN_BYTES = 1024
+RESPONSE_FORMATS = {
+    "json": "application/json",
+    "columnar": "application/json",  # {"columns": [...], "rows": [[...], ...]} instead of a list of objects
+    "msgpack": "application/msgpack",
+}
+ENCODED_RESPONSES = Counter(
+    "arcrooms_encoded_responses_total",
+    "Responses served from already encoded bytes (result: hit, miss, not_modified)",
+    ("result",))
+
+
+def encode_json(payload):
+    """Compact UTF-8 JSON bytes (orjson when installed)"""
+    if orjson:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_payload(payload, fmt):
+    if fmt == "msgpack":
+        return msgpack.packb(payload, use_bin_type=True)
+    return encode_json(payload)
+
+
+def to_columnar(items):
+    """List of dicts with the same keys -> {"columns", "rows"} (keys are sent once)"""
+    columns = list(items[0]) if items else []
+    return {"columns": columns, "rows": [[item.get(column) for column in columns] for item in items]}
+
+
+def requested_format():
+    """Response format from ?format= or the Accept header; None when it cannot be served"""
+    fmt = request.args.get("format")
+    if fmt is None:
+        wants_msgpack = request.accept_mimetypes.best in ("application/msgpack", "application/x-msgpack")
+        return "msgpack" if wants_msgpack and msgpack else "json"
+    if fmt not in RESPONSE_FORMATS or (fmt == "msgpack" and not msgpack):
+        return None
+    return fmt
+
+
+def negotiate_content_encoding(size):
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    if brotli and request.accept_encodings["br"]:
+        return "br"
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class EncodedResponses:
+    """Encoded bodies per variant for the current source value, plus their compressed forms"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.entries = {}  # variant -> (source, version, etag, {content encoding or None: bytes})
+
+    def get(self, variant, source, version, build):
+        """(etag, encodings) for this source value and version; build() encodes it on a miss"""
+        with self.lock:
+            entry = self.entries.get(variant)
+        # The entry holds a reference to source, so an identity match cannot be a reused id
+        if entry and entry[0] is source and entry[1] == version:
+            ENCODED_RESPONSES.inc(result="hit")
+            return entry[2], entry[3]
+        ENCODED_RESPONSES.inc(result="miss")
+        body = build()
+        entry = (source, version, hashlib.blake2b(body, digest_size=12).hexdigest(), {None: body})
+        with self.lock:
+            self.entries[variant] = entry
+        return entry[2], entry[3]
+
+    def response(self, variant, source, version, content_type, build, last_modified=None):
+        """Flask response for variant, compressed as the client accepts, 304 on a matching ETag
+        (or, without If-None-Match, when it was not modified since If-Modified-Since)"""
+        etag, encodings = self.get(variant, source, version, build)
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = bool(last_modified and request.if_modified_since
+                                and int(last_modified) <= request.if_modified_since.timestamp())
+        if not_modified:
+            ENCODED_RESPONSES.inc(result="not_modified")
+            response = make_response("", 304)
+        else:
+            encoding = negotiate_content_encoding(len(encodings[None]))
+            body = encodings.get(encoding)
+            if body is None:
+                body = compress_body(encodings[None], encoding)
+                encodings[encoding] = body
+            response = make_response(body)
+            response.content_type = content_type
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+        response.vary.add("Accept")
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+encoded_responses = EncodedResponses()
+
+
+# ---- API endpoint: get all meetings for dashboard ----
+@app.get("/arcrooms/api/meetings")
+def get_meetings():
+    """
+    Get all meetings with PARALLEL loading for better performance
+    """
+    fmt = requested_format()
+    if fmt is None:
+        return jsonify({"error": "Onbekend formaat (json, columnar of msgpack)"}), 406
+    return meetings_response(include_performance=request.args.get('timing') == '1',
+                             include_body=request.args.get('body') != '0', fmt=fmt)
+
+
+@app.get("/arcrooms/api/meetings-parallel")
+def get_meetings_parallel():
+    """Meetings including the performance block (used by templates/performance-test.html)"""
+    return meetings_response(include_performance=True, fresh=True)
+
+
+def meetings_response(include_performance=False, fresh=False, include_body=True, fmt="json"):
+    """Build the /api/meetings response, optionally with phase timings in a performance block.
+
+    Meetings come from the stale-while-revalidate cache; fresh=True forces (and measures) a full fetch.
+    Records become dicts only here; include_body=False leaves out the HTML bodies (?body=0).
+    Without a performance block the encoded bytes are reused until the cached result changes.
+    """
+    timer = current_phase_timer()
+    try:
+        if fresh:
+            result = meetings_cache.refresh("all", lambda: collect_meetings(timer))
+            fetched_at, stale = time.time(), False
+        else:
+            result, fetched_at, stale = meetings_cache.get("all", lambda: collect_meetings(timer),
+                                                           background_loader=collect_meetings)
+
+        def build_payload():
+            meetings = [meeting.to_dict(include_body) for meeting in result["meetings"]]
+            return {
+                "meetings": to_columnar(meetings) if fmt == "columnar" else meetings,
+                "count": len(meetings),
+                "fetchedAt": datetime.fromtimestamp(fetched_at).isoformat(timespec='seconds'),
+                "stale": stale,
+                "partial": bool(result.get("stale_rooms")),
+                "staleRooms": result.get("stale_rooms", [])
+            }
+
+        if not include_performance:
+            with timed_phase(timer, "serialize"):
+                return encoded_responses.response(("meetings", fmt, include_body), result, (fetched_at, stale),
+                                                  RESPONSE_FORMATS[fmt], lambda: encode_payload(build_payload(), fmt))
+
+        with timed_phase(timer, "serialize"):
+            payload = build_payload()
+        phases = timer.as_dict()
+        payload["performance"] = {
+            "rooms_count": result["rooms_count"],
+            "rooms_fetch_time": round(phases.get("token", 0) + phases.get("rooms", 0), 2),
+            "calendars_fetch_time": round(phases.get("calendars", 0), 2),
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in phases.items()}
+        }
+        with timed_phase(timer, "serialize"):
+            return jsonify(payload)
     except Exception as e:
         print(f"Error in get_meetings: {str(e)}", flush=True)
         return jsonify({"error": str(e), "meetings": []}), 500
 
 
+# ---- Graph change notifications (webhooks) ----
+# With GRAPH_NOTIFICATION_URL set, every room calendar gets a Graph subscription; a notification
+# re-reads only that room and splices it into the cached meetings, so polling becomes a safety net.
+GRAPH_NOTIFICATION_URL = os.getenv('GRAPH_NOTIFICATION_URL')  # Public https URL of /arcrooms/api/graph-notifications
+
+
+def graph_notification_secret():
+    """clientState that proves a notification came from our subscriptions, the same in every worker.
+
+    GRAPH_NOTIFICATION_SECRET, else derived from FLASK_SECRET_KEY, else generated once in the shared
+    state backend. None when none of these exist: per-process secrets would make workers reject each
+    other's notifications.
+    """
+    if os.getenv('GRAPH_NOTIFICATION_SECRET'):
+        return os.getenv('GRAPH_NOTIFICATION_SECRET')
+    if os.getenv('FLASK_SECRET_KEY'):
+        return hashlib.sha256(f"graph-notifications:{os.getenv('FLASK_SECRET_KEY')}".encode("utf-8")).hexdigest()[:48]
+    if state.shared:
+        state.set_if_absent("graph:client_state", secrets.token_hex(24))
+        return state.get("graph:client_state")
+    return None
+
+
+GRAPH_NOTIFICATION_SECRET = graph_notification_secret() if GRAPH_NOTIFICATION_URL else None
+GRAPH_SUBSCRIPTION_MINUTES = int(os.getenv('GRAPH_SUBSCRIPTION_MINUTES', str(3 * 24 * 60)))  # Graph allows up to 7 days for events
+GRAPH_SUBSCRIPTION_RENEW_SECONDS = int(os.getenv('GRAPH_SUBSCRIPTION_RENEW_SECONDS', str(12 * 3600)))
+GRAPH_SUBSCRIPTION_CHECK_SECONDS = int(os.getenv('GRAPH_SUBSCRIPTION_CHECK_SECONDS', '600'))
+GRAPH_NOTIFICATION_DEBOUNCE_SECONDS = float(os.getenv('GRAPH_NOTIFICATION_DEBOUNCE_SECONDS', '2'))
+# One worker in the fleet creates, renews and deletes subscriptions; the others only list them
+GRAPH_SUBSCRIPTION_LEASE_SECONDS = 2 * GRAPH_SUBSCRIPTION_CHECK_SECONDS
+# Full meetings refresh interval while every room is subscribed
+SWR_MEETINGS_MAX_AGE_NOTIFIED = int(os.getenv('SWR_MEETINGS_MAX_AGE_NOTIFIED_SECONDS', str(15 * 60)))
+
+GRAPH_NOTIFICATIONS = Counter(
+    "arcrooms_graph_notifications_total",
+    "Graph change notifications received (result: resync, debounced, lifecycle, rejected, unknown)",
+    ("result",))
+GRAPH_SUBSCRIPTIONS = Gauge(
+    "arcrooms_graph_subscriptions",
+    "Room calendars with an active Graph subscription")
+
+
+def parse_graph_datetime(value):
+    """Epoch seconds of a Graph UTC timestamp such as 2025-01-31T10:00:00.0000000Z"""
+    return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+
+def room_events_resource(room_email):
+    return f"users/{room_email.lower()}/events"
+
+
+class GraphSubscriptions:
+    """Creates, renews and looks up the Graph subscriptions on room calendars"""
+
+    LEASE_KEY = "lease:graph-subscriptions"
+
+    def __init__(self):
+        self.lock = Lock()
+        self.rooms_by_subscription = {}  # subscription id -> room email
+        self.wakeup = Event()
+        self.started = False
+
+    def start(self):
+        """Start the subscription loop (once per process)"""
+        with self.lock:
+            if self.started:
+                return False
+            self.started = True
+        atexit.register(self.release)
+        Thread(target=self.run, name="arcrooms-subscriptions", daemon=True).start()
+        return True
+
+    def lead(self):
+        """Take or renew the fleet-wide lease on changing subscriptions; True when this worker holds it"""
+        if state.set_if_absent(self.LEASE_KEY, SHARD_MEMBER_ID, ttl=GRAPH_SUBSCRIPTION_LEASE_SECONDS):
+            print(f"[WEBHOOK] {SHARD_MEMBER_ID} maintains the Graph subscriptions", flush=True)
+            return True
+        if state.get(self.LEASE_KEY) == SHARD_MEMBER_ID:
+            state.set(self.LEASE_KEY, SHARD_MEMBER_ID, ttl=GRAPH_SUBSCRIPTION_LEASE_SECONDS)
+            return True
+        return False
+
+    def release(self):
+        """Hand the lease to the next worker on shutdown"""
+        try:
+            if state.get(self.LEASE_KEY) == SHARD_MEMBER_ID:
+                state.delete(self.LEASE_KEY)
+        except Exception:
+            pass
+
+    def room_for(self, subscription_id, resource=""):
+        """Room email of a notification (falls back to a mailbox in the resource path)"""
+        with self.lock:
+            room_email = self.rooms_by_subscription.get(subscription_id)
+        if room_email:
+            return room_email
+        parts = resource.split("/")
+        if len(parts) >= 2 and parts[0].lower() == "users" and "@" in parts[1]:
+            return parts[1].lower()
+        # Possibly created by another worker since our last sync
+        self.wakeup.set()
+        return None
+
+    def list_existing(self, headers):
+        """Our subscriptions in Graph grouped by resource (shared by all workers and restarts)"""
+        existing = {}
+        url = f"{GRAPH_ENDPOINT}/subscriptions"
+        while url:
+            list_r = graph_get(url, headers=headers, timeout=10)
+            list_r.raise_for_status()
+            data = list_r.json()
+            for sub in data.get("value", []):
+                if sub.get("notificationUrl") == GRAPH_NOTIFICATION_URL:
+                    existing.setdefault(sub.get("resource", "").lower(), []).append(sub)
+            url = data.get("@odata.nextLink")
+        return existing
+
+    def sync(self):
+        """Make sure every room has exactly one subscription that does not expire soon.
+
+        Only the lease holder changes subscriptions; the other workers map the existing ones to rooms.
+        """
+        headers = {
+            "Authorization": f"Bearer {get_token()}",
+            "Content-Type": "application/json"
+        }
+        existing = self.list_existing(headers)
+        expiration = (datetime.utcnow() + timedelta(minutes=GRAPH_SUBSCRIPTION_MINUTES)).isoformat(timespec='seconds') + "Z"
+        subscribed = {}
+        rooms = [r["emailAddress"].lower() for r in get_room_directory().values() if r.get("emailAddress")]
+        leader = self.lead()
+        for room_email in rooms:
+            resource = room_events_resource(room_email)
+            subs = sorted(existing.pop(resource, []), key=lambda sub: sub.get("expirationDateTime", ""))
+            if not leader:
+                subscribed.update((sub["id"], room_email) for sub in subs)
+                continue
+            try:
+                # Earlier lease holders may have left duplicates; keep the one that lives longest
+                for duplicate in subs[:-1]:
+                    graph_delete(f"{GRAPH_ENDPOINT}/subscriptions/{duplicate['id']}", headers=headers, timeout=10)
+                current = subs[-1] if subs else None
+                if current and parse_graph_datetime(current["expirationDateTime"]) - time.time() > GRAPH_SUBSCRIPTION_RENEW_SECONDS:
+                    subscribed[current["id"]] = room_email
+                elif current:
+                    renew_r = graph_patch(f"{GRAPH_ENDPOINT}/subscriptions/{current['id']}", headers=headers,
+                                          json={"expirationDateTime": expiration}, timeout=10)
+                    if renew_r.status_code == 200:
+                        subscribed[current["id"]] = room_email
+                    else:
+                        print(f"[WEBHOOK] Renewing subscription for {room_email} returned {renew_r.status_code}", flush=True)
+                        graph_delete(f"{GRAPH_ENDPOINT}/subscriptions/{current['id']}", headers=headers, timeout=10)
+                        current = None
+                if not current:
+                    create_r = graph_post(f"{GRAPH_ENDPOINT}/subscriptions", headers=headers, json={
+                        "changeType": "created,updated,deleted",
+                        "notificationUrl": GRAPH_NOTIFICATION_URL,
+                        "lifecycleNotificationUrl": GRAPH_NOTIFICATION_URL,
+                        "resource": resource,
+                        "expirationDateTime": expiration,
+                        "clientState": GRAPH_NOTIFICATION_SECRET
+                    }, timeout=30)
+                    if create_r.status_code == 201:
+                        subscribed[create_r.json()["id"]] = room_email
+                        print(f"[WEBHOOK] Subscribed to {room_email}", flush=True)
+                    else:
+                        print(f"[WEBHOOK] Subscribing to {room_email} returned {create_r.status_code}: {create_r.text[:200]}", flush=True)
+            except Exception as e:
+                print(f"[WEBHOOK] Subscription for {room_email} failed: {e}", flush=True)
+        # Rooms that were removed from the directory
+        for subs in existing.values() if leader else ():
+            for sub in subs:
+                graph_delete(f"{GRAPH_ENDPOINT}/subscriptions/{sub['id']}", headers=headers, timeout=10)
+
+        with self.lock:
+            self.rooms_by_subscription = subscribed
+        GRAPH_SUBSCRIPTIONS.set(len(set(subscribed.values())))
+        # Polling only needs to catch what notifications miss once every room is covered
+        all_covered = bool(rooms) and set(rooms) <= set(subscribed.values())
+        meetings_cache.max_age = max(SWR_MEETINGS_MAX_AGE_NOTIFIED, polling_max_age()) if all_covered else polling_max_age()
+
+    def run(self):
+        """Background loop: sync now, then every GRAPH_SUBSCRIPTION_CHECK_SECONDS or when woken"""
+        while True:
+            self.wakeup.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                meetings_cache.max_age = polling_max_age()
+                print(f"[WEBHOOK] Subscription sync failed: {e}", flush=True)
+            self.wakeup.wait(GRAPH_SUBSCRIPTION_CHECK_SECONDS)
+
+
+graph_subscriptions = GraphSubscriptions()
+room_resyncs_pending = set()
+room_resyncs_lock = Lock()
+
+
+def schedule_room_resync(room_email):
+    """Re-read a room shortly after a notification; bursts for the same room collapse into one read"""
+    with room_resyncs_lock:
+        if room_email in room_resyncs_pending:
+            return False
+        room_resyncs_pending.add(room_email)
+    background_executor.submit(resync_room, room_email)
+    return True
+
+
+def resync_room(room_email):
+    """Fetch one room again after a change notification; the store listener updates the meetings cache"""
+    time.sleep(GRAPH_NOTIFICATION_DEBOUNCE_SECONDS)
+    with room_resyncs_lock:
+        room_resyncs_pending.discard(room_email)
+    try:
+        room = next((r for r in get_room_directory().values()
+                     if (r.get("emailAddress") or "").lower() == room_email), None)
+        if not room:
+            print(f"[WEBHOOK] Notification for unknown room {room_email}", flush=True)
+            return
+        headers = {
+            "Authorization": f"Bearer {get_token()}",
+            "Content-Type": "application/json"
+        }
+        # A fetch that is already running may have read the calendar before the change
+        with room_fetches_lock:
+            running = room_fetches_in_flight.get(room["emailAddress"])
+        if running:
+            wait([running])
+        window_start, window_end = meetings_window()
+        submit_room_fetch(room, headers, window_start, window_end).result()
+    except Exception as e:
+        print(f"[WEBHOOK] Resync of {room_email} failed: {e}", flush=True)
+
+
+def splice_room_into_meetings_cache(room_email, old_meetings, new_meetings):
+    """Store listener: replace one room's meetings in the cached /api/meetings result"""
+    def splice(result):
+        others = [m for m in result["meetings"] if m.room_email != room_email]
+        return dict(result,
+                    meetings=dedupe_meetings(others + new_meetings),
+                    stale_rooms=[r for r in result.get("stale_rooms", []) if r["roomEmail"] != room_email])
+    meetings_cache.update("all", splice)
+
+
+room_store.add_listener(splice_room_into_meetings_cache)
+
+
+def write_through_booking(room_email, kind, event_id, record=None, status=None):
+    """Show a booking action in the room store now and re-read that room shortly after (never raises)"""
+    try:
+        # Links and forms may differ in case from the directory address the store is keyed by
+        room = next((r for r in get_room_directory().values()
+                     if (r.get("emailAddress") or "").lower() == room_email.lower()), None)
+        if room:
+            room_email = room["emailAddress"]
+        room_store.write_through(room_email, kind, event_id, record, status)
+        schedule_room_resync(room_email.lower())
+    except Exception as e:
+        print(f"[WRITE-THROUGH] {kind} of {event_id} in {room_email} failed: {e}", flush=True)
+
+
+@app.post("/arcrooms/api/graph-notifications")
+def graph_notifications():
+    """Microsoft Graph webhook: validation handshake, change and lifecycle notifications"""
+    # Subscription validation: echo the token as plain text within 10 seconds
+    validation_token = request.args.get('validationToken')
+    if validation_token is not None:
+        response = make_response(validation_token, 200)
+        response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+        return response
+
+    payload = request.get_json(silent=True) or {}
+    for notification in payload.get("value", []):
+        if not GRAPH_NOTIFICATION_SECRET or not secrets.compare_digest(
+                str(notification.get("clientState", "")), GRAPH_NOTIFICATION_SECRET):
+            GRAPH_NOTIFICATIONS.inc(result="rejected")
+            continue
+        lifecycle_event = notification.get("lifecycleEvent")
+        if lifecycle_event:
+            # reauthorizationRequired, subscriptionRemoved or missed: re-sync subscriptions (and data) now
+            GRAPH_NOTIFICATIONS.inc(result="lifecycle")
+            print(f"[WEBHOOK] Lifecycle event {lifecycle_event} for subscription {notification.get('subscriptionId')}", flush=True)
+            graph_subscriptions.wakeup.set()
+            if lifecycle_event == "missed":
+                background_executor.submit(meetings_cache.refresh, "all", collect_meetings)
+            continue
+        room_email = graph_subscriptions.room_for(notification.get("subscriptionId"), notification.get("resource", ""))
+        if not room_email:
+            GRAPH_NOTIFICATIONS.inc(result="unknown")
+            continue
+        GRAPH_NOTIFICATIONS.inc(result="resync" if schedule_room_resync(room_email) else "debounced")
+    # Graph expects a quick 2xx; the re-sync runs in the background
+    return "", 202
+
+
+def start_subscription_maintainer():
+    """Start the subscription thread when notifications are configured (not in replay mode);
+    called from gunicorn's post_worker_init"""
+    if GRAPH_NOTIFICATION_URL and not GRAPH_NOTIFICATION_SECRET:
+        print("[WEBHOOK] GRAPH_NOTIFICATION_URL is set but there is no shared clientState; set "
+              "GRAPH_NOTIFICATION_SECRET (or FLASK_SECRET_KEY, or use a shared STATE_BACKEND). "
+              "Change notifications stay off.", flush=True)
+        return
+    if GRAPH_NOTIFICATION_URL and not GRAPH_REPLAY_FILE:
+        graph_subscriptions.start()
+
+
+# ---- Door displays: now / next per room ----
+# Status per room is precomputed from the room store on every change (and when a meeting starts or
+# ends), so door tablets can poll, long-poll or stream it without any Graph traffic of their own.
+try:
+    from zoneinfo import ZoneInfo
+    LOCAL_TIMEZONE = ZoneInfo("Europe/Amsterdam")
+except Exception:  # Python 3.8 or no tz database: assume the server runs on Amsterdam time
+    LOCAL_TIMEZONE = None
+
+DOOR_MAX_WAIT_SECONDS = 30
+DOOR_SSE_HEARTBEAT_SECONDS = 15
+# Every open long-poll or stream holds a gthread thread; keep the rest for the dashboard
+DOOR_MAX_STREAMS = int(os.getenv('DOOR_MAX_STREAMS', str(max(1, int(os.getenv('GUNICORN_THREADS', '16')) // 2))))
+DOOR_STREAM_RETRY_SECONDS = 10
+door_stream_slots = BoundedSemaphore(DOOR_MAX_STREAMS)
+DOOR_STREAMS = Gauge(
+    "arcrooms_door_streams",
+    "Open long-poll and SSE connections of door displays")
+DOOR_STREAMS_REJECTED = Counter(
+    "arcrooms_door_streams_rejected_total",
+    "Door long-polls and streams refused because DOOR_MAX_STREAMS were open in this worker")
+
+
+def local_now():
+    """Naive Europe/Amsterdam time, comparable with the meeting times from Graph"""
+    if LOCAL_TIMEZONE:
+        return datetime.now(LOCAL_TIMEZONE).replace(tzinfo=None)
+    return datetime.now()
+
+
+def door_meeting(meeting):
+    return {"subject": meeting.subject, "organizer": meeting.organizer_name,
+            "start": from_local_minutes(meeting.start), "end": from_local_minutes(meeting.end)}
+
+
+class DoorStatusBoard:
+    """Precomputed now/next status per room, with blocking waits for the next change"""
+
+    def __init__(self):
+        self.condition = Condition()
+        self.timelines = {}  # room_email -> (room name, busy meeting records sorted by start)
+        self.statuses = {}   # room_email -> status dict (includes version and validUntil in local minutes)
+        self.version = 0
+
+    def update_room(self, room_email, room_name, meetings):
+        """Rebuild a room's timeline from its meetings (room store listener)"""
+        busy = sorted((m for m in meetings
+                       if m.status != "free" and m.room_response != "declined"
+                       and m.start is not None and m.end is not None),
+                      key=lambda m: m.start)
+        with self.condition:
+            self.timelines[room_email.lower()] = (room_name, busy)
+            self._compute(room_email.lower())
+            self.condition.notify_all()
+
+    def _compute(self, room_email):
+        """Derive the status at this moment; caller holds the condition"""
+        room_name, busy = self.timelines[room_email]
+        now = to_local_minutes(local_now())
+        current = next((m for m in busy if m.start <= now < m.end), None)
+        upcoming = [m for m in busy if m.start > now]
+        nxt = upcoming[0] if upcoming else None
+        busy_until = None
+        if current:
+            # Back-to-back meetings keep the room busy
+            busy_until = current.end
+            for m in busy:
+                if m.start <= busy_until < m.end:
+                    busy_until = m.end
+        status = {
+            "room": room_name,
+            "roomEmail": room_email,
+            "now": "busy" if current else "free",
+            "current": door_meeting(current) if current else None,
+            "next": door_meeting(nxt) if nxt else None,
+            "freeUntil": None if current or not nxt else from_local_minutes(nxt.start),
+            "busyUntil": from_local_minutes(busy_until) if busy_until is not None else None,
+            # Next moment the status changes by itself (a meeting starts or ends)
+            "validUntil": current.end if current and (not nxt or current.end <= nxt.start) else (
+                nxt.start if nxt else None),
+        }
+        previous = self.statuses.get(room_email)
+        if previous and {k: v for k, v in previous.items() if k != "version"} == status:
+            return previous
+        self.version += 1
+        status["version"] = self.version
+        self.statuses[room_email] = status
+        return status
+
+    def get(self, room_email):
+        """Current status of a room (None when the room has not been synced yet)"""
+        with self.condition:
+            status = self.statuses.get(room_email)
+            if status and status["validUntil"] is not None and to_local_minutes(local_now()) >= status["validUntil"]:
+                status = self._compute(room_email)
+                self.condition.notify_all()
+            return status
+
+    def wait_for_change(self, room_email, since, timeout):
+        """Block until the room's version differs from since, a meeting boundary passes, or timeout"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                status = self.get(room_email)
+                remaining = deadline - time.monotonic()
+                if status is None or status["version"] != since or remaining <= 0:
+                    return status
+                wait_seconds = remaining
+                if status["validUntil"] is not None:
+                    boundary = LOCAL_EPOCH + timedelta(minutes=status["validUntil"])
+                    until_boundary = (boundary - local_now()).total_seconds()
+                    wait_seconds = min(wait_seconds, max(0.5, until_boundary))
+                self.condition.wait(wait_seconds)
+
+
+door_board = DoorStatusBoard()
+
+
+def update_door_status(room_email, old_meetings, new_meetings):
+    """Room store listener: recompute the door status of a changed room"""
+    stored = room_store.get_room(room_email)
+    door_board.update_room(room_email, stored["room"] if stored else room_email, new_meetings)
+
+
+room_store.add_listener(update_door_status)
+
+# Warm this worker from rooms synced earlier or by other workers, then keep following them
+room_store.load_snapshot()
+if state.shared:
+    Thread(target=room_store.follow_snapshot, name="arcrooms-snapshot", daemon=True).start()
+
+
+def door_streams_full():
+    """503 response for a long-poll or stream over DOOR_MAX_STREAMS"""
+    DOOR_STREAMS_REJECTED.inc()
+    response = jsonify({"error": "Te veel open verbindingen, probeer het zo opnieuw"})
+    response.headers['Retry-After'] = str(DOOR_STREAM_RETRY_SECONDS)
+    return response, 503
+
+
+def door_payload(status):
+    return {k: v for k, v in status.items() if k != "validUntil"}
+
+
+def door_status_or_error(room_email):
+    """Status for a door request, keeping the store warm without blocking on Graph"""
+    # One background refresh per SWR period at most, however many tablets poll
+    meetings_cache.revalidate_if_stale("all", collect_meetings)
+    status = door_board.get(room_email.lower())
+    if status is None:
+        if not room_store.rooms and not state.keys("room:"):
+            response = jsonify({"error": "Gegevens worden geladen, probeer het zo opnieuw"})
+            response.headers['Retry-After'] = '5'
+            return None, (response, 503)
+        return None, (jsonify({"error": "Onbekende ruimte"}), 404)
+    return status, None
+
+
+@app.get("/arcrooms/api/door/<room_email>")
+def door_status(room_email):
+    """
+    Now / next for one room door display.
+    Long-poll: ?since=<version>&wait=<seconds> returns as soon as the status changes (304 when it did not).
+    Also honours If-None-Match with the returned ETag.
+    """
+    status, error = door_status_or_error(room_email)
+    if error:
+        return error
+    since = request.args.get("since", type=int)
+    if since is None:
+        # Our ETags look like "v<version>"; anything else (or garbage) is simply not a match
+        match = re.fullmatch(r'(?:W/)?"?v(\d+)"?', request.headers.get("If-None-Match", "").strip())
+        since = int(match.group(1)) if match else None
+    wait_seconds = min(request.args.get("wait", 0, type=float), DOOR_MAX_WAIT_SECONDS)
+    if since is not None and status["version"] == since and wait_seconds > 0:
+        if not door_stream_slots.acquire(blocking=False):
+            return door_streams_full()
+        DOOR_STREAMS.inc()
+        try:
+            status = door_board.wait_for_change(room_email.lower(), since, wait_seconds)
+        finally:
+            DOOR_STREAMS.dec()
+            door_stream_slots.release()
+    if since is not None and status["version"] == since:
+        response = make_response("", 304)
+    else:
+        response = jsonify(door_payload(status))
+    response.headers['ETag'] = f'"v{status["version"]}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.get("/arcrooms/api/door/<room_email>/events")
+def door_status_events(room_email):
+    """Server-Sent Events stream of a room's now / next status (one event per change)"""
+    status, error = door_status_or_error(room_email)
+    if error:
+        return error
+    room_key = room_email.lower()
+    if not door_stream_slots.acquire(blocking=False):
+        return door_streams_full()
+
+    def stream(status):
+        DOOR_STREAMS.inc()
+        try:
+            yield f"id: {status['version']}\nevent: status\ndata: {json.dumps(door_payload(status))}\n\n"
+            while True:
+                changed = door_board.wait_for_change(room_key, status["version"], DOOR_SSE_HEARTBEAT_SECONDS)
+                if changed is None:
+                    return
+                if changed["version"] == status["version"]:
+                    yield ": heartbeat\n\n"
+                    continue
+                status = changed
+                yield f"id: {status['version']}\nevent: status\ndata: {json.dumps(door_payload(status))}\n\n"
+        finally:
+            DOOR_STREAMS.dec()
+
+    response = app.response_class(stream(status), mimetype="text/event-stream")
+    # Also runs when the client leaves before the first event (the generator then never starts)
+    response.call_on_close(door_stream_slots.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Let nginx pass events through immediately
+    return response
+
+
+# ---- iCalendar feeds ----
+# Calendar clients subscribe to /api/ics/<room>.ics (or all.ics) and poll every few minutes. Feeds are
+# rendered from the room store and their bytes kept per store version, so a poll (mostly a 304) never
+# reaches Graph.
+ICS_FEEDS = Counter(
+    "arcrooms_ics_feeds_total",
+    "iCalendar feed requests (feed: room, all)",
+    ("feed",))
+ICS_REFRESH_INTERVAL = "PT15M"
+
+
+@lru_cache(maxsize=65536)
+def ics_utc(minutes):
+    """Local epoch minutes -> iCalendar UTC date-time (YYYYMMDDTHHMMSSZ)"""
+    local = LOCAL_EPOCH + timedelta(minutes=minutes)
+    local = local.replace(tzinfo=LOCAL_TIMEZONE) if LOCAL_TIMEZONE else local.astimezone()
+    return local.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def ics_text(value):
+    """Escape a TEXT value (RFC 5545 3.3.11)"""
+    return (value or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r", "").replace("\n", "\\n")
+
+
+def ics_fold(line):
+    """Fold a content line at 75 octets without splitting a UTF-8 sequence"""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start, limit = end, 74  # Continuation lines start with a space
+    return "\r\n ".join(parts)
+
+
+def ics_event(meeting, dtstamp):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{meeting.id}@arcrooms",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART:{ics_utc(meeting.start)}",
+        f"DTEND:{ics_utc(meeting.end)}",
+        f"SUMMARY:{ics_text(meeting.subject)}",
+        f"LOCATION:{ics_text(meeting.room)}",
+    ]
+    if meeting.organizer_email:
+        lines.append(f"ORGANIZER;CN=\"{meeting.organizer_name.replace(chr(34), '')}\":mailto:{meeting.organizer_email}")
+    lines.append("STATUS:TENTATIVE" if meeting.pending or meeting.status == "tentative" else "STATUS:CONFIRMED")
+    lines.append("TRANSP:TRANSPARENT" if meeting.status == "free" else "TRANSP:OPAQUE")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def render_ics(name, entries):
+    """VCALENDAR bytes for the meetings of room store entries (declined by the room and unfinished
+    records left out). DTSTAMP is when the room's calendar last changed: Graph gives no per-meeting
+    modification time, and it keeps the bytes (and ETag) the same on every worker."""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//sv ARC//ArcRooms//NL",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{ics_text(name)}",
+        f"REFRESH-INTERVAL;VALUE=DURATION:{ICS_REFRESH_INTERVAL}",
+        f"X-PUBLISHED-TTL:{ICS_REFRESH_INTERVAL}",
+    ]
+    meetings = [(meeting, datetime.fromtimestamp(int(entry["changed_at"]), timezone.utc).strftime("%Y%m%dT%H%M%SZ"))
+                for entry in entries for meeting in entry["meetings"]]
+    for meeting, dtstamp in sorted(meetings, key=lambda pair: (pair[0].start, pair[0].id)):
+        if meeting.room_response != "declined" and meeting.start is not None and meeting.end is not None:
+            lines.extend(ics_event(meeting, dtstamp))
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(ics_fold(line) for line in lines) + "\r\n").encode("utf-8")
+
+
+def ics_feed_response(room_email=None):
+    """ICS response for one room (or all rooms when room_email is None) from the room store"""
+    meetings_cache.revalidate_if_stale("all", collect_meetings)
+    with room_store.lock:
+        if room_email is None:
+            entries = list(room_store.rooms.values())
+            version = room_store.version
+        else:
+            key = next((email for email in room_store.rooms if email.lower() == room_email.lower()), None)
+            entries = [room_store.rooms[key]] if key else []
+            version = entries[0]["version"] if entries else None
+    if not entries:
+        if not room_store.rooms:
+            response = jsonify({"error": "Gegevens worden geladen, probeer het zo opnieuw"})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        return jsonify({"error": "Onbekende ruimte"}), 404
+    ICS_FEEDS.inc(feed="all" if room_email is None else "room")
+    name = "ArcRooms - alle ruimtes" if room_email is None else f"ArcRooms - {entries[0]['room']}"
+    response = encoded_responses.response(
+        ("ics", room_email.lower() if room_email else None), room_store, version, "text/calendar; charset=utf-8",
+        lambda: render_ics(name, entries),
+        last_modified=max(entry["changed_at"] for entry in entries))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.get("/arcrooms/api/ics/all.ics")
+def ics_all_rooms():
+    """iCalendar feed of all rooms"""
+    return ics_feed_response()
+
+
+@app.get("/arcrooms/api/ics/<room_email>.ics")
+def ics_room(room_email):
+    """iCalendar feed of one room (today up to MEETINGS_WINDOW_DAYS ahead)"""
+    return ics_feed_response(room_email)
 
 
 # ---- Get room approver/owner ----
@@ -781,7 +3703,7 @@ def get_room_approver(room_email, token):
         
         # Try to get calendar permissions/delegates
         delegates_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/calendarPermissions"
-        delegates_r = requests.get(delegates_url, headers=headers, timeout=5)
+        delegates_r = graph_get(delegates_url, headers=headers, timeout=5)
         
         if delegates_r.status_code == 200:
             permissions = delegates_r.json().get("value", [])
@@ -795,7 +3717,7 @@ def get_room_approver(room_email, token):
         
         # Alternative: Try to get the room's owner from the mailbox settings
         mailbox_url = f"{GRAPH_ENDPOINT}/users/{room_email}"
-        mailbox_r = requests.get(mailbox_url, headers=headers, timeout=5)
+        mailbox_r = graph_get(mailbox_url, headers=headers, timeout=5)
         
         if mailbox_r.status_code == 200:
             mailbox_data = mailbox_r.json()
@@ -803,7 +3725,7 @@ def get_room_approver(room_email, token):
             manager_id = mailbox_data.get("manager", {}).get("id")
             if manager_id:
                 manager_url = f"{GRAPH_ENDPOINT}/users/{manager_id}"
-                manager_r = requests.get(manager_url, headers=headers, timeout=5)
+                manager_r = graph_get(manager_url, headers=headers, timeout=5)
                 if manager_r.status_code == 200:
                     return manager_r.json().get("mail") or manager_r.json().get("userPrincipalName")
         
@@ -815,6 +3737,228 @@ def get_room_approver(room_email, token):
         return "admin@svarc.nl"
 
 
+# ---- Booking journal ----
+# Append-only SQLite (WAL) journal of booking actions, indexed on room, date and requester. Request
+# handlers only enqueue an entry; a writer thread per worker commits the queue in batches.
+BOOKING_JOURNAL_DB = os.getenv('BOOKING_JOURNAL_DB', 'bookings.db')
+BOOKING_LEGACY_LOG = os.getenv('BOOKING_LEGACY_LOG', 'meeting_requests.log')  # Pipe-delimited log it replaces
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv('ADMIN_EMAILS', '').split(',') if e.strip()}
+BOOKING_JOURNAL_FIELDS = ("logged_at", "action", "room", "room_email", "date", "start_time", "end_time", "subject",
+                          "requester_name", "requester_email", "notes", "event_id", "actor")
+
+BOOKING_JOURNAL_ENTRIES = Counter(
+    "arcrooms_booking_journal_entries_total",
+    "Booking journal entries (result: written, dropped, retried)",
+    ("result",))
+
+
+def parse_legacy_booking(line):
+    """One meeting_requests.log line -> journal row (None when unusable).
+
+    Fields: time|room|date|start-end|subject|name|email|notes|event id. Subjects and notes were
+    written unescaped, so the requester email is used as the anchor between them.
+    """
+    parts = line.rstrip("\n").split("|")
+    if len(parts) < 9:
+        return None
+    email_idx = next((i for i in range(6, len(parts) - 2) if "@" in parts[i] and " " not in parts[i].strip()), None)
+    if email_idx is None:
+        return None
+    start_time, _, end_time = parts[3].partition("-")
+    entry = {
+        "logged_at": parts[0][:19], "action": "request", "room": parts[1], "date": parts[2],
+        "start_time": start_time, "end_time": end_time, "subject": "|".join(parts[4:email_idx - 1]),
+        "requester_name": parts[email_idx - 1], "requester_email": parts[email_idx],
+        "notes": "|".join(parts[email_idx + 1:-1]), "event_id": parts[-1], "actor": parts[email_idx]
+    }
+    return tuple(entry.get(field) for field in BOOKING_JOURNAL_FIELDS)
+
+
+class BookingJournal:
+    """Append-only booking log in SQLite; record() never blocks the request"""
+
+    BATCH_SIZE = 200
+    FLUSH_SECONDS = 0.5
+    QUEUE_LIMIT = 10000
+    INSERT = (f"INSERT INTO bookings ({', '.join(BOOKING_JOURNAL_FIELDS)}) "
+              f"VALUES ({', '.join('?' for _ in BOOKING_JOURNAL_FIELDS)})")
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = deque()
+        self.wakeup = Event()
+        self.flush_lock = Lock()
+        self.lock = Lock()
+        self.schema_ready = False
+        self.started = False
+
+    def start(self):
+        """Start the writer thread (once per process)"""
+        with self.lock:
+            if self.started:
+                return False
+            self.started = True
+        Thread(target=self.run, name="arcrooms-journal", daemon=True).start()
+        atexit.register(self.flush)
+        return True
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS bookings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                logged_at TEXT NOT NULL,
+                action TEXT NOT NULL,
+                room TEXT COLLATE NOCASE,
+                room_email TEXT COLLATE NOCASE,
+                date TEXT,
+                start_time TEXT,
+                end_time TEXT,
+                subject TEXT,
+                requester_name TEXT,
+                requester_email TEXT COLLATE NOCASE,
+                notes TEXT,
+                event_id TEXT,
+                actor TEXT
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS bookings_room_date ON bookings (room, date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bookings_room_email_date ON bookings (room_email, date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bookings_requester_date ON bookings (requester_email, date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bookings_date ON bookings (date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bookings_event ON bookings (event_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS journal_meta (key TEXT PRIMARY KEY, value TEXT)")
+        os.chmod(self.path, 0o600)
+
+    def _connect(self):
+        """New connection; the database and its tables are created on first use"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self.schema_ready:
+            with self.lock:
+                if not self.schema_ready:
+                    self._create_schema(conn)
+                    self.schema_ready = True
+        return conn
+
+    def record(self, action, **fields):
+        """Queue one entry (action: request, approve, reject or cancel)"""
+        if not self.started:
+            self.start()
+        if len(self.queue) >= self.QUEUE_LIMIT:
+            BOOKING_JOURNAL_ENTRIES.inc(result="dropped")
+            print(f"[JOURNAL] Queue full, dropped {action} of {fields.get('event_id')}", flush=True)
+            return
+        fields.update(logged_at=datetime.now().isoformat(timespec='seconds'), action=action)
+        self.queue.append(tuple(fields.get(field) for field in BOOKING_JOURNAL_FIELDS))
+        if len(self.queue) >= self.BATCH_SIZE:
+            self.wakeup.set()
+
+    def flush(self):
+        """Write everything queued in one transaction; on failure the entries stay queued"""
+        with self.flush_lock:
+            batch = []
+            while self.queue:
+                batch.append(self.queue.popleft())
+            if not batch:
+                return 0
+            try:
+                with self._connect() as conn:
+                    conn.executemany(self.INSERT, batch)
+            except sqlite3.Error as e:
+                self.queue.extendleft(reversed(batch))
+                BOOKING_JOURNAL_ENTRIES.inc(len(batch), result="retried")
+                print(f"[JOURNAL] Writing {len(batch)} entries failed, will retry: {e}", flush=True)
+                return 0
+            BOOKING_JOURNAL_ENTRIES.inc(len(batch), result="written")
+            return len(batch)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.FLUSH_SECONDS)
+            self.wakeup.clear()
+            self.flush()
+
+    def import_legacy_log(self, path):
+        """Import the lines of the old pipe-delimited log that are not in the journal yet (by byte offset)"""
+        if not os.path.exists(path):
+            return 0
+        with self._connect() as conn:
+            # One worker at a time; the others then see the new offset
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM journal_meta WHERE key = 'legacy_offset'").fetchone()
+            offset = int(row["value"]) if row else 0
+            if offset > os.path.getsize(path):
+                offset = 0  # Rotated or truncated
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            complete = data[:data.rfind(b"\n") + 1]
+            rows = [parsed for parsed in map(parse_legacy_booking, complete.decode("utf-8", errors="replace").splitlines())
+                    if parsed]
+            conn.executemany(self.INSERT, rows)
+            conn.execute("INSERT INTO journal_meta (key, value) VALUES ('legacy_offset', ?) "
+                         "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (str(offset + len(complete)),))
+        if rows:
+            print(f"[JOURNAL] Imported {len(rows)} bookings from {path}", flush=True)
+        return len(rows)
+
+    def query(self, room=None, requester=None, date_from=None, date_to=None, action=None, event_id=None,
+              before=None, limit=50):
+        """Newest first; returns {"bookings", "total", "nextCursor"} (pass nextCursor as before)"""
+        clauses, params = [], []
+        if room:
+            clauses.append("(room = ? OR room_email = ?)")
+            params += [room, room]
+        if requester:
+            clauses.append("requester_email = ?")
+            params.append(requester)
+        if date_from:
+            clauses.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("date <= ?")
+            params.append(date_to)
+        if action:
+            clauses.append("action = ?")
+            params.append(action)
+        if event_id:
+            clauses.append("event_id = ?")
+            params.append(event_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        page_clauses = clauses + (["id < ?"] if before else [])
+        page_where = f" WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM bookings{where}", params).fetchone()[0]
+            rows = conn.execute(f"SELECT * FROM bookings{page_where} ORDER BY id DESC LIMIT ?",
+                                params + ([before] if before else []) + [limit + 1]).fetchall()
+        return {
+            "bookings": [dict(row) for row in rows[:limit]],
+            "total": total,
+            "nextCursor": rows[limit - 1]["id"] if len(rows) > limit else None
+        }
+
+
+def journal_event_fields(event_data):
+    """Journal fields of a Graph event (date and times in the event's own time zone)"""
+    start = event_data.get("start", {}).get("dateTime", "")
+    end = event_data.get("end", {}).get("dateTime", "")
+    return {"subject": event_data.get("subject"), "date": start[:10] or None,
+            "start_time": start[11:16] or None, "end_time": end[11:16] or None}
+
+
+booking_journal = BookingJournal(BOOKING_JOURNAL_DB)
+
+
+def start_booking_journal():
+    """Start the journal writer and import the legacy log; called from gunicorn's post_worker_init"""
+    booking_journal.start()
+    try:
+        booking_journal.import_legacy_log(BOOKING_LEGACY_LOG)
+    except Exception as e:
+        print(f"[JOURNAL] Importing {BOOKING_LEGACY_LOG} failed: {e}", flush=True)
+
+
 # ---- API endpoint: request meeting ----
 @app.post("/arcrooms/api/request-meeting")
 def request_meeting():
@@ -826,6 +3970,8 @@ def request_meeting():
         if not user or not user_token:
             # Clear expired session
             if user and not user_token:
+                if session.get('token_id'):
+                    user_tokens.delete(session['token_id'])
                 session.clear()
                 return jsonify({"error": "Uw sessie is verlopen. Log opnieuw in om een vergadering te boeken."}), 401
             return jsonify({"error": "Inloggen verplicht. Gebruik 'Inloggen met sv ARC account' knop."}), 401
@@ -869,17 +4015,12 @@ def request_meeting():
             "Content-Type": "application/json"
         }
         
-        rooms_url = f"{GRAPH_ENDPOINT}/places/microsoft.graph.room"
-        rooms_r = requests.get(rooms_url, headers=headers, timeout=10)
-        
         room_email = None
-        if rooms_r.status_code == 200:
-            rooms_list = rooms_r.json().get("value", [])
-            for r in rooms_list:
-                room_name = r.get("displayName", "")
-                if room_name.lower() == room.lower():
-                    room_email = r.get("emailAddress")
-                    break
+        for r in get_room_directory().values():
+            room_name = r.get("displayName", "")
+            if room_name.lower() == room.lower():
+                room_email = r.get("emailAddress")
+                break
         
         if not room_email:
             return jsonify({"error": f"Ruimte '{room}' niet gevonden."}), 404
@@ -936,7 +4077,7 @@ def request_meeting():
         create_headers["Prefer"] = 'outlook.timezone="Europe/Amsterdam"'
         
         create_url = f"{GRAPH_ENDPOINT}/me/calendar/events"
-        create_response = requests.post(create_url, json=calendar_event, headers=create_headers)
+        create_response = graph_post(create_url, json=calendar_event, headers=create_headers)
         
         if create_response.status_code not in [200, 201]:
             error_msg = create_response.json().get('error', {}).get('message', 'Onbekende fout')
@@ -946,11 +4087,14 @@ def request_meeting():
         event_id = event_data.get("id")
         
         # Log the booking
-        try:
-            with open("meeting_requests.log", "a") as f:
-                f.write(f"{datetime.now().isoformat()}|{room}|{date}|{start_time}-{end_time}|{subject}|{requester_name}|{requester_email}|{notes}|{event_id}\n")
-        except Exception as log_error:
-            print(f"Warning: Could not write to log file: {log_error}")
+        booking_journal.record("request", room=room, room_email=room_email, date=date, start_time=start_time,
+                               end_time=end_time, subject=subject, requester_name=requester_name,
+                               requester_email=requester_email, notes=notes, event_id=event_id, actor=requester_email)
+        
+        # Show the booking right away; the room's own copy replaces it once Graph has processed the invitation
+        write_through_booking(room_email, "create", event_id, MeetingRecord(
+            event_id, room, room_email, subject, to_local_minutes(event_start), to_local_minutes(event_end),
+            "tentative", "none", requester_email, requester_name, pending=True))
         
         return jsonify({
             "success": True,
@@ -1058,7 +4202,7 @@ def request_meeting():
             # Not logged in - create event in room's calendar using app token
             create_event_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/events"
         
-        event_response = requests.post(
+        event_response = graph_post(
             create_event_url, 
             json=calendar_event, 
             headers=event_headers, 
@@ -1166,7 +4310,7 @@ def request_meeting():
         
         # Try to send email using the room's mailbox
         send_mail_url = f"{GRAPH_ENDPOINT}/users/{room_email}/sendMail"
-        email_response = requests.post(
+        email_response = graph_post(
             send_mail_url,
             json=email_message,
             headers=email_headers,
@@ -1178,7 +4322,7 @@ def request_meeting():
             print(f"Warning: Could not send email via {room_email}: {email_response.status_code} - {email_response.text}")
             # Try alternative: send from application (requires Mail.Send permission on app)
             send_mail_url = f"{GRAPH_ENDPOINT}/me/sendMail"
-            email_response = requests.post(
+            email_response = graph_post(
                 send_mail_url,
                 json=email_message,
                 headers=email_headers,
@@ -1213,8 +4357,8 @@ def request_meeting():
 
 
 # ---- API endpoint: list all rooms in the organization ----
-@app.get("/arcrooms/api/rooms")
-def list_rooms():
+def fetch_all_rooms():
+    """Rooms from all room lists plus directly listed rooms, sorted by display name"""
     token = get_token()
     headers = {
         "Authorization": f"Bearer {token}",
@@ -1223,7 +4367,7 @@ def list_rooms():
 
     # Get all room lists
     url = f"{GRAPH_ENDPOINT}/places/microsoft.graph.roomlist"
-    r = requests.get(url, headers=headers)
+    r = graph_get(url, headers=headers, timeout=10)
     r.raise_for_status()
     
     room_lists = r.json().get("value", [])
@@ -1234,28 +4378,37 @@ def list_rooms():
         room_list_email = room_list.get("emailAddress")
         if room_list_email:
             rooms_url = f"{GRAPH_ENDPOINT}/places/{room_list_email}/microsoft.graph.roomlist/rooms"
-            rooms_r = requests.get(rooms_url, headers=headers)
+            rooms_r = graph_get(rooms_url, headers=headers, timeout=10)
             if rooms_r.status_code == 200:
                 rooms = rooms_r.json().get("value", [])
                 for room in rooms:
                     all_rooms[room["id"]] = room
     
     # Also get rooms directly (not in a room list)
-    direct_rooms_url = f"{GRAPH_ENDPOINT}/places/microsoft.graph.room"
-    direct_r = requests.get(direct_rooms_url, headers=headers)
-    if direct_r.status_code == 200:
-        direct_rooms = direct_r.json().get("value", [])
-        for room in direct_rooms:
-            all_rooms[room["id"]] = room
+    all_rooms.update(get_room_directory())
     
     # Convert back to list and sort by display name
-    rooms_list = sorted(all_rooms.values(), key=lambda x: x.get("displayName", ""))
+    return sorted(all_rooms.values(), key=lambda x: x.get("displayName", ""))
+
+
+@app.get("/arcrooms/api/rooms")
+def list_rooms():
+    cached_rooms, fetched_at, stale = rooms_cache.get("all", fetch_all_rooms)
+    token = get_token()
     
-    # Add delegates information for each room
-    for room in rooms_list:
+    # Add delegates information for each room (copies, the cached room dicts are shared)
+    rooms_list = []
+    for room in cached_rooms:
+        room = dict(room)
         room["delegates"] = get_room_delegates(room.get("emailAddress"), token)
+        rooms_list.append(room)
     
-    return jsonify({"rooms": rooms_list, "count": len(rooms_list)})
+    return jsonify({
+        "rooms": rooms_list,
+        "count": len(rooms_list),
+        "fetchedAt": datetime.fromtimestamp(fetched_at).isoformat(timespec='seconds'),
+        "stale": stale
+    })
 
 
 @app.get("/arcrooms/api/working-hours/<room_email>")
@@ -1352,7 +4505,7 @@ def delete_blocking_events(room_email, token):
     
     deleted_count = 0
     try:
-        response = requests.get(list_url, headers=headers, params=params)
+        response = graph_get(list_url, headers=headers, params=params)
         if response.status_code == 200:
             events = response.json().get("value", [])
             for event in events:
@@ -1361,7 +4514,7 @@ def delete_blocking_events(room_email, token):
                 if "niet beschikbaar" in subject:
                     event_id = event.get("id")
                     delete_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/events/{event_id}"
-                    del_response = requests.delete(delete_url, headers=headers)
+                    del_response = graph_delete(delete_url, headers=headers)
                     if del_response.status_code in [200, 204]:
                         deleted_count += 1
                         print(f"Deleted blocking event: {event.get('subject')} for {room_email}", flush=True)
@@ -1371,9 +4524,502 @@ def delete_blocking_events(room_email, token):
         raise
 
 
+@app.get("/arcrooms/api/admin/bookings")
+def query_bookings():
+    """
+    Query the booking journal, newest first.
+    Filters: room (name or email), requester, from / to (YYYY-MM-DD), action, eventId.
+    Paging: limit (max 500) and before=<nextCursor>. ADMIN_EMAILS may query every room,
+    room delegates only their own room.
+    """
+    user = session.get('user')
+    if not user:
+        return jsonify({"error": "Niet ingelogd"}), 401
+    user_email = (user.get('preferred_username') or user.get('email') or user.get('userPrincipalName') or '').lower()
+    room = request.args.get('room')
+    if user_email not in ADMIN_EMAILS:
+        if not room:
+            return jsonify({"error": "Geen toegang. Alleen beheerders kunnen alle ruimtes opvragen; kies een ruimte."}), 403
+        room_email = next((r.get("emailAddress") for r in get_room_directory().values()
+                           if room.lower() in ((r.get("displayName") or "").lower(), (r.get("emailAddress") or "").lower())), None)
+        if not room_email or not is_user_delegate(user_email, room_email, get_token()):
+            return jsonify({"error": "Geen toegang. U bent geen gemachtigde voor deze ruimte."}), 403
+    try:
+        date_from = validate_date(request.args['from']) if request.args.get('from') else None
+        date_to = validate_date(request.args['to']) if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({"error": f"Validatiefout: {str(e)}"}), 400
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    return jsonify(booking_journal.query(room=room, requester=request.args.get('requester'),
+                                         date_from=date_from, date_to=date_to,
+                                         action=request.args.get('action'), event_id=request.args.get('eventId'),
+                                         before=request.args.get('before', type=int), limit=limit))
+
+
+# ---- API endpoint: my bookings ----
+@app.get("/arcrooms/api/my-bookings")
+def my_bookings():
+    """
+    Meetings the logged-in member organizes in any room (today up to MEETINGS_WINDOW_DAYS ahead),
+    from the room store's organizer index. awaitingApproval means the room has not accepted yet;
+    pending means the action was made here and Graph does not show it yet. ?past=1 includes
+    meetings that already ended today.
+    """
+    user = session.get('user')
+    if not user:
+        return jsonify({"error": "Niet ingelogd"}), 401
+    user_email = (user.get('preferred_username') or user.get('email') or user.get('userPrincipalName') or '').lower()
+    meetings_cache.revalidate_if_stale("all", collect_meetings)
+    if not room_store.rooms:
+        response = jsonify({"error": "Gegevens worden geladen, probeer het zo opnieuw"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    include_past = request.args.get('past') == '1'
+    now = to_local_minutes(local_now())
+    base_url = REDIRECT_URI.rsplit('/auth/callback', 1)[0]
+    bookings = []
+    for meeting in room_store.organizer_meetings(user_email):
+        if not include_past and meeting.end is not None and meeting.end <= now:
+            continue
+        booking = meeting.to_dict(include_body=False)
+        booking["awaitingApproval"] = not meeting.is_organizer and meeting.room_response in ("none", "tentativelyAccepted")
+        booking["pending"] = meeting.pending
+        # A new booking only gets the room's own event id once Graph has processed the invitation
+        booking["cancelUrl"] = None if meeting.pending else (
+            f"{base_url}/api/cancel-meeting/{quote(meeting.id, safe='')}"
+            f"?room={quote(meeting.room_email)}&requester={quote(user_email)}")
+        bookings.append(booking)
+    return jsonify({"bookings": bookings, "count": len(bookings), "email": user_email})
+
+
+# ---- Meeting search ----
+# Inverted index over subject, organizer name and room of the meetings in the room store, updated per
+# changed room (room store listener). Terms are lowercased, stripped of accents and apostrophes,
+# stopwords are dropped and plural endings cut, so "de ALV's" finds "ALV" and "vergaderingen" finds
+# "Vergadering". Every query term matches as a prefix, found by bisecting the sorted vocabulary.
+SEARCH_MAX_RESULTS = 200
+SEARCH_STOPWORDS = frozenset(
+    "de het een en van in op te met voor aan bij om over uit tot naar door als of is".split())
+
+
+@lru_cache(maxsize=65536)
+def search_terms(text):
+    """Normalized terms of text (tuple, in order, without duplicates)"""
+    text = unicodedata.normalize("NFKD", (text or "").lower())  # Also splits the ĳ ligature into ij
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"(?<=[a-z0-9])['’]s\b", "", text).replace("'", "").replace("’", "")  # ALV's, agenda's
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in SEARCH_STOPWORDS:
+            continue
+        if len(word) > 5 and word.endswith("en"):
+            word = word[:-2]
+        elif len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        if word not in terms:
+            terms.append(word)
+    return tuple(terms)
+
+
+def meeting_search_terms(meeting):
+    return frozenset(search_terms(meeting.subject) + search_terms(meeting.organizer_name) + search_terms(meeting.room))
+
+
+class MeetingSearchIndex:
+    """Postings per term over the room store's meetings; updates touch only the changed meetings"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.docs = {}        # (room_email, meeting id) -> record
+        self.doc_terms = {}   # (room_email, meeting id) -> frozenset of terms
+        self.room_docs = {}   # room_email -> set of doc keys
+        self.postings = {}    # term -> set of doc keys
+        self.vocabulary = []  # sorted terms, for prefix lookups
+
+    def room_changed(self, room_email, old_meetings, new_meetings):
+        """Room store listener"""
+        self.update_room(room_email, new_meetings)
+
+    def load(self, store):
+        """Index the rooms already in store"""
+        with store.lock:
+            rooms = [(room_email, entry["meetings"]) for room_email, entry in store.rooms.items()]
+        for room_email, meetings in rooms:
+            self.update_room(room_email, meetings)
+
+    def update_room(self, room_email, meetings):
+        docs = {(room_email, m.id): m for m in meetings}
+        with self.lock:
+            for key in self.room_docs.get(room_email, set()) - docs.keys():
+                self._unindex(key)
+                del self.docs[key]
+            for key, meeting in docs.items():
+                terms = meeting_search_terms(meeting)
+                if self.doc_terms.get(key) != terms:
+                    self._unindex(key)
+                    self._index(key, terms)
+                self.docs[key] = meeting
+            self.room_docs[room_email] = set(docs)
+
+    def _index(self, key, terms):
+        self.doc_terms[key] = terms
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = set()
+                bisect.insort(self.vocabulary, term)
+            posting.add(key)
+
+    def _unindex(self, key):
+        for term in self.doc_terms.pop(key, ()):
+            posting = self.postings[term]
+            posting.discard(key)
+            if not posting:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def search(self, query, room_emails=None, start_from=None, start_before=None):
+        """Records matching every query term (as a prefix), optionally within rooms and a start range"""
+        terms = search_terms(query)
+        if not terms:
+            return []
+        with self.lock:
+            matches = None
+            for term in terms:
+                first = bisect.bisect_left(self.vocabulary, term)
+                last = bisect.bisect_left(self.vocabulary, term + "\uffff", first)
+                keys = set().union(*(self.postings[t] for t in self.vocabulary[first:last]))
+                matches = keys if matches is None else matches & keys
+                if not matches:
+                    return []
+            meetings = [self.docs[key] for key in matches]
+        return sorted((m for m in meetings
+                       if (room_emails is None or m.room_email.lower() in room_emails)
+                       and (start_from is None or (m.start or 0) >= start_from)
+                       and (start_before is None or (m.start or 0) < start_before)),
+                      key=lambda m: (m.start or 0, m.room))
+
+    def size(self):
+        with self.lock:
+            return {"meetings": len(self.docs), "terms": len(self.vocabulary)}
+
+
+search_index = MeetingSearchIndex()
+room_store.add_listener(search_index.room_changed)
+search_index.load(room_store)
+
+
+@app.get("/arcrooms/api/search")
+def search_meetings():
+    """
+    Search meetings by subject, organizer name and room: q (every word must match, as a prefix),
+    optional from / to (YYYY-MM-DD) and room (name or email), limit (max 200).
+    """
+    query = (request.args.get('q') or '').strip()
+    if not search_terms(query):
+        return jsonify({"error": "Geef een zoekterm op"}), 400
+    try:
+        date_from = validate_date(request.args['from']) if request.args.get('from') else None
+        date_to = validate_date(request.args['to']) if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({"error": f"Validatiefout: {str(e)}"}), 400
+    room_emails = None
+    room = (request.args.get('room') or '').lower()
+    if room:
+        room_emails = {(r.get("emailAddress") or "").lower() for r in get_room_directory().values()
+                       if room in ((r.get("displayName") or "").lower(), (r.get("emailAddress") or "").lower())}
+        if not room_emails:
+            return jsonify({"error": "Onbekende ruimte"}), 404
+    limit = max(1, min(request.args.get('limit', 50, type=int), SEARCH_MAX_RESULTS))
+    meetings_cache.revalidate_if_stale("all", collect_meetings)
+
+    started = time.perf_counter()
+    meetings = search_index.search(query, room_emails,
+                                   to_local_minutes(f"{date_from}T00:00") if date_from else None,
+                                   to_local_minutes(f"{date_to}T00:00") + 1440 if date_to else None)
+    return jsonify({
+        "results": [meeting.to_dict(include_body=False) for meeting in meetings[:limit]],
+        "count": min(len(meetings), limit),
+        "total": len(meetings),
+        "computeMs": round((time.perf_counter() - started) * 1000, 2)
+    })
+
+
+# ---- Occupancy archive and analytics ----
+# Meetings that took place are appended to a compact columnar archive so committees can see how busy
+# rooms really are over the years, long after they left the 10-day window. One file per month of
+# fixed-size records (event id hash, room id, organizer id, start minute, duration, kind); room and
+# organizer ids are stable hashes, so workers append without coordinating, and their addresses are
+# kept in names.jsonl. Ended meetings are swept by one worker at a time (a lease in the state backend);
+# swept.json keeps per room up to which minute meetings were archived, so restarts do not add them
+# again. Graph has no check-ins, so a meeting cancelled shortly before or during its time counts as a
+# no-show.
+try:
+    import numpy
+except ImportError:  # In requirements.txt; without it the archive is still written, /api/analytics/occupancy answers 501
+    numpy = None
+
+OCCUPANCY_ARCHIVE_DIR = os.getenv('OCCUPANCY_ARCHIVE_DIR', 'occupancy')  # Empty turns archiving off
+OCCUPANCY_SWEEP_SECONDS = 300
+OCCUPANCY_LATE_CANCEL_MINUTES = int(os.getenv('OCCUPANCY_LATE_CANCEL_MINUTES', '120'))  # Cancelled later = no-show
+OCCUPANCY_DAY_HOURS = os.getenv('OCCUPANCY_DAY_HOURS', '8-23')  # Opening hours utilization is measured against
+OCCUPANCY_RECORD = struct.Struct("<QIIiHBx")
+OCCUPANCY_HELD, OCCUPANCY_LATE_CANCEL = 0, 1
+WEEKDAY_NAMES = ("ma", "di", "wo", "do", "vr", "za", "zo")
+
+OCCUPANCY_RECORDS = Counter(
+    "arcrooms_occupancy_records_total",
+    "Meetings appended to the occupancy archive (kind: held, late_cancel)",
+    ("kind",))
+
+
+def name_id(value):
+    """Stable 32-bit id of a room or organizer address"""
+    return int.from_bytes(hashlib.blake2b(value.lower().encode(), digest_size=4).digest(), "big")
+
+
+class OccupancyArchive:
+    """Append-only monthly record files plus the queries over them"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.started = False
+        self.names = {}  # id -> {"email", "name"}
+        self.loaded = {}  # file path -> (size, records) for files read by queries
+        os.makedirs(path, exist_ok=True)
+        names_path = os.path.join(path, "names.jsonl")
+        if os.path.exists(names_path):
+            with open(names_path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.names[entry["id"]] = entry
+
+    def _name(self, value, name=None):
+        """Id of an address, writing it to names.jsonl the first time"""
+        value = (value or "").lower()
+        ident = name_id(value)
+        if ident not in self.names or (name and self.names[ident].get("name") != name):
+            self.names[ident] = {"id": ident, "email": value, "name": name}
+            with open(os.path.join(self.path, "names.jsonl"), "a") as f:
+                f.write(json.dumps(self.names[ident]) + "\n")
+        return ident
+
+    def append(self, meetings, kind):
+        """Append meetings (MeetingRecords); returns the number written"""
+        by_month = {}
+        with self.lock:
+            for m in meetings:
+                if m.start is None:
+                    continue
+                record = OCCUPANCY_RECORD.pack(
+                    int.from_bytes(hashlib.blake2b(m.id.encode(), digest_size=8).digest(), "big"),
+                    self._name(m.room_email, m.room), self._name(m.organizer_email, m.organizer_name),
+                    m.start, max(0, min((m.end or m.start) - m.start, 0xFFFF)), kind)
+                by_month.setdefault(from_local_minutes(m.start)[:7], []).append(record)
+            for month, records in by_month.items():
+                # One write per month file; O_APPEND keeps records of concurrent workers whole
+                with open(os.path.join(self.path, f"{month}.bin"), "ab") as f:
+                    f.write(b"".join(records))
+        written = sum(len(records) for records in by_month.values())
+        if written:
+            OCCUPANCY_RECORDS.inc(written, kind="held" if kind == OCCUPANCY_HELD else "late_cancel")
+        return written
+
+    def swept(self):
+        """Room email -> local minute up to which its ended meetings are archived"""
+        try:
+            with open(os.path.join(self.path, "swept.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def sweep(self):
+        """Archive the meetings that ended since the previous sweep of their room"""
+        now = to_local_minutes(local_now())
+        with room_store.lock:
+            entries = [(email.lower(), entry["meetings"]) for email, entry in room_store.rooms.items()]
+        swept = self.swept()
+        ended = [m for room_email, meetings in entries for m in meetings
+                 if m.end is not None and swept.get(room_email, 0) < m.end <= now and occupies_room(m)]
+        written = self.append(ended, OCCUPANCY_HELD)
+        swept.update((room_email, now) for room_email, _ in entries)
+        swept_path = os.path.join(self.path, "swept.json")
+        with open(swept_path + ".tmp", "w") as f:
+            json.dump(swept, f)
+        os.replace(swept_path + ".tmp", swept_path)
+        return written
+
+    def room_changed(self, room_email, old_meetings, new_meetings):
+        """Room store listener: meetings removed close to or during their time are late cancellations"""
+        if not old_meetings or not room_shards.owns(room_email):
+            return
+        now = to_local_minutes(local_now())
+        remaining = {m.id for m in new_meetings}
+        cancelled = [m for m in old_meetings if m.id not in remaining and occupies_room(m)
+                     and m.start - OCCUPANCY_LATE_CANCEL_MINUTES <= now < (m.end or m.start)]
+        self.append(cancelled, OCCUPANCY_LATE_CANCEL)
+
+    def start(self):
+        """Start the sweep loop (once per process; called from gunicorn's post_worker_init)"""
+        with self.lock:
+            if self.started:
+                return False
+            self.started = True
+        Thread(target=self.run, name="arcrooms-occupancy", daemon=True).start()
+        return True
+
+    def run(self):
+        """Every OCCUPANCY_SWEEP_SECONDS, sweep unless another worker did so in this round"""
+        while True:
+            time.sleep(OCCUPANCY_SWEEP_SECONDS)
+            try:
+                if state.set_if_absent("lease:occupancy-sweep", SHARD_MEMBER_ID, ttl=OCCUPANCY_SWEEP_SECONDS / 2):
+                    self.sweep()
+            except Exception as e:
+                print(f"[OCCUPANCY] Archiving failed: {e}", flush=True)
+
+    def records(self, first_month, last_month):
+        """numpy structured array of the records in the month files from first_month to last_month"""
+        dtype = numpy.dtype([("id", "<u8"), ("room", "<u4"), ("organizer", "<u4"), ("start", "<i4"),
+                             ("duration", "<u2"), ("kind", "u1"), ("pad", "u1")])
+        parts = []
+        for file_name in sorted(os.listdir(self.path)):
+            if not file_name.endswith(".bin") or not first_month <= file_name[:7] <= last_month:
+                continue
+            file_path = os.path.join(self.path, file_name)
+            size = os.path.getsize(file_path)
+            cached = self.loaded.get(file_path)
+            if cached is None or cached[0] != size:
+                # Only whole records: another worker may be appending right now
+                records = numpy.fromfile(file_path, dtype=dtype, count=size // dtype.itemsize)
+                # A meeting can occur twice, e.g. when two sweeps overlapped without a shared state
+                # backend (a month file holds all records of an event); keep the last record per event
+                _, last = numpy.unique(records["id"][::-1], return_index=True)
+                cached = (size, records[::-1][numpy.sort(last)][::-1])
+                self.loaded[file_path] = cached
+            parts.append(cached[1])
+        return numpy.concatenate(parts) if parts else numpy.zeros(0, dtype=dtype)
+
+
+def occupies_room(meeting):
+    """Counts for occupancy: not free, not declined by the room, not a write-through placeholder"""
+    return meeting.status != "free" and meeting.room_response != "declined" and not meeting.pending
+
+
+def occupancy_stats(records, day_from, day_to, day_hours, names):
+    """Utilization, heatmap, peak hours and no-show rates over records (vectorized)"""
+    start = records["start"].astype(numpy.int64)
+    end = start + records["duration"]
+    day = start // 1440
+    weekday = (day + 3) % 7  # 1970-01-01 was a Thursday
+    held = records["kind"] == OCCUPANCY_HELD
+    days = numpy.arange(day_from, day_to + 1)
+    weekdays_in_range = numpy.bincount((days + 3) % 7, minlength=7)
+    rooms, room_index = numpy.unique(records["room"], return_inverse=True)
+
+    # Minutes booked per weekday and hour of day (meetings held, cut off at midnight): +1 at each start
+    # and -1 at each end minute of the week, summed up, gives the rooms in use in every minute
+    week_start = (weekday * 1440 + start % 1440)[held]
+    week_end = numpy.minimum(week_start + records["duration"][held], (weekday[held] + 1) * 1440)
+    in_use = numpy.cumsum(numpy.bincount(week_start, minlength=7 * 1440 + 1)
+                          - numpy.bincount(week_end, minlength=7 * 1440 + 1))[:7 * 1440]
+    booked = in_use.reshape(7, 24, 60).sum(axis=2).astype(float)
+    capacity = weekdays_in_range[:, None] * 60 * max(len(rooms), 1)
+    heatmap = numpy.divide(booked, capacity, out=numpy.zeros_like(booked), where=capacity > 0)
+
+    # Utilization within opening hours, per room
+    open_from, open_to = day_hours
+    opening = numpy.clip(numpy.minimum(end, day * 1440 + open_to * 60) - numpy.maximum(start, day * 1440 + open_from * 60),
+                         0, None) * held
+    open_minutes = len(days) * (open_to - open_from) * 60
+    used = numpy.bincount(room_index, weights=opening, minlength=len(rooms))
+    held_count = numpy.bincount(room_index, weights=held, minlength=len(rooms))
+    late_count = numpy.bincount(room_index, weights=~held, minlength=len(rooms))
+    booked_hours = numpy.bincount(room_index, weights=records["duration"] * held, minlength=len(rooms)) / 60
+    # Distinct organizers per room: unique (room, organizer) pairs packed into one integer
+    pairs = numpy.unique((room_index.astype(numpy.int64) << 32 | records["organizer"])[held])
+    organizer_count = numpy.bincount(pairs >> 32, minlength=len(rooms))
+
+    room_rows = []
+    for i, room_id in enumerate(rooms.tolist()):
+        name = names.get(room_id, {})
+        total = held_count[i] + late_count[i]
+        room_rows.append({
+            "room": name.get("name"),
+            "roomEmail": name.get("email"),
+            "meetings": int(held_count[i]),
+            "bookedHours": round(float(booked_hours[i]), 1),
+            "utilization": round(float(used[i]) / open_minutes, 3) if open_minutes else None,
+            "noShows": int(late_count[i]),
+            "noShowRate": round(float(late_count[i]) / total, 3) if total else None,
+            "organizers": int(organizer_count[i])
+        })
+    room_rows.sort(key=lambda row: -row["bookedHours"])
+    peaks = numpy.argsort(heatmap, axis=None)[::-1][:5]
+    return {
+        "rooms": room_rows,
+        "heatmap": {"weekdays": list(WEEKDAY_NAMES), "hours": list(range(24)),
+                    "occupancy": numpy.round(heatmap, 3).tolist()},
+        "peakHours": [{"weekday": WEEKDAY_NAMES[i // 24], "hour": int(i % 24), "occupancy": round(float(heatmap.flat[i]), 3)}
+                      for i in peaks if heatmap.flat[i] > 0],
+        "byHour": numpy.round(booked.sum(axis=0) / max(len(days) * max(len(rooms), 1) * 60, 1), 3).tolist()
+    }
+
+
+occupancy_archive = OccupancyArchive(OCCUPANCY_ARCHIVE_DIR) if OCCUPANCY_ARCHIVE_DIR else None
+if occupancy_archive:
+    room_store.add_listener(occupancy_archive.room_changed)
+
+
+@app.get("/arcrooms/api/analytics/occupancy")
+def occupancy_analytics():
+    """
+    Room occupancy from the archive for logged-in members.
+    Filters: from / to (YYYY-MM-DD, default the last 365 days) and room (name or email).
+    Returns utilization within OCCUPANCY_DAY_HOURS, a weekday x hour heatmap, peak hours and
+    no-show rates per room.
+    """
+    if not session.get('user'):
+        return jsonify({"error": "Niet ingelogd"}), 401
+    if occupancy_archive is None:
+        return jsonify({"error": "Bezettingsarchief staat uit (OCCUPANCY_ARCHIVE_DIR)"}), 404
+    if numpy is None:
+        return jsonify({"error": "Analyse vereist numpy (pip install numpy)"}), 501
+    try:
+        today = local_now().date()
+        date_to = validate_date(request.args['to']) if request.args.get('to') else today.isoformat()
+        date_from = validate_date(request.args['from']) if request.args.get('from') else \
+            (today - timedelta(days=365)).isoformat()
+        open_from, _, open_to = OCCUPANCY_DAY_HOURS.partition("-")
+        day_hours = (int(open_from), int(open_to))
+    except ValueError as e:
+        return jsonify({"error": f"Validatiefout: {str(e)}"}), 400
+    if date_from > date_to:
+        return jsonify({"error": "Validatiefout: from ligt na to"}), 400
+
+    started = time.perf_counter()
+    day_from = to_local_minutes(f"{date_from}T00:00") // 1440
+    day_to = to_local_minutes(f"{date_to}T00:00") // 1440
+    records = occupancy_archive.records(date_from[:7], date_to[:7])
+    start = records["start"]
+    records = records[(start >= day_from * 1440) & (start < (day_to + 1) * 1440)]
+    room = (request.args.get('room') or '').lower()
+    if room:
+        ids = [ident for ident, name in occupancy_archive.names.items()
+               if room in ((name.get("email") or "").lower(), (name.get("name") or "").lower())]
+        records = records[numpy.isin(records["room"], ids)]
+    payload = occupancy_stats(records, day_from, day_to, day_hours, occupancy_archive.names)
+    payload.update({"from": date_from, "to": date_to, "openingHours": OCCUPANCY_DAY_HOURS, "records": int(len(records)),
+                    "computeMs": round((time.perf_counter() - started) * 1000, 1)})
+    return jsonify(payload)
+
+
 # ---- API endpoint: get room schedule ----
 @app.get("/arcrooms/api/room")
 def room_schedule():
+    """Raw getSchedule payload of one mailbox for the next 24 hours (see /api/availability for several rooms)"""
     room_email = request.args.get("email")
     if not room_email:
         return jsonify({"error": "email parameter missing"}), 400
@@ -1410,12 +5056,169 @@ def room_schedule():
     }
 
     url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/getSchedule"
-    r = requests.post(url, json=body, headers=headers)
+    r = graph_post(url, json=body, headers=headers, timeout=10, coalesce=True)
     r.raise_for_status()
 
     return jsonify(r.json())
 
 
+# ---- API endpoint: multi-room availability (getSchedule) ----
+# getSchedule answers for several mailboxes per call; results are cached per room and window in the
+# shared state so door displays polling the same rooms share one Graph call per SCHEDULE_CACHE_SECONDS.
+SCHEDULE_BATCH_SIZE = int(os.getenv('SCHEDULE_BATCH_SIZE', '20'))  # Mailboxes per getSchedule call
+SCHEDULE_CACHE_SECONDS = int(os.getenv('SCHEDULE_CACHE_SECONDS', '60'))
+SCHEDULE_MAX_HOURS = 7 * 24
+AVAILABILITY_STATUS = {"0": "free", "1": "tentative", "2": "busy", "3": "oof", "4": "workingElsewhere"}
+
+SCHEDULE_CACHE_EVENTS = Counter(
+    "arcrooms_schedule_cache_events_total",
+    "Availability cache lookups per room (hit, miss)",
+    ("event",))
+
+
+def fetch_schedules(room_emails, window_start, window_end, interval):
+    """availabilityView per room, using as few getSchedule calls as possible.
+
+    Returns {room_email: view string or None when Graph reported an error for that room}.
+    """
+    start_iso = window_start.isoformat(timespec='seconds')
+    end_iso = window_end.isoformat(timespec='seconds')
+    # Shared state: "schedule:<interval>:<start>:<end>:<room>" -> availabilityView
+    key_prefix = f"schedule:{interval}:{start_iso}:{end_iso}:"
+    cached = state.get_many([key_prefix + room_email for room_email in room_emails])
+    views = {room_email: cached[key_prefix + room_email] for room_email in room_emails if key_prefix + room_email in cached}
+    missing = [room_email for room_email in room_emails if room_email not in views]
+    SCHEDULE_CACHE_EVENTS.inc(len(views), event="hit")
+    if not missing:
+        return views
+    SCHEDULE_CACHE_EVENTS.inc(len(missing), event="miss")
+
+    headers = {
+        "Authorization": f"Bearer {get_token()}",
+        "Content-Type": "application/json"
+    }
+
+    def fetch_batch(batch):
+        body = {
+            "schedules": batch,
+            "startTime": {"dateTime": start_iso, "timeZone": "UTC"},
+            "endTime": {"dateTime": end_iso, "timeZone": "UTC"},
+            "availabilityViewInterval": interval
+        }
+        # Any mailbox can answer for the whole batch; identical batches share one in-flight call
+        url = f"{GRAPH_ENDPOINT}/users/{batch[0]}/calendar/getSchedule"
+        r = graph_post(url, json=body, headers=headers, timeout=10, coalesce=True)
+        r.raise_for_status()
+        return r.json().get("value", [])
+
+    batches = [missing[i:i + SCHEDULE_BATCH_SIZE] for i in range(0, len(missing), SCHEDULE_BATCH_SIZE)]
+    results = list(room_fetch_executor.map(fetch_batch, batches)) if len(batches) > 1 else [fetch_batch(batches[0])]
+
+    for schedule in (item for batch in results for item in batch):
+        room_email = (schedule.get("scheduleId") or "").lower()
+        view = schedule.get("availabilityView")
+        if schedule.get("error") or view is None:
+            print(f"getSchedule error for {room_email}: {schedule.get('error')}", flush=True)
+            views[room_email] = None
+            continue
+        views[room_email] = view
+        state.set(key_prefix + room_email, view, ttl=SCHEDULE_CACHE_SECONDS)
+    for room_email in missing:
+        views.setdefault(room_email, None)
+    return views
+
+
+def encode_availability(view):
+    """Run-length encode an availabilityView: "0022200" -> "0:2,2:3,0:2" (status:slots)"""
+    runs = []
+    for code in view:
+        if runs and runs[-1][0] == code:
+            runs[-1][1] += 1
+        else:
+            runs.append([code, 1])
+    return ",".join(f"{code}:{count}" for code, count in runs)
+
+
+def availability_now(view, window_start, interval):
+    """Current status and the UTC time it changes, for door displays"""
+    slot = max(0, int((datetime.utcnow() - window_start).total_seconds() // (interval * 60)))
+    if slot >= len(view):
+        return {"status": None, "until": None}
+    code = view[slot]
+    end_slot = slot
+    while end_slot < len(view) and view[end_slot] == code:
+        end_slot += 1
+    until = window_start + timedelta(minutes=end_slot * interval) if end_slot < len(view) else None
+    return {"status": AVAILABILITY_STATUS.get(code, code),
+            "until": until.isoformat(timespec='seconds') + "Z" if until else None}
+
+
+@app.get("/arcrooms/api/availability")
+def rooms_availability():
+    """
+    Free/busy of several rooms in one request.
+    Query: rooms=a@svarc.nl,b@svarc.nl (default: all rooms), start=ISO UTC (default: now),
+    hours=24, interval=30 (minutes), format=rle|view.
+    Each room gets a run-length encoded availabilityView (0 free, 1 tentative, 2 busy, 3 oof,
+    4 working elsewhere) plus its current status and when that changes.
+    """
+    try:
+        interval = int(request.args.get("interval", 30))
+        hours = int(request.args.get("hours", 24))
+        if not 5 <= interval <= 1440 or not 1 <= hours <= SCHEDULE_MAX_HOURS:
+            raise ValueError("interval must be 5-1440 minutes and hours 1-168")
+        start_arg = request.args.get("start")
+        start = datetime.fromisoformat(start_arg.rstrip("Z")) if start_arg else datetime.utcnow()
+        if start.tzinfo:
+            start = start.astimezone(timezone.utc).replace(tzinfo=None)
+        output_format = request.args.get("format", "rle")
+        if output_format not in ("rle", "view"):
+            raise ValueError("format must be rle or view")
+
+        directory = {r["emailAddress"].lower(): r for r in get_room_directory().values() if r.get("emailAddress")}
+        rooms_arg = request.args.get("rooms")
+        room_emails = [validate_email(e.strip()) for e in rooms_arg.split(",") if e.strip()] if rooms_arg else sorted(directory)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error in rooms_availability: {str(e)}", flush=True)
+        return jsonify({"error": str(e)}), 500
+
+    # Only room mailboxes: free/busy of people is not public
+    unknown = [e for e in room_emails if e not in directory]
+    if unknown:
+        return jsonify({"error": f"Onbekende ruimte(s): {', '.join(unknown)}"}), 400
+
+    # Align the window to the interval so displays share cache entries
+    epoch_minutes = int(start.replace(tzinfo=timezone.utc).timestamp() // 60)
+    window_start = datetime.utcfromtimestamp((epoch_minutes - epoch_minutes % interval) * 60)
+    window_end = window_start + timedelta(hours=hours)
+
+    try:
+        views = fetch_schedules(list(dict.fromkeys(room_emails)), window_start, window_end, interval)
+    except Exception as e:
+        print(f"Error fetching availability: {str(e)}", flush=True)
+        return jsonify({"error": str(e)}), 502
+
+    rooms = {}
+    for room_email in room_emails:
+        view = views.get(room_email)
+        if view is None:
+            rooms[room_email] = {"room": directory[room_email].get("displayName"), "error": "unavailable"}
+            continue
+        rooms[room_email] = {
+            "room": directory[room_email].get("displayName"),
+            output_format: encode_availability(view) if output_format == "rle" else view,
+            **availability_now(view, window_start, interval)
+        }
+    return jsonify({
+        "start": window_start.isoformat(timespec='seconds') + "Z",
+        "end": window_end.isoformat(timespec='seconds') + "Z",
+        "interval": interval,
+        "rooms": rooms
+    })
+
+
 @app.route("/arcrooms/api/approve-meeting/<event_id>", methods=["GET"])
 def approve_meeting(event_id):
     """Approve a meeting request - changes from tentative to busy"""
@@ -1442,7 +5245,7 @@ def approve_meeting(event_id):
         
         # Get the event from room's calendar
         room_event_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/events/{event_id}"
-        r = requests.get(room_event_url, headers=headers)
+        r = graph_get(room_event_url, headers=headers)
         
         if r.status_code != 200:
             return f"Vergadering niet gevonden in {room_email} agenda (Error {r.status_code})", 404
@@ -1454,9 +5257,12 @@ def approve_meeting(event_id):
             "showAs": "busy"
         }
         
-        update_r = requests.patch(room_event_url, json=update_data, headers=headers)
+        update_r = graph_patch(room_event_url, json=update_data, headers=headers)
         
         if update_r.status_code in [200, 202, 204]:
+            write_through_booking(room_email, "status", event_id, status="busy")
+            booking_journal.record("approve", room_email=room_email, requester_email=requester, event_id=event_id,
+                                   actor=approver, **journal_event_fields(event_data))
             # Send confirmation email to requester
             if requester:
                 cancel_url = f"{REDIRECT_URI.rsplit('/auth/callback', 1)[0]}/api/cancel-meeting/{event_id}?room={room_email}&requester={requester}"
@@ -1503,14 +5309,14 @@ def approve_meeting(event_id):
                 }
                 
                 try:
-                    email_r = requests.post(
+                    email_r = graph_post(
                         f"{GRAPH_ENDPOINT}/users/{room_email}/sendMail",
                         json=approval_email,
                         headers=headers
                     )
                     if email_r.status_code not in [200, 202]:
                         # Try fallback
-                        requests.post(f"{GRAPH_ENDPOINT}/me/sendMail", json=approval_email, headers=headers)
+                        graph_post(f"{GRAPH_ENDPOINT}/me/sendMail", json=approval_email, headers=headers)
                 except:
                     pass
             
@@ -1554,7 +5360,7 @@ def reject_meeting(event_id):
         # Get event details before deleting
         headers = {"Authorization": f"Bearer {token}"}
         room_event_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/events/{event_id}"
-        r = requests.get(room_event_url, headers=headers)
+        r = graph_get(room_event_url, headers=headers)
         
         if r.status_code != 200:
             return f"Vergadering niet gevonden (Error {r.status_code})", 404
@@ -1562,9 +5368,12 @@ def reject_meeting(event_id):
         event_data = r.json()
         
         # Delete the event
-        delete_r = requests.delete(room_event_url, headers=headers)
+        delete_r = graph_delete(room_event_url, headers=headers)
         
         if delete_r.status_code in [200, 202, 204]:
+            write_through_booking(room_email, "delete", event_id)
+            booking_journal.record("reject", room_email=room_email, requester_email=requester, event_id=event_id,
+                                   actor=approver, **journal_event_fields(event_data))
             # Send notification to requester about rejection
             if requester:
                 start_time = event_data.get('start', {}).get('dateTime', 'N/A')
@@ -1608,13 +5417,13 @@ def reject_meeting(event_id):
                 
                 # Send notification email
                 try:
-                    email_r = requests.post(
+                    email_r = graph_post(
                         f"{GRAPH_ENDPOINT}/users/{room_email}/sendMail",
                         json=rejection_email,
                         headers=headers
                     )
                     if email_r.status_code not in [200, 202]:
-                        requests.post(f"{GRAPH_ENDPOINT}/me/sendMail", json=rejection_email, headers=headers)
+                        graph_post(f"{GRAPH_ENDPOINT}/me/sendMail", json=rejection_email, headers=headers)
                 except:
                     pass  # Email sending is optional
             
@@ -1657,7 +5466,7 @@ def cancel_meeting(event_id):
         # Get event details before deleting
         headers = {"Authorization": f"Bearer {token}"}
         room_event_url = f"{GRAPH_ENDPOINT}/users/{room_email}/calendar/events/{event_id}"
-        r = requests.get(room_event_url, headers=headers)
+        r = graph_get(room_event_url, headers=headers)
         
         if r.status_code != 200:
             return f"Vergadering niet gevonden (Error {r.status_code})", 404
@@ -1665,9 +5474,12 @@ def cancel_meeting(event_id):
         event_data = r.json()
         
         # Delete the event
-        delete_r = requests.delete(room_event_url, headers=headers)
+        delete_r = graph_delete(room_event_url, headers=headers)
         
         if delete_r.status_code in [200, 202, 204]:
+            write_through_booking(room_email, "delete", event_id)
+            booking_journal.record("cancel", room_email=room_email, requester_email=requester, event_id=event_id,
+                                   actor=requester, **journal_event_fields(event_data))
             return f"""
             <html>
             <head><style>
@@ -1693,10 +5505,368 @@ def cancel_meeting(event_id):
         return f"Fout: {str(e)}", 500
 
 
+@app.get("/arcrooms/metrics")
+def metrics():
+    """Prometheus scrape endpoint (Graph latency, token fetches, cache efficiency, route latency)"""
+    # Behind the proxy every request comes from localhost, so only the token can tell scrapers apart
+    if not METRICS_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    if not secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+        return jsonify({"error": "Unauthorized"}), 401
+    response = make_response(render_metrics())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+
+# ---- Admin profiling ----
+# For a worker whose memory creeps up or that pegs a CPU: tracemalloc can be switched on and off at
+# runtime and shows the top allocation sites (or the growth since a baseline snapshot), and a
+# sampling profiler records stacks for a few seconds as collapsed stacks for flamegraph.pl or
+# speedscope. Everything is per worker process (see pid in the answers); ADMIN_EMAILS only.
+PROFILE_MAX_SECONDS = 60
+PROFILE_DEFAULT_INTERVAL = 0.01  # 100 samples per second per thread
+
+
+def admin_or_error():
+    """(admin email, None) for an ADMIN_EMAILS session, else (None, error response)"""
+    user = session.get('user')
+    if not user:
+        return None, (jsonify({"error": "Niet ingelogd"}), 401)
+    user_email = (user.get('preferred_username') or user.get('email') or user.get('userPrincipalName') or '').lower()
+    if user_email not in ADMIN_EMAILS:
+        return None, (jsonify({"error": "Geen toegang. Alleen voor beheerders."}), 403)
+    return user_email, None
+
+
+class MemoryProfiler:
+    """tracemalloc switched on demand, with a baseline snapshot for diffs"""
+
+    GROUPINGS = ("lineno", "filename", "traceback")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.baseline = None
+        self.started_at = None
+
+    def start(self, frames):
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self.started_at = time.time()
+            self.baseline = self._snapshot()
+
+    def stop(self):
+        with self.lock:
+            tracemalloc.stop()
+            self.baseline = self.started_at = None
+
+    def mark(self):
+        """Make the current allocations the baseline for diff()"""
+        with self.lock:
+            self.baseline = self._snapshot()
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+
+    def top(self, group, limit):
+        return [self._stat(stat, group) for stat in self._snapshot().statistics(group)[:limit]]
+
+    def diff(self, group, limit):
+        with self.lock:
+            baseline = self.baseline
+        stats = self._snapshot().compare_to(baseline, group)[:limit]
+        return [dict(self._stat(stat, group), sizeDiffBytes=stat.size_diff, countDiff=stat.count_diff) for stat in stats]
+
+    @staticmethod
+    def _stat(stat, group):
+        frame = stat.traceback[0]
+        entry = {"location": frame.filename if group == "filename" else f"{frame.filename}:{frame.lineno}",
+                 "sizeBytes": stat.size, "count": stat.count}
+        if group == "traceback":
+            entry["traceback"] = [f"{f.filename}:{f.lineno}" for f in stat.traceback]
+        return entry
+
+    def status(self):
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": tracemalloc.is_tracing(), "frames": tracemalloc.get_traceback_limit(),
+                "startedAt": self.started_at, "tracedBytes": current, "peakBytes": peak,
+                "overheadBytes": tracemalloc.get_tracemalloc_memory(), "pid": os.getpid()}
+
+
+memory_profiler = MemoryProfiler()
+
+
+def thread_cpu_clock(thread_id):
+    """Per-thread CPU clock id (Linux/Unix), None where not available"""
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of every other thread at a fixed interval; one run per worker at a time.
+
+    In cpu mode a thread is only counted when its CPU clock advanced since the previous sample, so
+    threads waiting on Graph, locks or sockets drop out; wall mode counts every sample.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+
+    def run(self, seconds, interval, mode):
+        """Collapsed stacks ("thread;outer;...;inner count" lines) and the number of samples taken"""
+        if not self.lock.acquire(blocking=False):
+            return None, 0
+        try:
+            own = threading.get_ident()
+            counts = {}
+            cpu_seen = {}
+            names = {}
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names.update((t.ident, re.sub(r"[\d_-]+$", "", t.name) or t.name) for t in threading.enumerate())
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own:
+                        continue
+                    if mode == "cpu":
+                        clock = thread_cpu_clock(thread_id)
+                        if clock is not None:
+                            try:
+                                used = time.clock_gettime(clock)
+                            except OSError:  # Thread ended
+                                continue
+                            previous = cpu_seen.get(thread_id)
+                            cpu_seen[thread_id] = used
+                            if previous is None or used - previous < interval / 10:
+                                continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame_label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    key = ";".join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+                samples += 1
+                time.sleep(interval)
+            lines = "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+            return lines, samples
+        finally:
+            self.lock.release()
+
+
+sampling_profiler = SamplingProfiler()
+
+
+@app.post("/arcrooms/api/admin/profile/memory/start")
+def profile_memory_start():
+    """Start tracemalloc (?frames=N stack depth, default 10) and take a baseline snapshot"""
+    _, error = admin_or_error()
+    if error:
+        return error
+    memory_profiler.start(max(1, min(request.args.get('frames', 10, type=int), 50)))
+    return jsonify(memory_profiler.status())
+
+
+@app.post("/arcrooms/api/admin/profile/memory/stop")
+def profile_memory_stop():
+    _, error = admin_or_error()
+    if error:
+        return error
+    memory_profiler.stop()
+    return jsonify(memory_profiler.status())
+
+
+@app.post("/arcrooms/api/admin/profile/memory/snapshot")
+def profile_memory_snapshot():
+    """Make the current allocations the baseline for /memory/diff"""
+    _, error = admin_or_error()
+    if error:
+        return error
+    if not tracemalloc.is_tracing():
+        return jsonify({"error": "tracemalloc staat uit; start het eerst"}), 409
+    memory_profiler.mark()
+    return jsonify(memory_profiler.status())
+
+
+@app.get("/arcrooms/api/admin/profile/memory/<view>")
+def profile_memory_view(view):
+    """
+    top: largest allocation sites now; diff: growth since start or the last /memory/snapshot.
+    Options: group (lineno, filename or traceback) and limit (max 200).
+    """
+    _, error = admin_or_error()
+    if error:
+        return error
+    if view not in ("top", "diff"):
+        return jsonify({"error": "Onbekende weergave (top of diff)"}), 404
+    if not tracemalloc.is_tracing():
+        return jsonify({"error": "tracemalloc staat uit; start het eerst"}), 409
+    group = request.args.get('group', 'lineno')
+    if group not in MemoryProfiler.GROUPINGS:
+        return jsonify({"error": "Onbekende groepering (lineno, filename of traceback)"}), 400
+    limit = max(1, min(request.args.get('limit', 25, type=int), 200))
+    stats = memory_profiler.top(group, limit) if view == "top" else memory_profiler.diff(group, limit)
+    return jsonify(dict(memory_profiler.status(), group=group, stats=stats))
+
+
+@app.get("/arcrooms/api/admin/profile/cpu")
+def profile_cpu():
+    """
+    Sample all threads of this worker for ?seconds= (default 10, max 60) every ?interval= seconds
+    (default 0.01) and return collapsed stacks (flamegraph.pl, speedscope). ?mode=wall also counts
+    threads that are waiting.
+    """
+    _, error = admin_or_error()
+    if error:
+        return error
+    seconds = max(0.1, min(request.args.get('seconds', 10, type=float), PROFILE_MAX_SECONDS))
+    interval = max(0.001, min(request.args.get('interval', PROFILE_DEFAULT_INTERVAL, type=float), 1))
+    mode = request.args.get('mode', 'cpu')
+    if mode not in ("cpu", "wall"):
+        return jsonify({"error": "Onbekende modus (cpu of wall)"}), 400
+    collapsed, samples = sampling_profiler.run(seconds, interval, mode)
+    if collapsed is None:
+        return jsonify({"error": "Er loopt al een profiel in dit proces"}), 409
+    response = make_response(collapsed)
+    response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    response.headers['Content-Disposition'] = f'attachment; filename="arcrooms-{os.getpid()}-{mode}.collapsed"'
+    response.headers['X-Profile-Samples'] = str(samples)
+    response.headers['X-Profile-Pid'] = str(os.getpid())
+    return response
+
+
+# ---- Warm-up and readiness ----
+# A fresh worker fetches the token, rooms, delegates and a first meetings snapshot before /health
+# reports it ready, so the first dashboard after a restart does not pay for the whole Graph fan-out.
+WARMUP_ON_START = os.getenv('WARMUP_ON_START', '1') == '1'
+# After this long a worker that is still cold reports healthy anyway (degraded), so a Graph outage
+# does not take every worker out of the load balancer
+WARMUP_TIMEOUT_SECONDS = float(os.getenv('WARMUP_TIMEOUT_SECONDS', '60'))
+WARMUP_RETRY_SECONDS = 15
+
+
+class Warmup:
+    """Pre-fetches everything the dashboard needs in a background thread, retrying until it succeeds"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.state = "off"  # off (never started), warming, ready
+        self.started_at = None
+        self.finished_at = None
+        self.attempts = 0
+        self.error = None
+        self.steps_ms = {}
+
+    def start(self):
+        """Start warming this worker (once); called at boot or from gunicorn's post_worker_init"""
+        with self.lock:
+            if self.state != "off":
+                return False
+            self.state = "warming"
+            self.started_at = time.time()
+        Thread(target=self.run, name="arcrooms-warmup", daemon=True).start()
+        return True
+
+    def _step(self, name, fn):
+        started = time.perf_counter()
+        result = fn()
+        self.steps_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def run(self):
+        while True:
+            self.attempts += 1
+            try:
+                token = self._step("token", get_token)
+                rooms = self._step("rooms", lambda: rooms_cache.get("all", fetch_all_rooms)[0])
+                self._step("delegates", lambda: list(room_fetch_executor.map(
+                    lambda room: get_room_delegates(room.get("emailAddress"), token), rooms)))
+                self._step("meetings", lambda: meetings_cache.get("all", collect_meetings))
+                with self.lock:
+                    self.state = "ready"
+                    self.finished_at = time.time()
+                    self.error = None
+                print(f"[WARMUP] Ready in {self.finished_at - self.started_at:.1f}s {self.steps_ms}", flush=True)
+                return
+            except Exception as e:
+                self.error = str(e)
+                print(f"[WARMUP] Attempt {self.attempts} failed, retrying in {WARMUP_RETRY_SECONDS}s: {e}", flush=True)
+                time.sleep(WARMUP_RETRY_SECONDS)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "attempts": self.attempts,
+                "seconds": round((self.finished_at or time.time()) - self.started_at, 1) if self.started_at else None,
+                "stepsMs": dict(self.steps_ms),
+                "error": self.error
+            }
+
+
+warmup = Warmup()
+
+
+def seconds_since(timestamp):
+    return None if timestamp is None else round(time.time() - timestamp, 1)
+
+
 @app.get("/arcrooms/health")
 def health():
-    """Health check endpoint for monitoring and Azure App Service"""
-    return jsonify({"status": "ok", "time": datetime.now().isoformat()})
+    """
+    Health check for monitoring and the load balancer.
+    503 while this worker is still warming up; otherwise 200 with status ok, or degraded when
+    Graph is failing or the warm-up has not succeeded yet.
+    """
+    snapshot_age = meetings_cache.age("all")
+    warming = warmup.state == "warming" and snapshot_age is None
+    timed_out = warming and time.time() - warmup.started_at >= WARMUP_TIMEOUT_SECONDS
+    if warming and not timed_out:
+        status = "warming"
+    elif timed_out or graph_circuit.state != "closed":
+        status = "degraded"
+    else:
+        status = "ok"
+    payload = {
+        "status": status,
+        "ready": status != "warming",
+        "time": datetime.now().isoformat(),
+        "pid": os.getpid(),
+        "warmup": warmup.as_dict(),
+        "snapshotAgeSeconds": None if snapshot_age is None else round(snapshot_age, 1),
+        "lastGraphSuccessSeconds": seconds_since(graph_circuit.last_success),
+        "graphCircuit": graph_circuit.state,
+        "graphLimiter": graph_limiter.snapshot(),
+        "refresh": refresh_scheduler.snapshot(),
+        "shards": room_shards.snapshot(list(room_store.rooms)),
+        "caches": {
+            # Sampled every CACHE_SIZE_SAMPLE_SECONDS: counting them is a key scan of the backend
+            "meetings": cache_size_sample["meetings"],
+            "rooms": cache_size_sample["rooms"],
+            "delegates": cache_size_sample["delegates"],
+            "titles": cache_size_sample["titles"],
+            "roomCalendars": len(room_store.rooms),
+            "organizers": len(room_store.by_organizer),
+            "search": search_index.size(),
+            "meetingBodiesBytes": meeting_bodies.size_bytes(),
+            "encodedResponses": len(encoded_responses.entries)
+        }
+    }
+    response = jsonify(payload)
+    if status == "warming":
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return response
 
 
 
@@ -1705,4 +5875,12 @@ def health():
 
 
 if __name__ == "__main__":
+    if WARMUP_ON_START:
+        warmup.start()
+    refresh_scheduler.start()
+    start_user_token_refresher()
+    start_subscription_maintainer()
+    start_booking_journal()
+    if occupancy_archive:
+        occupancy_archive.start()
     app.run(host="0.0.0.0", port=5010)
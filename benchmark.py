@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the room dashboard
+Starts mock_graph_server.py in-process, drives the Flask app through its routes
+and reports p50/p95/p99 latency and Graph calls per request for several tenant sizes.
+
+    python benchmark.py                                   # 5, 50 and 500 rooms
+    python benchmark.py --rooms 50 --latency lognormal:80:0.6 --throttle-rate 0.02
+    python benchmark.py --json after.json --baseline before.json
+    python benchmark.py --replay graph.jsonl --replay-speed 10   # replay a recorded production fixture
+    python benchmark.py --replay graph.jsonl --describe
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from mock_graph_server import MockGraph, start_mock_server
+
+BASE_URL = "https://localhost"
+SCENARIOS = ["meetings", "rooms", "request-meeting"]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def load_app(base_url):
+    """Import app.py against the mock Graph endpoints"""
+    os.environ["GRAPH_ENDPOINT"] = f"{base_url}/v1.0"
+    os.environ["LOGIN_ENDPOINT"] = base_url
+    os.environ.setdefault("AZURE_TENANT_ID", "mock-tenant")
+    os.environ.setdefault("AZURE_CLIENT_ID", "mock-client")
+    os.environ.setdefault("AZURE_CLIENT_SECRET", "mock-secret")
+    os.environ.setdefault("USER_TOKEN_DB", os.path.join(tempfile.gettempdir(), "arcrooms-benchmark-tokens.db"))
+    os.environ.setdefault("BOOKING_JOURNAL_DB", os.path.join(tempfile.gettempdir(), "arcrooms-benchmark-bookings.db"))
+    os.environ.setdefault("OCCUPANCY_ARCHIVE_DIR", os.path.join(tempfile.gettempdir(), "arcrooms-benchmark-occupancy"))
+    import app as roomapp
+    return roomapp
+
+
+def graph_call_total(roomapp):
+    """Graph calls seen by the app itself (used in replay mode where the mock is not hit)"""
+    with roomapp.metrics_lock:
+        return sum(series[-1] for series in roomapp.GRAPH_REQUEST_SECONDS.values.values())
+
+
+def describe_fixture(path):
+    """Summarize the load shape captured in a GRAPH_RECORD_FILE fixture"""
+    import re
+    calls, rooms, page_sizes, events, hidden = {}, 0, [], 0, 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            template = re.sub(r"/[^/]*(@|%40)[^/]*", "/{id}", re.sub(r"^https?://[^/]+/v1\.0", "", entry["url"]))
+            calls[f"{entry['method']} {template}"] = calls.get(f"{entry['method']} {template}", 0) + 1
+            values = (entry.get("json") or {}).get("value") if isinstance(entry.get("json"), dict) else None
+            if values is None:
+                continue
+            if template.endswith("microsoft.graph.room"):
+                rooms = max(rooms, len(values))
+            if template.endswith("/calendar/calendarView") and "/users/{id}" in template:
+                page_sizes.append(len(values))
+                for event in values:
+                    organizer_name = event.get("organizer", {}).get("emailAddress", {}).get("name", "")
+                    subject = (event.get("subject") or "").strip()
+                    events += 1
+                    hidden += 1 if not subject or subject == organizer_name.strip() else 0
+    print(f"Fixture: {path}")
+    print(f"  rooms: {rooms}")
+    if page_sizes:
+        print(f"  calendarView pages: {len(page_sizes)}, avg {sum(page_sizes) / len(page_sizes):.1f} events, max {max(page_sizes)}")
+    if events:
+        print(f"  hidden-subject rate: {hidden / events:.1%}")
+    for key, count in sorted(calls.items(), key=lambda item: -item[1]):
+        print(f"  {count:>6}  {key}")
+
+
+def reset_app_state(roomapp):
+    """Drop in-process caches so a run starts cold"""
+    for key in roomapp.state.keys("title:"):
+        roomapp.state.delete(key)
+    roomapp.state.delete("token:app")
+
+
+def logged_in_client(roomapp):
+    """Test client with a member session (needed for request-meeting)"""
+    client = roomapp.app.test_client()
+    token_id = f"benchmark-{id(client)}"
+    roomapp.user_tokens.save(token_id, "lid1@mock.svarc.nl", "mock-user-token", None, time.time() + 8 * 3600)
+    with client.session_transaction(base_url=BASE_URL) as sess:
+        sess["user"] = {"name": "Mock Lid", "email": "lid1@mock.svarc.nl", "id": "mock-user"}
+        sess["token_id"] = token_id
+    return client
+
+
+def make_request(client, scenario, graph):
+    if scenario == "meetings":
+        return client.get("/arcrooms/api/meetings", base_url=BASE_URL)
+    if scenario == "rooms":
+        return client.get("/arcrooms/api/rooms", base_url=BASE_URL)
+    if scenario == "request-meeting":
+        room = random.choice(graph.rooms)
+        day = datetime.now() + timedelta(days=random.randint(1, 9))
+        hour = random.randint(8, 20)
+        return client.post("/arcrooms/api/request-meeting", base_url=BASE_URL, json={
+            "room": room["displayName"],
+            "date": day.strftime("%Y-%m-%d"),
+            "startTime": f"{hour:02d}:00",
+            "endTime": f"{hour + 1:02d}:00",
+            "subject": "Benchmark overleg",
+        })
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def run_scenario(roomapp, graph, scenario, requests_count, concurrency, cold):
+    """Run one scenario and return latency percentiles and Graph call counts"""
+    clients = [logged_in_client(roomapp) for _ in range(concurrency)]
+
+    # One warm-up request so token and import costs are not attributed to the first sample
+    if not cold:
+        make_request(clients[0], scenario, graph)
+    graph.reset_stats()
+    app_calls_before = graph_call_total(roomapp)
+
+    def worker(idx):
+        samples, errors = [], 0
+        client = clients[idx]
+        for _ in range(idx, requests_count, concurrency):
+            if cold:
+                reset_app_state(roomapp)
+            started = time.perf_counter()
+            response = make_request(client, scenario, graph)
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+        return samples, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    samples = sorted(s for result in results for s in result[0])
+    stats = graph.snapshot_stats()
+    if os.getenv("GRAPH_REPLAY_FILE"):
+        stats["total"] = graph_call_total(roomapp) - app_calls_before
+    throttled = sum(count for key, count in stats["calls"].items() if key.endswith(" 429"))
+    return {
+        "requests": len(samples),
+        "errors": sum(result[1] for result in results),
+        "p50_ms": round(percentile(samples, 50) * 1000, 1),
+        "p95_ms": round(percentile(samples, 95) * 1000, 1),
+        "p99_ms": round(percentile(samples, 99) * 1000, 1),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 1) if samples else 0.0,
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        "graph_calls_per_request": round(stats["total"] / max(1, len(samples)), 1),
+        "graph_429s": throttled,
+    }
+
+
+def print_table(results, baseline=None):
+    header = f"{'rooms':>6} {'scenario':<16} {'n':>4} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>7} {'graph/req':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        line = (f"{row['rooms']:>6} {row['scenario']:<16} {row['requests']:>4} {row['errors']:>4} "
+                f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['throughput_rps']:>7} "
+                f"{row['graph_calls_per_request']:>10}")
+        before = (baseline or {}).get(f"{row['rooms']}:{row['scenario']}")
+        if before:
+            line += f"   (p50 {row['p50_ms'] - before['p50_ms']:+.1f} ms, p95 {row['p95_ms'] - before['p95_ms']:+.1f} ms vs baseline)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the room dashboard against a mock Graph tenant")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--events-per-room", type=int, default=20)
+    parser.add_argument("--hidden-ratio", type=float, default=0.3)
+    parser.add_argument("--latency", default="lognormal:60:0.5",
+                        help="Mock Graph latency: none, fixed:MS, uniform:MIN:MAX or lognormal:MEDIAN_MS:SIGMA")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=0, help="Mock Graph concurrency before it answers 429 (0 = no limit)")
+    parser.add_argument("--cold", action="store_true", help="Clear app caches before every request")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --json")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own log output")
+    parser.add_argument("--replay", help="Serve Graph calls from a GRAPH_RECORD_FILE fixture instead of the mock")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="1 = recorded timing, 10 = ten times faster, 0 = no delay")
+    parser.add_argument("--describe", action="store_true", help="Print the load shape of the --replay fixture and exit")
+    args = parser.parse_args()
+
+    if args.replay:
+        if args.describe:
+            describe_fixture(args.replay)
+            return
+        os.environ["GRAPH_REPLAY_FILE"] = args.replay
+        os.environ["GRAPH_REPLAY_SPEED"] = str(args.replay_speed)
+        # Room count comes from the fixture, and bookings cannot be replayed
+        args.rooms = args.rooms[:1]
+        args.scenarios = [s for s in args.scenarios if s != "request-meeting"]
+
+    graph = MockGraph(events_per_room=args.events_per_room, hidden_ratio=args.hidden_ratio,
+                      latency=args.latency, throttle_rate=args.throttle_rate, capacity=args.capacity)
+    server, base_url = start_mock_server(graph)
+    roomapp = load_app(base_url)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {f"{row['rooms']}:{row['scenario']}": row for row in json.load(f)["results"]}
+
+    results = []
+    for room_count in args.rooms:
+        if not args.replay:
+            graph.configure(rooms=room_count)
+        reset_app_state(roomapp)
+        for scenario in args.scenarios:
+            print(f"Running {scenario} with {room_count} rooms...", file=sys.stderr)
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with quiet:
+                row = run_scenario(roomapp, graph, scenario, args.requests, args.concurrency, args.cold)
+            row.update({"rooms": room_count, "scenario": scenario})
+            results.append(row)
+
+    print_table(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"created": datetime.now().isoformat(), "settings": vars(args), "results": results}, f, indent=2)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
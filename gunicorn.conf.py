@@ -0,0 +1,32 @@
+"""
+Gunicorn settings for the room dashboard
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each worker warms its caches right after loading the app; /arcrooms/health answers 503
+until it is ready, so the load balancer only sends traffic to warm workers.
+Use a shared STATE_BACKEND with more than one worker so they share caches and snapshots.
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:5010")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# Threads: door tablets hold long-polls and SSE streams open; at most half of them (DOOR_MAX_STREAMS)
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+timeout = 60  # Long-polls wait up to 30 seconds
+graceful_timeout = 30
+
+
+def post_worker_init(worker):
+    """Runs in every worker once app.py is imported (post_fork runs before the app is loaded)"""
+    import app as roomapp
+    if os.getenv("WARMUP_ON_START", "1") == "1":
+        roomapp.warmup.start()
+    roomapp.refresh_scheduler.start()
+    roomapp.start_user_token_refresher()
+    roomapp.start_subscription_maintainer()
+    roomapp.start_booking_journal()
+    if roomapp.occupancy_archive:
+        roomapp.occupancy_archive.start()
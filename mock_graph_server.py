@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Local mock of the Microsoft Graph endpoints used by app.py
+Generates a synthetic tenant (rooms, organizers, events) and serves it with
+configurable latency and 429 throttling, so the app can be profiled offline.
+
+Point the app at it with:
+    export GRAPH_ENDPOINT=http://127.0.0.1:5020/v1.0
+    export LOGIN_ENDPOINT=http://127.0.0.1:5020
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import urlparse, parse_qs, unquote, quote
+
+MOCK_DOMAIN = "mock.svarc.nl"
+GRAPH_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.0000000"
+AVAILABILITY_CODES = {"free": "0", "tentative": "1", "busy": "2", "oof": "3", "workingElsewhere": "4"}
+
+
+def parse_latency(spec):
+    """Parse a latency spec into a function returning seconds.
+
+    fixed:MS, uniform:MIN_MS:MAX_MS or lognormal:MEDIAN_MS:SIGMA
+    """
+    if not spec or spec == "none":
+        return lambda: 0.0
+    kind, *args = spec.split(":")
+    values = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        import math
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def endpoint_template(path):
+    """Collapse ids and mailboxes in a path, e.g. /v1.0/users/{id}/calendar/calendarView"""
+    segments = []
+    for segment in path.split("/"):
+        if "@" in segment or "%40" in segment or len(segment) >= 32:
+            segments.append("{id}")
+        else:
+            segments.append(segment)
+    return "/".join(segments)
+
+
+class MockGraph:
+    """Synthetic tenant state plus call statistics"""
+
+    def __init__(self, rooms=5, events_per_room=20, hidden_ratio=0.3, latency="none",
+                 throttle_rate=0.0, retry_after=1, days=10, seed=42, capacity=0):
+        self.lock = Lock()
+        self.stats = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.subscriptions = {}  # subscription id -> Graph subscription (with clientState)
+        self.configure(rooms=rooms, events_per_room=events_per_room, hidden_ratio=hidden_ratio,
+                       latency=latency, throttle_rate=throttle_rate, retry_after=retry_after,
+                       days=days, seed=seed, capacity=capacity)
+
+    def configure(self, rooms=None, events_per_room=None, hidden_ratio=None, latency=None,
+                  throttle_rate=None, retry_after=None, days=None, seed=None, capacity=None):
+        """Change settings and regenerate the tenant data"""
+        with self.lock:
+            for name, value in (("room_count", rooms), ("events_per_room", events_per_room),
+                                ("hidden_ratio", hidden_ratio), ("latency_spec", latency),
+                                ("throttle_rate", throttle_rate), ("retry_after", retry_after),
+                                ("days", days), ("seed", seed), ("capacity", capacity)):
+                if value is not None:
+                    setattr(self, name, value)
+            self.latency = parse_latency(self.latency_spec)
+            self._generate()
+
+    def _generate(self):
+        rng = random.Random(self.seed)
+        self.rooms = []
+        for idx in range(self.room_count):
+            self.rooms.append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "displayName": f"Ruimte {idx + 1:03d}",
+                "emailAddress": f"room{idx + 1:03d}@{MOCK_DOMAIN}",
+                "capacity": rng.choice([4, 8, 12, 40]),
+            })
+        organizer_count = max(10, self.room_count * 2)
+        self.organizers = [{"name": f"Lid {idx + 1}", "address": f"lid{idx + 1}@{MOCK_DOMAIN}"}
+                           for idx in range(organizer_count)]
+        # calendars: mailbox -> {event_id: event}
+        self.calendars = {}
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        for room in self.rooms:
+            room_calendar = self.calendars.setdefault(room["emailAddress"], {})
+            for _ in range(self.events_per_room):
+                organizer = rng.choice(self.organizers)
+                start = today + timedelta(days=rng.randrange(self.days), hours=rng.randint(8, 21),
+                                          minutes=rng.choice([0, 15, 30, 45]))
+                end = start + timedelta(minutes=rng.choice([30, 60, 90, 120, 180]))
+                subject = f"Overleg {rng.choice(['bestuur', 'jeugdcommissie', 'ALV', 'training', 'sponsoren'])}"
+                hidden = rng.random() < self.hidden_ratio
+                event_id = uuid.UUID(int=rng.getrandbits(128)).hex * 2
+                room_event = self._event(event_id, organizer["name"] if hidden else subject, start, end,
+                                         organizer, room, show_as=rng.choice(["busy", "busy", "tentative"]))
+                room_calendar[event_id] = room_event
+                # Organizer's own copy carries the real subject (used for hidden-subject lookups)
+                org_id = uuid.UUID(int=rng.getrandbits(128)).hex * 2
+                self.calendars.setdefault(organizer["address"], {})[org_id] = self._event(
+                    org_id, subject, start, end, organizer, room, show_as="busy", is_organizer=True,
+                    sensitivity="private" if rng.random() < 0.1 else "normal")
+
+    def _event(self, event_id, subject, start, end, organizer, room, show_as="busy",
+               is_organizer=False, sensitivity="normal"):
+        return {
+            "id": event_id,
+            "subject": subject,
+            "start": {"dateTime": start.strftime(GRAPH_TIME_FORMAT), "timeZone": "Europe/Amsterdam"},
+            "end": {"dateTime": end.strftime(GRAPH_TIME_FORMAT), "timeZone": "Europe/Amsterdam"},
+            "showAs": show_as,
+            "sensitivity": sensitivity,
+            "body": {"contentType": "html", "content": f"<p>{subject}</p>" + "<p>&nbsp;</p>" * 20},
+            "organizer": {"emailAddress": dict(organizer)},
+            "location": {"displayName": room["displayName"]},
+            "isOrganizer": is_organizer,
+            "isCancelled": False,
+            "responseStatus": {"response": "organizer" if is_organizer else "accepted"},
+            "attendees": [{"emailAddress": {"address": room["emailAddress"], "name": room["displayName"]},
+                           "type": "resource", "status": {"response": "accepted"}}],
+            "webLink": f"https://outlook.office365.com/owa/?itemid={event_id}",
+        }
+
+    def record_call(self, method, path, status):
+        key = f"{method} {endpoint_template(path)} {status}"
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def snapshot_stats(self):
+        with self.lock:
+            return {"total": sum(self.stats.values()), "calls": dict(self.stats), "peak_in_flight": self.peak_in_flight}
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {}
+            self.peak_in_flight = self.in_flight
+
+    def room_by_email(self, email):
+        email = email.lower()
+        return next((r for r in self.rooms if r["emailAddress"] == email), None)
+
+    def notify(self, mailbox, change_type, event_id):
+        """Send a change notification to every subscription on the mailbox's events (like Graph, async)"""
+        resource = f"users/{mailbox.lower()}/events"
+        with self.lock:
+            subs = [dict(sub) for sub in self.subscriptions.values() if sub["resource"].lower() == resource]
+        for sub in subs:
+            payload = {"value": [{
+                "subscriptionId": sub["id"],
+                "subscriptionExpirationDateTime": sub["expirationDateTime"],
+                "clientState": sub.get("clientState"),
+                "changeType": change_type,
+                "resource": f"Users/{mailbox}/Events/{event_id}",
+                "resourceData": {"@odata.type": "#Microsoft.Graph.Event", "id": event_id},
+                "tenantId": "mock-tenant",
+            }]}
+            Thread(target=post_json, args=(sub["notificationUrl"], payload), daemon=True).start()
+
+    def change_room(self, mailbox, change_type="updated"):
+        """Simulate an Outlook edit on a room calendar (created, updated or deleted) and notify"""
+        room = self.room_by_email(mailbox)
+        if not room:
+            return None
+        with self.lock:
+            calendar = self.calendars.setdefault(room["emailAddress"], {})
+            if change_type == "created" or not calendar:
+                organizer = random.choice(self.organizers)
+                start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=random.randint(1, 48))
+                event_id = uuid.uuid4().hex * 2
+                calendar[event_id] = self._event(event_id, "Nieuw overleg", start, start + timedelta(hours=1),
+                                                 organizer, room)
+                change_type = "created"
+            elif change_type == "deleted":
+                event_id = random.choice(list(calendar))
+                del calendar[event_id]
+            else:
+                event_id = random.choice(list(calendar))
+                calendar[event_id]["subject"] = f"Gewijzigd overleg {datetime.now():%H:%M:%S}"
+        self.notify(room["emailAddress"], change_type, event_id)
+        return {"changeType": change_type, "eventId": event_id}
+
+
+class MockGraphHandler(BaseHTTPRequestHandler):
+    """Routes Graph-style requests to the MockGraph attached to the server"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def graph(self):
+        return self.server.graph
+
+    def _send(self, status, payload=None, headers=None):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.graph.record_call(self.command, urlparse(self.path).path, status)
+
+    def _json_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        raw = self.rfile.read(length)
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return {key: values[0] for key, values in parse_qs(raw.decode("utf-8")).items()}
+
+    def _handle(self):
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        body = self._json_body()
+
+        if path.startswith("/_mock/"):
+            return self._control(path, body)
+
+        # Concurrency capacity: like Graph, answer 429 to calls beyond what the tenant may run at once
+        with self.graph.lock:
+            self.graph.in_flight += 1
+            self.graph.peak_in_flight = max(self.graph.peak_in_flight, self.graph.in_flight)
+            overloaded = self.graph.capacity and self.graph.in_flight > self.graph.capacity
+        try:
+            time.sleep(self.graph.latency())
+            if path.endswith("/oauth2/v2.0/token"):
+                return self._send(200, {"token_type": "Bearer", "expires_in": 3599,
+                                        "access_token": f"mock-{uuid.uuid4().hex}",
+                                        "refresh_token": "mock-refresh"})
+            if overloaded or random.random() < self.graph.throttle_rate:
+                return self._send(429, {"error": {"code": "TooManyRequests", "message": "Mock throttling"}},
+                                  headers={"Retry-After": str(self.graph.retry_after)})
+            return self._route(path, query, body)
+        finally:
+            with self.graph.lock:
+                self.graph.in_flight -= 1
+
+    def _route(self, path, query, body):
+        if path.startswith("/v1.0"):
+            path = path[len("/v1.0"):]
+        for pattern, handler in ROUTES:
+            match = re.fullmatch(pattern, path)
+            if match and handler[0] == self.command:
+                return handler[1](self, *match.groups(), query=query, body=body)
+        return self._send(404, {"error": {"code": "ResourceNotFound", "message": f"No mock for {path}"}})
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+    def _control(self, path, body):
+        if path == "/_mock/stats":
+            return self._send(200, self.graph.snapshot_stats())
+        if path == "/_mock/reset":
+            self.graph.reset_stats()
+            return self._send(200, {"reset": True})
+        if path == "/_mock/configure":
+            self.graph.configure(**body)
+            return self._send(200, {"rooms": len(self.graph.rooms)})
+        if path == "/_mock/subscriptions":
+            with self.graph.lock:
+                subs = list(self.graph.subscriptions.values())
+            return self._send(200, {"value": subs})
+        if path == "/_mock/change":
+            change = self.graph.change_room(body.get("room", ""), body.get("changeType", "updated"))
+            return self._send(200 if change else 404, change or {"error": "unknown room"})
+        return self._send(404, {"error": "unknown control endpoint"})
+
+    # ---- Graph routes ----
+    def me(self, query, body):
+        return self._send(200, {"id": "mock-user", "displayName": "Mock Lid",
+                                "mail": f"lid1@{MOCK_DOMAIN}", "userPrincipalName": f"lid1@{MOCK_DOMAIN}"})
+
+    def user(self, mailbox, query, body):
+        return self._send(200, {"id": mailbox, "mail": mailbox, "userPrincipalName": mailbox})
+
+    def rooms(self, query, body):
+        return self._send(200, {"value": self.graph.rooms})
+
+    def room_lists(self, query, body):
+        return self._send(200, {"value": [{"id": "roomlist", "displayName": "Alle ruimtes",
+                                           "emailAddress": f"alle-ruimtes@{MOCK_DOMAIN}"}]})
+
+    def room_list_rooms(self, room_list, query, body):
+        return self._send(200, {"value": self.graph.rooms})
+
+    def calendar_view(self, mailbox, query, body):
+        window_start = query.get("startDateTime", "")[:19]
+        window_end = query.get("endDateTime", "")[:19] or "9999"
+        top = int(query.get("$top", 100))
+        events = [e for e in self.graph.calendars.get(mailbox.lower(), {}).values()
+                  if e["end"]["dateTime"][:19] > window_start and e["start"]["dateTime"][:19] < window_end]
+        events.sort(key=lambda e: e["start"]["dateTime"])
+        return self._send(200, {"value": events[:top]})
+
+    def list_events(self, mailbox, query, body):
+        return self._send(200, {"value": list(self.graph.calendars.get(mailbox.lower(), {}).values())})
+
+    def calendar_permissions(self, mailbox, query, body):
+        if not self.graph.room_by_email(mailbox):
+            return self._send(404, {"error": {"code": "ErrorItemNotFound"}})
+        return self._send(200, {"value": [
+            {"role": "owner", "emailAddress": {"name": "Lid 1", "address": f"lid1@{MOCK_DOMAIN}"}},
+            {"role": "read", "emailAddress": {"name": "Iedereen", "address": ""}},
+        ]})
+
+    def working_hours(self, mailbox, query, body):
+        return self._send(404, {"error": {"code": "ErrorItemNotFound"}})
+
+    def get_event(self, mailbox, event_id, query, body):
+        event = self.graph.calendars.get(mailbox.lower(), {}).get(event_id)
+        if not event:
+            return self._send(404, {"error": {"code": "ErrorItemNotFound"}})
+        return self._send(200, event)
+
+    def patch_event(self, mailbox, event_id, query, body):
+        event = self.graph.calendars.get(mailbox.lower(), {}).get(event_id)
+        if not event:
+            return self._send(404, {"error": {"code": "ErrorItemNotFound"}})
+        with self.graph.lock:
+            event.update(body)
+        self.graph.notify(mailbox, "updated", event_id)
+        return self._send(200, event)
+
+    def delete_event(self, mailbox, event_id, query, body):
+        with self.graph.lock:
+            removed = self.graph.calendars.get(mailbox.lower(), {}).pop(event_id, None)
+        if removed:
+            self.graph.notify(mailbox, "deleted", event_id)
+        return self._send(204 if removed else 404)
+
+    def create_event(self, query, body):
+        organizer = {"name": "Mock Lid", "address": f"lid1@{MOCK_DOMAIN}"}
+        start = datetime.strptime(body["start"]["dateTime"][:19], "%Y-%m-%dT%H:%M:%S")
+        end = datetime.strptime(body["end"]["dateTime"][:19], "%Y-%m-%dT%H:%M:%S")
+        created = None
+        created_rooms = []
+        with self.graph.lock:
+            for attendee in body.get("attendees", []):
+                room = self.room_by_attendee(attendee)
+                if room:
+                    room_id = uuid.uuid4().hex * 2
+                    self.graph.calendars.setdefault(room["emailAddress"], {})[room_id] = self.graph._event(
+                        room_id, organizer["name"], start, end, organizer, room, show_as="tentative")
+                    created_rooms.append((room["emailAddress"], room_id))
+                    event_id = uuid.uuid4().hex * 2
+                    created = self.graph._event(event_id, body.get("subject", ""), start, end, organizer, room,
+                                                show_as=body.get("showAs", "busy"), is_organizer=True)
+                    self.graph.calendars.setdefault(organizer["address"], {})[event_id] = created
+        if not created:
+            return self._send(400, {"error": {"code": "ErrorInvalidRequest", "message": "No room attendee"}})
+        for mailbox, room_event_id in created_rooms:
+            self.graph.notify(mailbox, "created", room_event_id)
+        return self._send(201, created)
+
+    def room_by_attendee(self, attendee):
+        return self.graph.room_by_email(attendee.get("emailAddress", {}).get("address", ""))
+
+    def send_mail(self, *args, query, body):
+        return self._send(202)
+
+    def get_schedule(self, mailbox, query, body):
+        interval = int(body.get("availabilityViewInterval", 30))
+        window_start = datetime.strptime(body["startTime"]["dateTime"][:19], "%Y-%m-%dT%H:%M:%S")
+        window_end = datetime.strptime(body["endTime"]["dateTime"][:19], "%Y-%m-%dT%H:%M:%S")
+        slots = int((window_end - window_start).total_seconds() // (interval * 60))
+        results = []
+        for schedule in body.get("schedules", []):
+            view = ["0"] * slots
+            items = []
+            for event in self.graph.calendars.get(schedule.lower(), {}).values():
+                start = datetime.strptime(event["start"]["dateTime"][:19], "%Y-%m-%dT%H:%M:%S")
+                end = datetime.strptime(event["end"]["dateTime"][:19], "%Y-%m-%dT%H:%M:%S")
+                if end <= window_start or start >= window_end:
+                    continue
+                items.append({"status": event["showAs"], "start": event["start"], "end": event["end"]})
+                first = max(0, int((start - window_start).total_seconds() // (interval * 60)))
+                last = min(slots, -int(-(end - window_start).total_seconds() // (interval * 60)))
+                for slot in range(first, last):
+                    view[slot] = max(view[slot], AVAILABILITY_CODES.get(event["showAs"], "2"))
+            results.append({"scheduleId": schedule, "availabilityView": "".join(view), "scheduleItems": items})
+        return self._send(200, {"value": results})
+
+    def list_subscriptions(self, query, body):
+        with self.graph.lock:
+            subs = [{k: v for k, v in sub.items() if k != "clientState"} for sub in self.graph.subscriptions.values()]
+        return self._send(200, {"value": subs})
+
+    def create_subscription(self, query, body):
+        # Like Graph: the notification URL must echo a validation token before the subscription exists
+        token = uuid.uuid4().hex
+        try:
+            echoed = post_json(f"{body['notificationUrl']}?validationToken={quote(token)}", None)
+        except Exception as e:
+            echoed = str(e)
+        if echoed != token:
+            return self._send(400, {"error": {"code": "InvalidRequest",
+                                              "message": f"Subscription validation request failed: {echoed!r}"}})
+        sub = {key: body.get(key) for key in ("changeType", "notificationUrl", "lifecycleNotificationUrl",
+                                               "resource", "expirationDateTime", "clientState")}
+        sub["id"] = str(uuid.uuid4())
+        with self.graph.lock:
+            self.graph.subscriptions[sub["id"]] = sub
+        return self._send(201, {k: v for k, v in sub.items() if k != "clientState"})
+
+    def patch_subscription(self, subscription_id, query, body):
+        with self.graph.lock:
+            sub = self.graph.subscriptions.get(subscription_id)
+            if sub:
+                sub["expirationDateTime"] = body.get("expirationDateTime", sub["expirationDateTime"])
+        if not sub:
+            return self._send(404, {"error": {"code": "ResourceNotFound"}})
+        return self._send(200, {k: v for k, v in sub.items() if k != "clientState"})
+
+    def delete_subscription(self, subscription_id, query, body):
+        with self.graph.lock:
+            removed = self.graph.subscriptions.pop(subscription_id, None)
+        return self._send(204 if removed else 404)
+
+
+def post_json(url, payload, timeout=10):
+    """POST JSON (or nothing) and return the response text"""
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url, data=data or b"", method="POST", headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.read().decode("utf-8")
+
+
+USERS = r"/users/([^/]+)"
+ROUTES = [
+    (r"/me", ("GET", MockGraphHandler.me)),
+    (r"/me/(?:calendar/)?events", ("POST", MockGraphHandler.create_event)),
+    (r"/me/sendMail", ("POST", MockGraphHandler.send_mail)),
+    (r"/places/microsoft\.graph\.room", ("GET", MockGraphHandler.rooms)),
+    (r"/places/microsoft\.graph\.roomlist", ("GET", MockGraphHandler.room_lists)),
+    (r"/places/([^/]+)/microsoft\.graph\.roomlist/rooms", ("GET", MockGraphHandler.room_list_rooms)),
+    (USERS + r"/calendar/calendarView", ("GET", MockGraphHandler.calendar_view)),
+    (USERS + r"/calendar/calendarPermissions", ("GET", MockGraphHandler.calendar_permissions)),
+    (USERS + r"/calendar/getSchedule", ("POST", MockGraphHandler.get_schedule)),
+    (USERS + r"/calendar/events", ("GET", MockGraphHandler.list_events)),
+    (USERS + r"/calendar/events/([^/]+)", ("GET", MockGraphHandler.get_event)),
+    (USERS + r"/calendar/events/([^/]+)", ("PATCH", MockGraphHandler.patch_event)),
+    (USERS + r"/calendar/events/([^/]+)", ("DELETE", MockGraphHandler.delete_event)),
+    (USERS + r"/mailboxSettings/workingHours", ("GET", MockGraphHandler.working_hours)),
+    (USERS + r"/sendMail", ("POST", MockGraphHandler.send_mail)),
+    (USERS, ("GET", MockGraphHandler.user)),
+    (r"/subscriptions", ("GET", MockGraphHandler.list_subscriptions)),
+    (r"/subscriptions", ("POST", MockGraphHandler.create_subscription)),
+    (r"/subscriptions/([^/]+)", ("PATCH", MockGraphHandler.patch_subscription)),
+    (r"/subscriptions/([^/]+)", ("DELETE", MockGraphHandler.delete_subscription)),
+]
+
+
+class MockGraphServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default backlog of 5 drops connections under concurrent fan-out
+
+
+def start_mock_server(graph, host="127.0.0.1", port=0):
+    """Start the mock in a background thread; returns (server, base_url)"""
+    server = MockGraphServer((host, port), MockGraphHandler)
+    server.graph = graph
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Microsoft Graph server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--events-per-room", type=int, default=20)
+    parser.add_argument("--hidden-ratio", type=float, default=0.3,
+                        help="Fraction of room events whose subject is hidden (forces organizer lookups)")
+    parser.add_argument("--latency", default="none",
+                        help="none, fixed:MS, uniform:MIN_MS:MAX_MS or lognormal:MEDIAN_MS:SIGMA")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of Graph calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--capacity", type=int, default=0, help="Concurrent calls allowed before answering 429 (0 = no limit)")
+    args = parser.parse_args()
+
+    graph = MockGraph(rooms=args.rooms, events_per_room=args.events_per_room, hidden_ratio=args.hidden_ratio,
+                      latency=args.latency, throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                      capacity=args.capacity)
+    server = MockGraphServer((args.host, args.port), MockGraphHandler)
+    server.graph = graph
+    print(f"Mock Graph listening on http://{args.host}:{args.port} ({args.rooms} rooms)")
+    print(f"  export GRAPH_ENDPOINT=http://{args.host}:{args.port}/v1.0")
+    print(f"  export LOGIN_ENDPOINT=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Local Redis-compatible stand-in for testing STATE_BACKEND=redis://
+Speaks enough RESP2 for app.py's RedisStateBackend (strings with expiry, NX, MGET, SCAN),
+keeps everything in memory and needs no dependencies.
+
+    python redis_standin.py --port 6390
+    STATE_BACKEND=redis://127.0.0.1:6390/0 python app.py
+"""
+
+import argparse
+import fnmatch
+import socketserver
+import time
+from threading import Lock, Thread
+
+
+class RedisStandin:
+    """In-memory keyspace: key -> (value bytes, expires_at or None)"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.data = {}
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item and item[1] is not None and item[1] <= time.time():
+            del self.data[key]
+            return None
+        return item
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            return RuntimeError(f"ERR unknown command '{name}'")
+        with self.lock:
+            try:
+                return handler(*args[1:])
+            except (TypeError, ValueError, IndexError):
+                return RuntimeError(f"ERR wrong arguments for '{name}' command")
+
+    # ---- Commands ----
+    def cmd_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_get(self, key):
+        item = self._live(key)
+        return item[0] if item else None
+
+    def cmd_mget(self, *keys):
+        return [self.cmd_get(key) for key in keys]
+
+    def cmd_set(self, key, value, *options):
+        options = [o.decode().upper() if isinstance(o, bytes) else o for o in options]
+        expires_at, idx = None, 0
+        nx = "NX" in options
+        xx = "XX" in options
+        while idx < len(options):
+            if options[idx] == "EX":
+                expires_at = time.time() + int(options[idx + 1])
+                idx += 1
+            elif options[idx] == "PX":
+                expires_at = time.time() + int(options[idx + 1]) / 1000
+                idx += 1
+            idx += 1
+        exists = self._live(key) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        self.data[key] = (value, expires_at)
+        return "OK"
+
+    def cmd_del(self, *keys):
+        return sum(1 for key in keys if self._live(key) and self.data.pop(key, None))
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._live(key))
+
+    def cmd_pexpire(self, key, ms):
+        item = self._live(key)
+        if not item:
+            return 0
+        self.data[key] = (item[0], time.time() + int(ms) / 1000)
+        return 1
+
+    def cmd_expire(self, key, seconds):
+        return self.cmd_pexpire(key, int(seconds) * 1000)
+
+    def cmd_pttl(self, key):
+        item = self._live(key)
+        if not item:
+            return -2
+        return -1 if item[1] is None else int((item[1] - time.time()) * 1000)
+
+    def cmd_incr(self, key):
+        item = self._live(key)
+        value = int(item[0]) + 1 if item else 1
+        self.data[key] = (str(value).encode(), item[1] if item else None)
+        return value
+
+    def cmd_keys(self, pattern):
+        pattern = pattern.decode()
+        return [key for key in list(self.data) if self._live(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def cmd_scan(self, cursor, *options):
+        # Single pass: every matching key with cursor 0
+        options = [o.decode() for o in options]
+        pattern = options[options.index("MATCH") + 1] if "MATCH" in options else "*"
+        return [b"0", self.cmd_keys(pattern.encode())]
+
+    def cmd_dbsize(self):
+        return len([key for key in list(self.data) if self._live(key)])
+
+    def cmd_flushall(self, *args):
+        self.data.clear()
+        return "OK"
+
+    cmd_flushdb = cmd_flushall
+
+
+def encode(reply):
+    """Python value -> RESP2 bytes"""
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, RuntimeError):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, bool) or isinstance(reply, int):
+        return f":{int(reply)}\r\n".encode()
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+    raise TypeError(f"Cannot encode {type(reply)}")
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # Inline command (e.g. typed in telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if not args:
+                return
+            if args[0].upper() == b"QUIT":
+                self.wfile.write(b"+OK\r\n")
+                return
+            self.wfile.write(encode(self.server.store.execute(args)))
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_standin(host="127.0.0.1", port=0):
+    """Start in a background thread; returns (server, url)"""
+    server = RespServer((host, port), RespHandler)
+    server.store = RedisStandin()
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://{host}:{server.server_address[1]}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis-compatible stand-in for local tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    server = RespServer((args.host, args.port), RespHandler)
+    server.store = RedisStandin()
+    print(f"Redis stand-in listening on redis://{args.host}:{args.port}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
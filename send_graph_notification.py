@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Local sender for Microsoft Graph change notifications
+Posts Graph-shaped webhook calls to a running app, so /arcrooms/api/graph-notifications
+can be tested without a public URL.
+
+    python send_graph_notification.py --validate
+    python send_graph_notification.py --mock http://127.0.0.1:5020 --room room001@mock.svarc.nl
+    python send_graph_notification.py --subscription-id ID --client-state SECRET --room room@svarc.nl --count 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+DEFAULT_URL = "http://127.0.0.1:5010/arcrooms/api/graph-notifications"
+
+
+def post(url, payload=None):
+    data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url, data=data, method="POST", headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status, response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+def mock_subscription(mock_url, room):
+    """Subscription id and clientState the app registered at mock_graph_server.py for a room"""
+    with urllib.request.urlopen(f"{mock_url}/_mock/subscriptions", timeout=10) as response:
+        subs = json.load(response)["value"]
+    resource = f"users/{room.lower()}/events"
+    for sub in subs:
+        if sub["resource"].lower() == resource:
+            return sub["id"], sub["clientState"]
+    sys.exit(f"No subscription for {room} at {mock_url} (is GRAPH_NOTIFICATION_URL set on the app?)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send test Graph change notifications to the app")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Notification endpoint of the app")
+    parser.add_argument("--validate", action="store_true", help="Only test the subscription validation handshake")
+    parser.add_argument("--room", help="Room mailbox the change is for")
+    parser.add_argument("--change-type", default="updated", choices=["created", "updated", "deleted"])
+    parser.add_argument("--subscription-id", help="Subscription id (see arcrooms_graph_subscriptions / Graph)")
+    parser.add_argument("--client-state", default=os.getenv("GRAPH_NOTIFICATION_SECRET"),
+                        help="clientState of the subscription (default: $GRAPH_NOTIFICATION_SECRET)")
+    parser.add_argument("--mock", help="Read subscription id and clientState from this mock_graph_server.py URL")
+    parser.add_argument("--lifecycle", choices=["reauthorizationRequired", "subscriptionRemoved", "missed"],
+                        help="Send a lifecycle notification instead of a change")
+    parser.add_argument("--count", type=int, default=1, help="Notifications to send (tests debouncing)")
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between notifications")
+    args = parser.parse_args()
+
+    if args.validate:
+        token = uuid.uuid4().hex
+        status, body = post(f"{args.url}?validationToken={token}")
+        print(f"Validation: {status} {'OK' if body == token else f'unexpected body {body!r}'}")
+        return
+
+    if not args.room:
+        parser.error("--room is required")
+    subscription_id, client_state = args.subscription_id, args.client_state
+    if args.mock:
+        subscription_id, client_state = mock_subscription(args.mock, args.room)
+    if not client_state:
+        parser.error("--client-state (or --mock) is required")
+
+    for idx in range(args.count):
+        event_id = uuid.uuid4().hex
+        notification = {
+            "subscriptionId": subscription_id or str(uuid.uuid4()),
+            "subscriptionExpirationDateTime": "2099-01-01T00:00:00Z",
+            "clientState": client_state,
+            "resource": f"Users/{args.room}/Events/{event_id}",
+            "tenantId": "local-test",
+        }
+        if args.lifecycle:
+            notification["lifecycleEvent"] = args.lifecycle
+        else:
+            notification["changeType"] = args.change_type
+            notification["resourceData"] = {"@odata.type": "#Microsoft.Graph.Event", "id": event_id}
+        started = time.perf_counter()
+        status, _ = post(args.url, {"value": [notification]})
+        print(f"{idx + 1}: {status} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        if idx + 1 < args.count:
+            time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
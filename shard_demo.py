@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Local multi-process demo of room sharding
+Starts mock_graph_server.py in-process and several app workers as separate processes sharing one
+SQLite state backend, kills one worker halfway and reports how the rooms were divided, how many
+Graph reads every worker made, and whether the shared room snapshot stayed complete and fresh.
+
+    python shard_demo.py                              # 3 workers, 60 rooms
+    python shard_demo.py --workers 4 --rooms 200 --seconds 30
+    python shard_demo.py --workers 1 --rooms 200      # compare the reads of a single worker
+"""
+
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+
+from mock_graph_server import MockGraph, start_mock_server
+
+
+def run_worker(args):
+    """Worker process: run the refresh scheduler and print its state as a JSON line every second"""
+    os.environ.update({
+        "GRAPH_ENDPOINT": f"{args.graph}/v1.0",
+        "LOGIN_ENDPOINT": args.graph,
+        "AZURE_TENANT_ID": "mock-tenant",
+        "AZURE_CLIENT_ID": "mock-client",
+        "AZURE_CLIENT_SECRET": "mock-secret",
+        "STATE_BACKEND": f"sqlite://{args.state}",
+        "SHARD_MEMBER_ID": args.worker,
+        "USER_TOKEN_DB": os.path.join(os.path.dirname(args.state), f"tokens-{args.worker}.db"),
+        "BOOKING_JOURNAL_DB": os.path.join(os.path.dirname(args.state), f"bookings-{args.worker}.db"),
+        "OCCUPANCY_ARCHIVE_DIR": os.path.join(os.path.dirname(args.state), "occupancy"),
+    })
+    sys.stdout = open(os.devnull, "w")  # The app's own log output
+    import app as roomapp
+    roomapp.refresh_scheduler.start()
+    out = sys.__stdout__
+    while True:
+        time.sleep(1)
+        rooms = [r["emailAddress"] for r in roomapp.get_room_directory().values() if r.get("emailAddress")]
+        with roomapp.metrics_lock:
+            reads = sum(series[-1] for labels, series in roomapp.GRAPH_REQUEST_SECONDS.values.items()
+                        if "calendarView" in str(labels))
+        out.write(json.dumps({"worker": args.worker, "owned": sum(1 for r in rooms if roomapp.room_shards.owns(r)),
+                              "members": len(roomapp.room_shards.members), "reads": reads}) + "\n")
+        out.flush()
+
+
+def snapshot_freshness(state_path):
+    """(rooms in the shared snapshot, age in seconds of the oldest one)"""
+    conn = sqlite3.connect(state_path, timeout=10)
+    rows = conn.execute("SELECT value FROM state WHERE key LIKE 'room:%'").fetchall()
+    conn.close()
+    fetched = [json.loads(value)["fetched_at"] for (value,) in rows]
+    return len(fetched), round(time.time() - min(fetched), 1) if fetched else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several workers that share the room refreshes")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--rooms", type=int, default=60)
+    parser.add_argument("--seconds", type=float, default=20, help="Seconds before and after a worker is killed")
+    parser.add_argument("--latency", default="lognormal:60:0.5")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--graph", help=argparse.SUPPRESS)
+    parser.add_argument("--state", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    graph = MockGraph(rooms=args.rooms, latency=args.latency)
+    server, base_url = start_mock_server(graph)
+    workdir = tempfile.mkdtemp(prefix="arcrooms-shards-")
+    state_path = os.path.join(workdir, "state.db")
+    env = dict(os.environ,
+               # Short paces and leases so the demo shows several rounds and a handover within seconds
+               REFRESH_NEAR_SECONDS="2", REFRESH_WEEK_SECONDS="6", REFRESH_FAR_SECONDS="20",
+               SHARD_LEASE_SECONDS="3", WARMUP_ON_START="0")
+    latest = {}
+
+    def follow(process):
+        for line in process.stdout:
+            status = json.loads(line)
+            latest[status["worker"]] = status
+
+    processes = {}
+    for n in range(1, args.workers + 1):
+        worker = f"worker{n}"
+        processes[worker] = subprocess.Popen(
+            [sys.executable, __file__, "--worker", worker, "--graph", base_url, "--state", state_path],
+            stdout=subprocess.PIPE, text=True, env=env)
+        Thread(target=follow, args=(processes[worker],), daemon=True).start()
+
+    def report(phase, since):
+        rooms, oldest = snapshot_freshness(state_path)
+        print(f"\n{phase}: shared snapshot has {rooms}/{args.rooms} rooms, oldest read {oldest}s ago")
+        print(f"{'worker':<10}{'members':>8}{'owned':>8}{'reads':>8}")
+        for worker, status in sorted(latest.items()):
+            alive = processes[worker].poll() is None
+            reads = status["reads"] - since.get(worker, 0)
+            print(f"{worker:<10}{status['members']:>8}{status['owned']:>8}{reads:>8}{'' if alive else '  (killed)'}")
+        return {worker: status["reads"] for worker, status in latest.items()}
+
+    try:
+        time.sleep(args.seconds)
+        reads = report(f"{args.workers} workers after {args.seconds:.0f}s", {})
+        if args.workers > 1:
+            os.kill(processes["worker1"].pid, signal.SIGKILL)  # No clean shutdown: its lease has to lapse
+            killed_at = time.time()
+            while sum(s["owned"] for w, s in latest.items() if w != "worker1") < args.rooms and time.time() - killed_at < 30:
+                time.sleep(0.2)
+            print(f"\nworker1 killed; its rooms were taken over after {time.time() - killed_at:.1f}s")
+            time.sleep(args.seconds)
+            report(f"{args.workers - 1} workers after another {args.seconds:.0f}s", reads)
+        print(f"\nGraph calls in total: {graph.snapshot_stats()['total']}")
+    finally:
+        for process in processes.values():
+            process.kill()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
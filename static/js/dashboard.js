@@ -512,7 +512,7 @@ async function loadRoomsData() {
 
 async function loadMeetings() {
     try {
-        const response = await fetch('/arcrooms/api/meetings');
+        const response = await fetch('/arcrooms/api/meetings?body=0');
         const data = await response.json();
         let meetings = data.meetings;
         